@@ -24,9 +24,22 @@ examples). Some examples of plugins are: CSV, text, HTML and histogram.
 """
 
 import datetime
+import multiprocessing
+import random
 import re
 import types
-from collections import Counter
+from inspect import getargspec
+from itertools import chain, imap, islice, izip
+from operator import itemgetter
+
+from outputty.columns import CompactColumn, TypedColumn, DICTIONARY_RATIO
+from outputty.datatypes import ColumnTypes, checked_converter
+from outputty.expression import Expression
+from outputty.grouping import GroupBy
+from outputty.indexes import INDEXES, RowIndex
+from outputty.joins import Join
+from outputty.storage import (STORAGES, CHUNK_SIZE, ChunkedStorage,
+                              ColumnStorage, ViewStorage, parse_size)
 
 
 __version__ = '0.3.2'
@@ -34,6 +47,16 @@ date_regex = re.compile('^[0-9]{4}-[0-9]{2}-[0-9]{2}$')
 datetime_regex = re.compile('^[0-9]{4}-[0-9]{2}-[0-9]{2} '
                             '[0-9]{2}:[0-9]{2}:[0-9]{2}$')
 
+
+class _WrongType(ValueError):
+    """Raised when a value is not of the type identified for its column
+    in a sample of the rows (see ``Table.normalize_types``)."""
+
+    def __init__(self, position):
+        super(_WrongType, self).__init__(position)
+        self.position = position
+
+
 def _str_decode(element, codec):
     if isinstance(element, str):
         return element.decode(codec)
@@ -47,102 +70,448 @@ def _unicode_encode(element, codec):
         return element
 
 
+class Row(object):
+    """A row of a ``Table``. Values can be accessed by position
+    (``row[0]``), by header name (``row['name']``) or as attributes
+    (``row.name``).
+
+    ``Row`` only keeps a reference to the row values and to a ``dict`` that
+    maps header names to positions, which is shared by all rows of a table,
+    so creating one is a lot cheaper than creating a ``dict`` per row. It is
+    read-only: change the table with ``table[index] = values`` instead.
+
+    Besides ``keys``, ``values``, ``items`` and ``get`` it has the methods of
+    a ``list`` that do not change it (``index``, ``count`` and ``+``), so
+    functions written for rows as lists keep working. Headers with the name
+    of one of these methods can only be accessed as ``row['name']``.
+    """
+    __slots__ = ('_values', '_positions')
+
+    def __init__(self, values, positions):
+        self._values = values
+        self._positions = positions
+
+    def _position(self, key):
+        if isinstance(key, (str, unicode)):
+            return self._positions[key]
+        return key
+
+    def __getitem__(self, key):
+        return self._values[self._position(key)]
+
+    def __getattr__(self, name):
+        try:
+            return self._values[self._positions[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __contains__(self, value):
+        return value in self._values
+
+    def __add__(self, other):
+        return list(self._values) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self._values)
+
+    def index(self, value, *args):
+        return list(self._values).index(value, *args)
+
+    def count(self, value):
+        return list(self._values).count(value)
+
+    def __eq__(self, other):
+        if isinstance(other, (Row, list, tuple)):
+            return list(self._values) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Row(%r)' % (self.items(), )
+
+    def __reduce__(self):
+        return (Row, (list(self._values), self._positions))
+
+    def keys(self):
+        return sorted(self._positions, key=self._positions.get)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return zip(self.keys(), self._values)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, IndexError):
+            return default
+
+    def as_dict(self):
+        return dict(self.items())
+
+
+class _Columns(dict):
+    """``dict`` mapping each header of ``table`` to its values, which are
+    read from the table only when first used. Values are list-like objects
+    (or ``numpy.ndarray`` objects if ``as_numpy`` is ``True``) that must
+    not be changed."""
+
+    def __init__(self, table, as_numpy=False):
+        super(_Columns, self).__init__()
+        self._table = table
+        self._as_numpy = as_numpy
+
+    def __missing__(self, header):
+        if not self._table._has_header(header):
+            raise KeyError(header)
+        column = self._table._get_column(header)
+        if self._as_numpy:
+            column = _to_numpy(column)
+        self[header] = column
+        return column
+
+
+def _orderings(columns, ordering):
+    """Return ``(header, descending)`` for each column in ``columns`` (see
+    ``Table.order_by``)."""
+    if isinstance(columns, basestring):
+        columns = [columns]
+    if isinstance(ordering, basestring):
+        ordering = [ordering] * len(columns)
+    elif len(ordering) != len(columns):
+        raise ValueError('ordering must have one item for each column.')
+    result = []
+    for column, column_ordering in izip(columns, ordering):
+        if isinstance(column, tuple):
+            column, column_ordering = column
+        result.append((column, column_ordering.lower().startswith('desc')))
+    return result
+
+
+def _to_numpy(column):
+    """Return ``column`` as a read-only ``numpy.ndarray``, sharing the
+    buffer of typed columns without ``None`` values."""
+    import numpy
+
+    if isinstance(column, TypedColumn) and column.nulls is None and \
+       column.type in (int, float):
+        array = column.to_numpy()
+    else:
+        array = numpy.array(list(column))
+    array.flags.writeable = False
+    return array
+
+
+def _map_values(task):
+    function, rows = task
+    return [[function(value) for value in row] for row in rows]
+
+
+def _apply_to_rows(task):
+    functions, rows, positions, as_dict = task
+    rows = (Row(values, positions) for values in rows)
+    if as_dict:
+        rows = (row.as_dict() for row in rows)
+    return [[function(row) for function in functions] for row in rows]
+
+
+def _parallel_map(function, tasks, workers):
+    """Return ``map(function, tasks)``, calling ``function`` in ``workers``
+    processes."""
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(function, tasks, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 class Table(object):
     def __init__(self, headers=None, dash='-', pipe='|', plus='+',
-                 input_encoding='utf8', output_encoding='utf8'):
-        self.headers = headers if headers is not None else []
-        for header in self.headers:
+                 input_encoding='utf8', output_encoding='utf8',
+                 storage='rows', chunk_size=CHUNK_SIZE, max_memory=None):
+        headers = headers if headers is not None else []
+        for header in headers:
             if not isinstance(header, (str, unicode)):
                 raise ValueError('Headers must be strings.')
         else:
-            if len(self.headers) != len(set(self.headers)):
+            if len(headers) != len(set(headers)):
                 raise ValueError('Header names must be unique.')
-        self.headers = [_str_decode(h, input_encoding) for h in self.headers]
+        if storage not in STORAGES:
+            raise ValueError('Storage must be one of: %s.' %
+                             ', '.join(sorted(STORAGES)))
+        if max_memory is not None and storage != 'chunks':
+            raise ValueError("max_memory can only be used with the 'chunks' "
+                             "storage.")
+        self.headers = [_str_decode(h, input_encoding) for h in headers]
         self.dash = dash
         self.pipe = pipe
         self.plus = plus
         self.input_encoding = input_encoding
         self.output_encoding = output_encoding
         self.csv_filename = None
-        self._rows = []
+        self.storage = storage
+        self.chunk_size = chunk_size
+        self.max_memory = max_memory
+        self._storage = self._create_storage(storage)
         self.types = {}
         self.plugins = {}
+        self._indexes = {}
+        self._column_types = ColumnTypes()
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
+        self._update_header_positions()
+        storage = getattr(self, '_storage', None)
+        if isinstance(storage, ColumnStorage) and not len(storage):
+            storage.columns = [[] for header in headers]
+
+    def _update_header_positions(self):
+        self._header_positions = {header: position
+                                  for position, header in
+                                  enumerate(self._headers)}
+
+    def _header_position(self, name):
+        """Return the position of header ``name``, like
+        ``self.headers.index(name)`` but in constant time. Raises
+        ``ValueError`` if ``name`` is not a header.
+
+        The position found is checked against ``self.headers``, so the map is
+        rebuilt if the list was changed in place.
+        """
+        position = self._header_positions.get(name)
+        headers = self._headers
+        if position is None or position >= len(headers) or \
+           headers[position] != name:
+            self._update_header_positions()
+            position = self._header_positions.get(name)
+            if position is None:
+                raise ValueError('%r is not in headers' % (name, ))
+        return position
+
+    def _has_header(self, name):
+        try:
+            self._header_position(name)
+        except ValueError:
+            return False
+        else:
+            return True
 
     def __setitem__(self, item, value):
         if isinstance(item, (str, unicode)):
-            if item not in self.headers:
+            if not self._has_header(item):
                 self.append_column(item, value)
-            columns = zip(*self._rows)
-            if not columns or len(value) != len(self):
+            if not len(self) or len(value) != len(self):
                 raise ValueError
             else:
-                columns[self.headers.index(item)] = value
-                self._rows = [list(x) for x in zip(*columns)]
+                position = self._header_position(item)
+                self._column_changed(item)
+                self._writable(incremental=True).set_column(position, value)
         elif isinstance(item, int):
-            self._rows[item] = self._prepare_to_append(value)
+            row = self._prepare_to_append(value)
+            index = item + len(self) if item < 0 else item
+            old_row = self._storage.get_raw_row(item)
+            column_types = self._tracked_types()
+            self._writable(incremental=True).set_rows(item, row)
+            self._unindex_row(index, old_row)
+            self._index_rows(index, [row])
+            column_types.row_changed(index, old_row, row)
         elif isinstance(item, slice):
-            self._rows[item] = [self._prepare_to_append(v) for v in value]
+            self._writable().set_rows(item, [self._prepare_to_append(v)
+                                          for v in value])
         else:
             raise ValueError
 
+    def set_columns(self, columns):
+        """Replace the values of many columns at once, with a single pass
+        over the rows. ``columns`` is a ``dict`` (or a list of ``(header,
+        values)`` pairs) in which each value is the list of new values of
+        that column; headers that are not in the table are appended as new
+        columns. Same as ``table[header] = values`` for each header.
+        """
+        if isinstance(columns, dict):
+            columns = columns.items()
+        if not len(self) or \
+           any(len(values) != len(self) for header, values in columns):
+            raise ValueError
+        replaced = {}
+        for header, values in columns:
+            if self._has_header(header):
+                replaced[self._header_position(header)] = values
+            else:
+                self.append_column(header, values)
+        if replaced:
+            for position in replaced:
+                self._column_changed(self.headers[position])
+            self._writable(incremental=True).set_columns(replaced)
+
     def __getitem__(self, item):
         if isinstance(item, (str, unicode)):
-            if item not in self.headers:
+            if not self._has_header(item):
                 raise KeyError
-            columns = zip(*self._rows)
-            if not columns:
-                return []
-            else:
-                return list(columns[self.headers.index(item)])
-        elif isinstance(item, (int, slice)):
-            return self._rows[item]
+            return self._storage.get_column(self._header_position(item))
+        elif isinstance(item, int):
+            return self._storage.get_row(item)
+        elif isinstance(item, slice):
+            return self._storage.get_rows(item)
         else:
             raise ValueError
 
     def __delitem__(self, item):
         if isinstance(item, (str, unicode)):
-            columns = zip(*self._rows)
-            header_index = self.headers.index(item)
-            del columns[header_index]
+            header_index = self._header_position(item)
+            column_types = self._tracked_types()
+            self._columns_moved()
+            self._writable(incremental=True).delete_column(header_index)
+            column_types.column_removed(header_index)
             del self.headers[header_index]
-            self._rows = [list(row) for row in zip(*columns)]
-        elif isinstance(item, (int, slice)):
-            del self._rows[item]
+            self._update_header_positions()
+            self._indexes.pop(item, None)
+        elif isinstance(item, int):
+            self.pop(item)
+        elif isinstance(item, slice):
+            self._writable().delete_rows(item)
         else:
             raise ValueError
 
-    def order_by(self, column, ordering='asc'):
-        index = self.headers.index(column)
-        if ordering.lower().startswith('desc'):
-            sort_function = lambda x, y: cmp(y[index], x[index])
+    def __iter__(self):
+        """Iterate over rows of the table as ``Row`` objects."""
+        self._update_header_positions()
+        positions = self._header_positions
+        return (Row(values, positions) for values in self._storage.iter_rows())
+
+    def iter_rows(self, encoding=None):
+        """Iterate over rows of the table as ``Row`` objects. If
+        ``encoding`` is not ``None``, headers and ``unicode`` values are
+        encoded using it (the table is not changed).
+        """
+        if encoding is None:
+            return iter(self)
+        encode = lambda value: _unicode_encode(value, encoding)
+        positions = {encode(header): position
+                     for position, header in enumerate(self.headers)}
+        return (Row(values, positions)
+                for values in self._iter_mapped_rows(encode))
+
+    def _iter_mapped_rows(self, function):
+        """Iterate over rows (as ``list``s) with ``function(value)`` instead
+        of each value, without changing the table. ``function`` must depend
+        only on the value: it is called once per distinct value of
+        dictionary-encoded columns."""
+        return self._storage.iter_mapped_rows([function] * len(self.headers))
+
+    def order_by(self, column, ordering='asc', nulls=None, max_memory=None,
+                 limit=None):
+        """Sort the rows *in place* by ``column``, a header or a list of
+        headers (the first one being the most significant). ``ordering`` is
+        ``'asc'`` or ``'desc'`` (or a list with one of them for each
+        column); a column can also be given as a ``(header, ordering)``
+        pair. ``nulls`` says where ``None`` values go: ``'first'``,
+        ``'last'`` or ``None`` (where Python puts them: before any other
+        value). The sort is stable.
+
+        If ``max_memory`` is given (in bytes or as a string like
+        ``'512MB'``), the table changes to the ``'chunks'`` storage with
+        that memory limit and is sorted with an external merge sort: sorted
+        runs of as many rows as fit in ``max_memory`` are written to a
+        temporary file and merged reading a block of each at a time (in
+        more than one pass if their blocks do not fit in ``max_memory``).
+        The sorted rows stay spilled to disk, so writing them with any
+        plugin reads one chunk at a time.
+
+        If ``limit`` is given, only the first ``limit`` rows are kept. They
+        are selected keeping at most ``limit`` rows in a heap
+        (``O(n log limit)``) instead of sorting all rows (see ``top``).
+        """
+        keys = self._sort_keys(column, ordering, nulls)
+        if max_memory is not None:
+            self._limit_memory(max_memory)
+        if limit is None:
+            self._writable().sort(keys)
+        else:
+            self._rows_changed()
+            self._storage = self._top_storage(keys, limit)
+
+    def top(self, limit, by, ordering='desc', nulls=None):
+        """Return a new ``Table`` with the first ``limit`` rows in the order
+        given by ``by``, ``ordering`` and ``nulls`` (see ``order_by``): by
+        default, the rows with the greatest values of ``by``. The rows are
+        selected keeping at most ``limit`` of them in a heap, so it is a
+        lot faster than sorting the whole table when ``limit`` is small.
+        """
+        table = self._new_table()
+        table._storage = self._top_storage(self._sort_keys(by, ordering,
+                                                           nulls), limit)
+        table.types = dict(self.types)
+        return table
+
+    def _top_indexes(self, column, ordering, nulls, limit):
+        """Return the indexes of the first ``limit`` rows in the order
+        given by ``column``, ``ordering`` and ``nulls`` (see ``order_by``).
+        """
+        return self._storage.top(self._sort_keys(column, ordering, nulls),
+                                 limit)
+
+    def _top_storage(self, keys, limit):
+        """Return a new storage with the first ``limit`` rows in the order
+        of ``keys``."""
+        storage = self._take_storage(sorted(self._storage.top(keys, limit)))
+        storage.sort(keys)
+        return storage
+
+    def _limit_memory(self, max_memory):
+        """Change to the ``'chunks'`` storage, spilling chunks to disk while
+        the rows in memory take more than ``max_memory``."""
+        self.max_memory = parse_size(max_memory)
+        if self.storage == 'chunks':
+            self._writable().limit_memory(self.max_memory)
         else:
-            sort_function = lambda x, y: cmp(x[index], y[index])
-        self._rows.sort(sort_function)
+            self._change_storage('chunks')
+
+    def _sort_keys(self, columns, ordering, nulls):
+        """Return ``(position, descending, nulls)`` for each column in
+        ``columns`` (see ``order_by``)."""
+        if nulls not in (None, 'first', 'last'):
+            raise ValueError("nulls must be None, 'first' or 'last'.")
+        return [(self._header_position(header), descending, nulls)
+                for header, descending in _orderings(columns, ordering)]
 
     def encode(self, codec=None):
         if codec is None:
             codec = self.output_encoding
         self.headers = [_unicode_encode(x, codec) for x in self.headers]
-        rows = []
-        for row in self._rows:
-            rows.append([_unicode_encode(value, codec) for value in row])
-        self._rows = rows
+        encode = lambda value: _unicode_encode(value, codec)
+        self._writable().map_columns([encode] * len(self.headers))
 
     def decode(self, codec=None):
         if codec is None:
             codec = self.input_encoding
-        rows = []
-        for row in self._rows:
-            rows.append([_str_decode(v, codec) for v in row])
-        self._rows = rows
+        decode = lambda value: _str_decode(value, codec)
+        self._writable().map_columns([decode] * len(self.headers))
         self.headers = [_str_decode(h, codec) for h in self.headers]
 
     def _max_column_sizes(self):
         max_size = {}
-        for column in self.headers:
-            sizes = [len(unicode(value)) for value in self[column]]
-            max_column_size = max(sizes + [len(column)])
-            max_size[column] = max_column_size
+        for position, column in enumerate(self.headers):
+            column_size = self._storage.column_width(position)
+            max_size[column] = max(column_size, len(column))
         return max_size
 
     def _make_line_from_row_data(self, row_data):
@@ -151,7 +520,7 @@ class Table(object):
 
     def __unicode__(self):
         max_size = self._max_column_sizes()
-        if not len(self.headers) and not len(self._rows):
+        if not len(self.headers) and not len(self):
             return unicode()
 
         dashes = []
@@ -163,13 +532,11 @@ class Table(object):
         header_line = self._make_line_from_row_data(centered_headers)
 
         result = [split_line, header_line, split_line]
-        for row in self._rows:
-            row_data = []
-            for i, info in enumerate(row):
-                data = unicode(info).rjust(max_size[self.headers[i]])
-                row_data.append(data)
+        sizes = [max_size[header] for header in self.headers]
+        for row in self._iter_mapped_rows(unicode):
+            row_data = [info.rjust(size) for info, size in izip(row, sizes)]
             result.append(self._make_line_from_row_data(row_data))
-        if self._rows:
+        if len(self):
             result.append(split_line)
         return '\n'.join(result)
 
@@ -177,110 +544,451 @@ class Table(object):
         return self.__unicode__().encode(self.output_encoding)
 
     def to_list_of_dicts(self, encoding=''):
+        """Return a list with a ``dict`` per row. Prefer ``iter_rows``,
+        which does not need to create a ``dict`` for each row."""
         if encoding is not None:
-            self.encode(encoding or self.output_encoding)
-        rows = [dict(zip(self.headers, row)) for row in self._rows]
-        if encoding is not None:
-            self.decode(encoding or self.output_encoding)
-        return rows
+            encoding = encoding or self.output_encoding
+        return [row.as_dict() for row in self.iter_rows(encoding)]
 
-    def _identify_type_of_data(self):
+    def _identify_type_of_data(self, sample_size=None):
         """Create ``self.types``, a ``dict`` in which each key is a table
         header (from ``self.headers``) and value is a type in:
         ``(int, float, datetime.date, datetime.datetime, str)``.
 
         The types are identified trying to convert each column value to each
-        type.
+        type (see ``outputty.datatypes``). Only the rows added since the
+        last time are read, unless rows were removed or changed in other
+        ways. If ``sample_size`` is given and there are more than twice that
+        number of rows to read, only the first ``sample_size`` of them and
+        ``sample_size`` others chosen at random are used, so the types found
+        may be too narrow for the other rows. Return ``True`` if a sample
+        was used.
+
+        ``self.types`` is changed only here (and by the plugins that read
+        the types with the data): ``append``, ``extend``, ``insert`` and
+        ``table[index] = row`` only keep track of what has to be read the
+        next time, so the types are up to date after this method or
+        ``normalize_types`` is called.
         """
-        columns = zip(*self._rows)
-        for i, header in enumerate(self.headers):
-            column_types = [int, float, datetime.date, datetime.datetime, str]
-            cant_be = set()
-            try:
-                column = columns[i]
-            except IndexError:
-                self.types[header] = str
+        column_types = self._tracked_types()
+        if len(self.headers) and sample_size is not None:
+            start = min(column.rows for column in column_types)
+            if len(self) - start > 2 * sample_size:
+                sample = self._take(self._sample_indexes(sample_size, start))
+                for position, header in enumerate(self.headers):
+                    column = column_types[position].copy()
+                    self.types[header] = column.identify(
+                            sample._storage.iter_column_chunks(position), 0)
+                return True
+        for position, header in enumerate(self.headers):
+            self.types[header] = self._identify_column_type(position)
+        return False
+
+    def _sample_indexes(self, size, start=0):
+        """Return the indexes of the ``size`` rows from ``start`` and of
+        ``size`` other rows after them chosen at random, in order."""
+        return range(start, start + size) + \
+               sorted(random.sample(xrange(start + size, len(self)), size))
+
+    def _identify_column_type(self, position):
+        """Return the type of the column at ``position``, classifying the
+        values not classified yet. They are read one chunk at a time (see
+        ``iter_column_chunks``), stopping as soon as no type other than
+        ``str`` is possible."""
+        if not len(self):
+            return str
+        column = self._tracked_types()[position]
+        return column.identify(self._storage.iter_column_chunks(position,
+                                                                column.rows),
+                               len(self))
+
+    def _tracked_types(self):
+        """Return the ``ColumnTypes`` of the table, with a ``ColumnType``
+        per column."""
+        if len(self._column_types) != len(self.headers):
+            self._column_types.reset(len(self.headers))
+        return self._column_types
+
+    def _convert_value(self, value, type_):
+        if value is None or value == '':
+            return None
+        elif type(value) is type_ and type_ is not str:
+            return value
+        elif type_ == datetime.date:
+            info = [int(x) for x in value.split('-')]
+            return datetime.date(*info)
+        elif type_ == datetime.datetime:
+            info = value.split()
+            date = [int(x) for x in info[0].split('-')]
+            rest = [int(x) for x in info[1].split(':')]
+            return datetime.datetime(*(date + rest))
+        elif type_ == str:
+            if isinstance(value, unicode):
+                return value
             else:
-                types = list(set([type(value) for value in column]) -
-                             set([type(None)]))
-                if len(types) == 1 and types[0] not in (str, unicode):
-                    self.types[header] = types[0]
-                    continue
-                for value in column:
-                    if value == '':
-                        value = None
-                    try:
-                        converted = int(value)
-                        if str(converted) != str(value):
-                            raise ValueError('It is float')
-                    except ValueError:
-                        cant_be.add(int)
-                    except TypeError:
-                        pass  # None should pass
-                    try:
-                        converted = float(value)
-                    except ValueError:
-                        cant_be.add(float)
-                    except TypeError:
-                        pass  # None should pass
-                    if value is not None:
-                        if datetime_regex.match(unicode(value)) is None:
-                            cant_be.add(datetime.datetime)
-                        if date_regex.match(unicode(value)) is None:
-                            cant_be.add(datetime.date)
-                for removed_type in cant_be:
-                    column_types.remove(removed_type)
-                self.types[header] = column_types[0]
-
-    def normalize_types(self):
+                if not isinstance(value, str):
+                    value = str(value)
+                return value.decode(self.input_encoding)
+        else:
+            return type_(value)
+
+    def _converter(self, position, checked=False):
+        """Return a function that converts a value of the column at
+        ``position`` to its type (see ``_convert_value``), checking it
+        first if ``checked`` is ``True``: a value that is not of the type
+        raises ``_WrongType`` (see ``outputty.datatypes.checked_converter``).
+        """
+        type_ = self.types[self.headers[position]]
+        convert = lambda value: self._convert_value(value, type_)
+        if checked:
+            return checked_converter(type_, convert, _WrongType(position))
+        return convert
+
+    def normalize_types(self, compact=False, dictionary=None,
+                        sample_size=None):
+        """Convert all values to the types identified by
+        ``_identify_type_of_data``. If ``compact`` is ``True``, call
+        ``compact`` (with ``dictionary``) after the conversion.
+
+        If ``sample_size`` is given, the types are identified in a sample
+        of that many rows (twice, see ``_identify_type_of_data``), so it
+        takes the same time for any number of rows, and each value is
+        checked while it is converted. When a value is not of the type of
+        its column, nothing is changed: the type of that column is
+        identified again with all rows and the conversion starts over, so
+        the result is the same as without ``sample_size``.
+
+        The rows converted are remembered, so when this method is called
+        again only the rows added after that are converted (all rows of the
+        columns whose type changed).
+        """
+        checked = set()
+        if self._identify_type_of_data(sample_size):
+            checked.update(xrange(len(self.headers)))
+        self._stale_indexes()
+        while True:
+            column_types = self._tracked_types()
+            groups = {}
+            for position, header in enumerate(self.headers):
+                column = column_types[position]
+                start = column.normalized \
+                        if column.type is self.types[header] else 0
+                if start < len(self):
+                    groups.setdefault(start, []).append(position)
+            try:
+                for start, positions in sorted(groups.items()):
+                    converters = [None] * len(self.headers)
+                    for position in positions:
+                        converters[position] = self._converter(
+                                position, position in checked)
+                    self._writable(incremental=True).map_columns(converters,
+                                                                 start)
+                    for position in positions:
+                        column_types[position].normalized = len(self)
+                        column_types[position].type = \
+                                self.types[self.headers[position]]
+                break
+            except _WrongType as error:
+                checked.discard(error.position)
+                header = self.headers[error.position]
+                self.types[header] = self._identify_column_type(
+                        error.position)
+        if compact:
+            self.compact(dictionary=dictionary)
+
+    def compact(self, dictionary=None, max_distinct_ratio=DICTIONARY_RATIO):
+        """Store ``int``, ``float``, ``datetime.date`` and
+        ``datetime.datetime`` columns in typed arrays (with a separate mask
+        for ``None`` values), which uses a lot less memory than a Python
+        object per value. The table is moved to the ``'columns'`` storage if
+        it is using other storage. Columns with values that are not of the
+        column type (run ``normalize_types`` before) are kept untouched.
+
+        Text columns are dictionary-encoded (each distinct ``unicode`` value
+        is stored once and rows keep small integer codes) when they have at
+        most ``max_distinct_ratio`` distinct values per row, or when their
+        header is in ``dictionary``. ``order_by``, ``count``, ``index`` and
+        the writers work on the distinct values of these columns.
+        """
         self._identify_type_of_data()
-        rows_converted = []
-        for row in self._rows:
-            row_data = []
-            for index, value in enumerate(row):
-                type_ = self.types[self.headers[index]]
-                if value is None or value == '':
-                    row_data.append(None)
-                elif type_ == datetime.date:
-                    info = [int(x) for x in value.split('-')]
-                    row_data.append(datetime.date(*info))
-                elif type_ == datetime.datetime:
-                    info = value.split()
-                    date = [int(x) for x in info[0].split('-')]
-                    rest = [int(x) for x in info[1].split(':')]
-                    row_data.append(datetime.datetime(*(date + rest)))
-                elif type_ == str:
-                    if isinstance(value, unicode):
-                        row_data.append(value)
-                    else:
-                        if not isinstance(value, str):
-                            value = str(value)
-                        row_data.append(value.decode(self.input_encoding))
+        self._change_storage('columns')
+        positions = [self._header_position(header)
+                     for header in dictionary or []]
+        self._writable(incremental=True).compact([self.types[header]
+                                  for header in self.headers],
+                                 positions, max_distinct_ratio)
+
+    def _writable(self, incremental=False):
+        """Return the storage to be changed. A view (see ``view``) gets a
+        copy of its data before, so the parent table is not changed.
+
+        Column indexes (see ``create_index``) are marked as stale and the
+        types of the columns are identified again from the first row (see
+        ``_tracked_types``), unless ``incremental`` is ``True`` (the caller
+        keeps both up to date).
+        """
+        if not incremental:
+            self._rows_changed()
+        if isinstance(self._storage, ViewStorage):
+            self._storage = self._storage.materialize(
+                    self._create_storage(self.storage))
+        return self._storage
+
+    def _create_storage(self, storage):
+        if storage == 'chunks':
+            return ChunkedStorage(self.chunk_size, self.max_memory)
+        elif storage == 'columns':
+            return ColumnStorage([[] for header in self.headers])
+        return STORAGES[storage]()
+
+    def _new_table(self, headers=None):
+        """Return an empty ``Table`` with the same configuration as this
+        one."""
+        return Table(headers=list(self.headers if headers is None
+                                  else headers),
+                     dash=self.dash, pipe=self.pipe, plus=self.plus,
+                     input_encoding=self.input_encoding,
+                     output_encoding=self.output_encoding,
+                     storage=self.storage, chunk_size=self.chunk_size,
+                     max_memory=self.max_memory)
+
+    def copy(self):
+        """Return a copy of this table. The data is not copied right away:
+        both tables share it until one of them is changed, and then only
+        what is changed is copied (the changed columns for the ``'columns'``
+        storage, the changed chunks for the ``'chunks'`` storage or the list
+        of rows for the ``'rows'`` storage)."""
+        table = self._new_table()
+        table._storage = self._storage.copy()
+        table.types = dict(self.types)
+        table._column_types = self._column_types.copy()
+        return table
+
+    __copy__ = copy
+
+    def snapshot(self):
+        """Return a copy of the table as it is now, to be kept before
+        changing it (same as ``copy``, so it is cheap)."""
+        return self.copy()
+
+    def view(self, rows=None, columns=None):
+        """Return a new ``Table`` with the rows in slice ``rows`` and the
+        headers in ``columns`` (all rows/columns by default) that shares
+        the data with this table, so no data is copied.
+
+        The view can be used like any other ``Table`` (including to
+        ``write`` with any plugin). It is built on a copy of the storage
+        (see ``copy``), so changes to this table are not seen by the view
+        and only what is changed afterwards is copied. Its own data is
+        copied only when the view itself is changed.
+        """
+        if columns is None:
+            columns = self.headers
+        positions = [self._header_position(column) for column in columns]
+        if rows is None:
+            rows = slice(None)
+        view = self._new_table(headers=columns)
+        view._storage = ViewStorage(self._storage.copy(), rows, positions)
+        view.types = {header: self.types[header] for header in view.headers
+                      if header in self.types}
+        return view
+
+    def _change_storage(self, storage):
+        if storage != self.storage:
+            new_storage = self._create_storage(storage)
+            new_storage.extend(list(self._storage.iter_rows()))
+            self._storage = new_storage
+            self.storage = storage
+            if storage != 'chunks':
+                self.max_memory = None
+
+    def map(self, function, columns=None, workers=None):
+        """Replace each value of the columns with headers in ``columns``
+        (all columns by default) by ``function(value)``.
+
+        If ``workers`` is greater than 1, the rows are split in chunks (of
+        ``chunk_size`` rows or the chunks of the ``'chunks'`` storage) and
+        ``function`` is called in that number of processes (using
+        ``multiprocessing``), so it must be picklable (a function defined
+        at module level, not a ``lambda``). The results are kept in order.
+        """
+        if columns is None:
+            columns = self.headers
+        positions = sorted(set(self._header_position(header)
+                               for header in columns))
+        if not len(self) or not positions:
+            return
+        if workers > 1:
+            tasks = [(function, [[row[position] for position in positions]
+                                 for row in rows])
+                     for rows in self._iter_chunks()]
+            mapped = chain.from_iterable(_parallel_map(_map_values, tasks,
+                                                       workers))
+            new_columns = [list(values) for values in izip(*mapped)]
+        else:
+            new_columns = []
+            for position in positions:
+                column = self._storage.get_raw_column(position)
+                if isinstance(column, CompactColumn):
+                    values = column.map_values(function)
                 else:
-                    row_data.append(type_(value))
-            rows_converted.append(row_data)
-        self._rows = rows_converted
+                    values = imap(function, column)
+                new_columns.append(list(values))
+        self._writable().set_columns(dict(izip(positions, new_columns)))
+
+    def filter(self, condition):
+        """Return a new ``Table`` with the rows for which ``condition`` is
+        true. ``condition`` can be an expression over the columns, like
+        ``'total > 100 and status == "ok"'`` (see ``outputty.expression``),
+        or a function that receives each ``Row``.
+        """
+        return self._take(self._select(condition))
+
+    def _select(self, condition):
+        """Return the indexes of the rows for which ``condition`` is true
+        (see ``filter``)."""
+        if isinstance(condition, (str, unicode, Expression)):
+            return Expression.of(condition).select(self)
+        return [index for index, row in enumerate(self) if condition(row)]
+
+    def _keep_rows(self, indexes):
+        """Keep *in place* only the rows at ``indexes``."""
+        if len(indexes) < len(self):
+            self._rows_changed()
+            self._storage = self._take_storage(indexes)
+
+    def _keep_columns(self, columns):
+        """Keep *in place* only the columns with headers in ``columns``, in
+        that order."""
+        if list(columns) == self.headers:
+            return
+        view = self.view(columns=columns)
+        self._storage = view._storage.materialize(
+                self._create_storage(self.storage))
+        self.headers = view.headers
+        self.types = view.types
+        self._indexes = {header: index
+                         for header, index in self._indexes.iteritems()
+                         if header is None or header in self.headers}
+        self._rows_changed()
+
+    def _take(self, indexes):
+        """Return a new ``Table`` with the rows at ``indexes``."""
+        table = self._new_table()
+        table._storage = self._take_storage(indexes)
+        table.types = dict(self.types)
+        return table
+
+    def _take_storage(self, indexes):
+        """Return a new storage with the rows at ``indexes``."""
+        storage = self._storage
+        if isinstance(storage, ViewStorage):
+            storage = storage.materialize(self._create_storage(self.storage))
+        return storage.take_rows(indexes)
+
+    def _first_rows(self, columns=None):
+        """Return the indexes of the first row with each distinct
+        combination of values of ``columns`` (all columns by default)."""
+        rows = self._storage.iter_rows()
+        if columns is not None:
+            key = itemgetter(*[self._header_position(column)
+                               for column in columns])
+            rows = imap(key, rows)
+        else:
+            rows = imap(tuple, rows)
+        seen = set()
+        indexes = []
+        for index, row in enumerate(rows):
+            if row not in seen:
+                seen.add(row)
+                indexes.append(index)
+        return indexes
+
+    def distinct(self, columns=None):
+        """Return a new ``Table`` with the distinct rows of this one (each
+        one where it first appears). If ``columns`` is given, the new table
+        has only these columns."""
+        table = self if columns is None else self.view(columns=columns)
+        return table._take(table._first_rows())
+
+    def drop_duplicates(self, columns=None):
+        """Remove *in place* the rows that are equal to a previous one or,
+        if ``columns`` is given, that have the same values as a previous
+        row in these columns."""
+        self._keep_rows(self._first_rows(columns))
+
+    def group_by(self, columns, max_groups=None):
+        """Return the rows grouped by the values of ``columns`` (a header or
+        a list of headers), to be aggregated with ``aggregate``, like
+        ``table.group_by('country').aggregate(sum='amount', count=True)``,
+        which returns a new ``Table``. With ``max_groups``, partial
+        aggregates are spilled to disk when there are more groups than
+        that. See ``outputty.grouping``.
+        """
+        return GroupBy(self, columns, max_groups)
+
+    def join(self, other, on, how='inner', suffixes=('_left', '_right'),
+             algorithm='hash'):
+        """Return a new ``Table`` with the rows of this table joined to the
+        rows of ``other`` (another ``Table``) with the same values in the
+        columns ``on`` (a header or a list of headers that are in both
+        tables). ``how`` is ``'inner'`` (only rows with a match),
+        ``'left'`` (also rows of this table without match), ``'right'``
+        (also rows of ``other`` without match) or ``'outer'`` (both); the
+        columns of the table without match are ``None``.
+
+        The new table has the headers of this table and then the other
+        headers of ``other``; ``suffixes`` are added to the headers that
+        are in both tables (besides ``on``).
+
+        With ``algorithm='hash'``, the rows of the smaller table are kept
+        in a ``dict`` and the larger one is read once, in order.
+        ``algorithm='merge'`` reads both tables at the same time, in the
+        order of the key, which needs less memory but both tables must be
+        ordered by ``on``. See ``outputty.joins``.
+        """
+        join = Join(self, other, on, how, suffixes)
+        if algorithm == 'hash':
+            rows = join.hash_join()
+        elif algorithm == 'merge':
+            rows = join.merge_join()
+        else:
+            raise ValueError("algorithm must be 'hash' or 'merge'.")
+        result = self._new_table(headers=join.headers)
+        size = self.chunk_size
+        for block in iter(lambda: list(islice(rows, size)), []):
+            result.extend(block)
+        result.types = join.types
+        return result
+
+    def _iter_chunks(self):
+        """Iterate over the rows in lists: the chunks of the ``'chunks'``
+        storage or lists of ``chunk_size`` rows for other storages."""
+        if isinstance(self._storage, ChunkedStorage):
+            return self._storage.iter_chunks()
+        rows = self._storage.iter_rows()
+        return iter(lambda: list(islice(rows, self.chunk_size)), [])
+
+    def _get_column(self, name):
+        """Return the values of column ``name`` without copying them when
+        possible (the result must not be changed)."""
+        return self._storage.get_raw_column(self._header_position(name))
 
     def to_dict(self, only=None, key=None, value=None):
-        self.encode()
+        encode = lambda element: _unicode_encode(element,
+                                                 self.output_encoding)
         table_dict = {}
         if key is not None and value is not None:
-            if isinstance(key, str):
-                key = key.decode(self.input_encoding)
-            key = key.encode(self.output_encoding)
-            if isinstance(value, str):
-                value = value.decode(self.input_encoding)
-            value = value.encode(self.output_encoding)
-            key_index = self.headers.index(key)
-            value_index = self.headers.index(value)
-            for row in self._rows:
-                table_dict[row[key_index]] = row[value_index]
-        else:
-            for index, column in enumerate(zip(*self._rows)):
-                header_name = self.headers[index]
+            keys = self[_str_decode(key, self.input_encoding)]
+            values = self[_str_decode(value, self.input_encoding)]
+            for key_value, value_value in izip(keys, values):
+                table_dict[encode(key_value)] = encode(value_value)
+        elif len(self):
+            for header in self.headers:
+                header_name = encode(header)
                 if only is None or header_name in only:
-                    table_dict[header_name] = list(column)
-        self.decode(self.output_encoding)
+                    table_dict[header_name] = [encode(element)
+                                               for element in self[header]]
         return table_dict
 
     def _load_plugin(self, plugin_name):
@@ -291,8 +999,35 @@ class Table(object):
         return self.plugins[plugin_name]
 
     def read(self, plugin_name, *args, **kwargs):
+        """Read the rows of the table with the plugin ``plugin_name``, which
+        receives ``args`` and ``kwargs``.
+
+        If ``where`` is given (a condition, as in ``filter``), only the rows
+        for which it is true are kept. If ``columns`` is given (a list of
+        headers), only these columns are kept, in that order (``where`` can
+        use the other columns too).
+
+        Plugins whose ``read`` accepts a ``where`` or ``columns`` argument
+        use it while reading, so the other rows and columns are not stored
+        (the CSV plugin, for example, converts only the columns used by an
+        expression before testing it and never decodes the columns that are
+        not kept); with other plugins the rows and columns are removed after
+        being read.
+        """
         plugin = self._load_plugin(plugin_name)
-        return plugin.read(self, *args, **kwargs)
+        arguments = getargspec(plugin.read).args
+        where = kwargs.pop('where', None)
+        columns = kwargs.pop('columns', None)
+        if where is not None and 'where' in arguments:
+            kwargs['where'], where = where, None
+        if columns is not None and 'columns' in arguments and where is None:
+            kwargs['columns'], columns = columns, None
+        result = plugin.read(self, *args, **kwargs)
+        if where is not None:
+            self._keep_rows(self._select(where))
+        if columns is not None:
+            self._keep_columns(columns)
+        return result
 
     def write(self, plugin_name, *args, **kwargs):
         plugin = self._load_plugin(plugin_name)
@@ -300,7 +1035,9 @@ class Table(object):
 
     def append(self, item):
         item = self._prepare_to_append(item)
-        self._rows.append(item)
+        start = len(self)
+        self._writable(incremental=True).extend([item])
+        self._index_rows(start, [item])
 
     def _prepare_to_append(self, item):
         if isinstance(item, dict):
@@ -311,7 +1048,7 @@ class Table(object):
                 else:
                     value = None
                 row.append(value)
-        elif isinstance(item, (tuple, set)):
+        elif isinstance(item, (tuple, set, Row)):
             row = list(item)
         elif isinstance(item, list):
             row = item
@@ -332,78 +1069,363 @@ class Table(object):
         new_items = []
         for item in items:
             new_items.append(self._prepare_to_append(item))
-        for item in new_items:
-            self.append(item)
+        start = len(self)
+        self._writable(incremental=True).extend(new_items)
+        self._index_rows(start, new_items)
 
     def __len__(self):
         """Returns the number of rows. Same as ``len(list)``."""
-        return len(self._rows)
+        return len(self._storage)
 
     def count(self, row):
         """Returns how many rows are equal to ``row`` in ``Table``.
         Same as ``list.count``.
         """
-        return self._rows.count(self._prepare_to_append(row))
+        row = self._prepare_to_append(row)
+        row_index = self._row_index()
+        if row_index is not None:
+            return row_index.counts.get(tuple(row), 0)
+        return self._storage.count(row)
+
+    def __contains__(self, row):
+        """Return ``True`` if ``row`` is in the table (``row in table``)."""
+        try:
+            row = self._prepare_to_append(row)
+        except ValueError:
+            return False
+        row_index = self._row_index()
+        if row_index is not None:
+            return tuple(row) in row_index.counts
+        try:
+            self._storage.find(row)
+        except ValueError:
+            return False
+        return True
 
     def index(self, x, i=None, j=None):
         """Returns the index of row ``x`` in table (starting from zero).
         Same as ``list.index``.
         """
         x = self._prepare_to_append(x)
+        row_index = self._row_index()
+        if row_index is not None:
+            key = tuple(x)
+            if key not in row_index.counts:
+                raise ValueError('row not in table')
+            if not row_index.stale or row_index.scanned:
+                start, stop, step = slice(i, j).indices(len(self))
+                index = self._index(None).first(key, start, stop)
+                if index is None:
+                    raise ValueError('row not in table')
+                return index
+            row_index.scanned = True
         if i is None and j is None:
-            return self._rows.index(x)
+            return self._storage.find(x)
         elif j is None:
-            return self._rows.index(x, i)
+            return self._storage.find(x, i)
         else:
-            return self._rows.index(x, i, j)
+            return self._storage.find(x, i, j)
 
     def insert(self, index, row):
         """Insert ``row`` in the position ``index``. Same as ``list.insert``.
         ``row`` can be ``list``, ``tuple`` or ``dict``.
         """
-        self._rows.insert(index, self._prepare_to_append(row))
+        row = self._prepare_to_append(row)
+        length = len(self)
+        self._writable(incremental=True).insert_row(index, row)
+        self._tracked_types().row_inserted(
+                max(0, index + length) if index < 0 else min(index, length),
+                row)
+        if index >= length:
+            self._index_rows(length, [row])
+        else:
+            self._shift_indexes(row, 1)
 
     def pop(self, index=-1):
         """Removes and returns row in position ``index``. ``index`` defaults
         to -1. Same as ``list.pop``.
         """
-        return self._rows.pop(index)
+        last = len(self) - 1
+        row = self._writable(incremental=True).pop(index)
+        self._tracked_types().row_removed(index + last + 1 if index < 0
+                                          else index, row)
+        if index in (-1, last):
+            self._unindex_row(last, row)
+        else:
+            self._shift_indexes(row, -1)
+        return row
 
     def remove(self, row):
         """Removes first occurrence of ``row``. Raises ``ValueError`` if
         ``row`` is not found. Same as ``list.remove``.
         """
-        self._rows.remove(self._prepare_to_append(row))
+        del self[self.index(row)]
+
+    def create_index(self, column, kind='hash'):
+        """Create an index on ``column`` so ``lookup`` finds rows by its
+        value without reading the whole table: a ``'hash'`` index (constant
+        time) or a ``'sorted'`` one (``O(log n)``, also used by
+        ``lookup_range``); see ``outputty.indexes``.
+
+        The index is kept up to date by ``append``, ``extend``, item
+        assignment of single rows and by ``insert``, ``pop``, ``remove`` and
+        ``del`` at the end of the table. Other changes (like ``order_by`` or
+        removing rows in the middle of the table) mark it as stale and it is
+        rebuilt the next time it is used.
+
+        If ``column`` is ``None``, whole rows are indexed (in a hash index),
+        so ``count``, ``index``, ``remove`` and ``in`` take about constant
+        time instead of comparing each row. ``count`` and ``in`` stay
+        constant time after rows are inserted or removed in the middle of
+        the table. ``index`` and ``remove`` then only read the rows to find
+        rows that are in the table, and the index of rows is rebuilt only
+        when ``index`` is called again before other rows are moved.
+        """
+        if kind not in INDEXES:
+            raise ValueError('Index kind must be one of: %s.' %
+                             ', '.join(sorted(INDEXES)))
+        if column is None:
+            if kind != 'hash':
+                raise ValueError('Rows can only have a hash index.')
+            self._indexes[None] = RowIndex(self._index_values(None))
+        else:
+            self._indexes[column] = INDEXES[kind](self._index_values(column))
+
+    def drop_index(self, column):
+        """Remove the index on ``column`` (see ``create_index``)."""
+        del self._indexes[column]
+
+    def _index(self, column):
+        """Return the index on ``column`` (rebuilt if it is stale) or
+        ``None`` if there is no index on it."""
+        index = self._indexes.get(column)
+        if index is not None and index.stale:
+            index = type(index)(self._index_values(column))
+            self._indexes[column] = index
+        return index
+
+    def _row_index(self):
+        """Return the index of rows (see ``create_index``) with up to date
+        ``counts`` or ``None`` if there is no index of rows."""
+        index = self._indexes.get(None)
+        if index is not None and index.counts_stale:
+            index = self._index(None)
+        return index
+
+    def _index_values(self, column):
+        if column is None:
+            return (tuple(row) for row in self._storage.iter_rows())
+        return self[column]
+
+    def _rows_changed(self):
+        """Mark the indexes as stale and forget the types of the columns
+        after the rows are changed in a way they do not follow."""
+        self._stale_indexes()
+        self._column_types.reset()
+
+    def _column_changed(self, header):
+        """Mark the indexes on ``header`` and on whole rows as stale and
+        forget the type of column ``header`` before its values are
+        replaced."""
+        for column in (header, None):
+            index = self._indexes.get(column)
+            if index is not None:
+                index.stale = True
+                if index.kind == 'rows':
+                    index.counts_stale = True
+        self._tracked_types().column_changed(self._header_position(header))
+
+    def _columns_moved(self):
+        """Mark the index of rows as stale before columns are inserted or
+        removed, since its keys are whole rows."""
+        row_index = self._indexes.get(None)
+        if row_index is not None:
+            row_index.stale = row_index.counts_stale = True
+
+    def _stale_indexes(self):
+        for index in self._indexes.itervalues():
+            index.stale = True
+            if index.kind == 'rows':
+                index.counts_stale = True
+
+    def _shift_indexes(self, row, change):
+        """Mark the indexes as stale after ``row`` is inserted (``change``
+        is 1) or removed (-1) in the middle of the table, keeping the counts
+        of the index of rows up to date."""
+        for index in self._indexes.itervalues():
+            index.stale = True
+            if index.kind == 'rows':
+                index.scanned = False
+        self._count_rows([row], change)
+
+    def _count_rows(self, rows, change):
+        """Change the counts of ``rows`` by ``change`` in the index of rows
+        if it has up to date counts but stale row indexes."""
+        row_index = self._indexes.get(None)
+        if row_index is not None and row_index.stale and \
+           not row_index.counts_stale:
+            for row in rows:
+                row_index.counted(tuple(row), change)
+
+    def _live_indexes(self):
+        """Return ``(key function, index)`` for each index that is up to
+        date, the key function returning the value indexed for a row.
+        Indexes of columns that are no longer in the table are marked as
+        stale."""
+        live = []
+        for column, index in self._indexes.iteritems():
+            if index.stale:
+                continue
+            if column is None:
+                live.append((tuple, index))
+            elif self._has_header(column):
+                live.append((itemgetter(self._header_position(column)),
+                             index))
+            else:
+                index.stale = True
+        return live
+
+    def _index_rows(self, start, rows):
+        """Add ``rows``, starting at row ``start``, to the indexes."""
+        for key, index in self._live_indexes():
+            for number, row in enumerate(rows, start):
+                index.add(number, key(row))
+        self._count_rows(rows, 1)
+
+    def _unindex_row(self, number, row):
+        """Remove ``row``, at row ``number``, from the indexes."""
+        for key, index in self._live_indexes():
+            index.discard(number, key(row))
+        self._count_rows([row], -1)
+
+    def _rows_at(self, indexes):
+        """Return the rows at ``indexes`` as ``Row`` objects."""
+        self._update_header_positions()
+        positions = self._header_positions
+        return [Row(self._storage.get_raw_row(index), positions)
+                for index in indexes]
+
+    def lookup(self, column, value):
+        """Return the rows (as ``Row`` objects, in table order) in which
+        ``column`` is equal to ``value``. Uses the index on ``column`` (see
+        ``create_index``) or reads the whole column if there is none."""
+        index = self._index(column)
+        if index is not None:
+            indexes = index.lookup(value)
+        else:
+            indexes = [number for number, column_value
+                       in enumerate(self[column]) if column_value == value]
+        return self._rows_at(indexes)
+
+    def lookup_range(self, column, low=None, high=None):
+        """Return the rows (as ``Row`` objects) in which ``column`` is from
+        ``low`` to ``high`` (both included), ordered by ``column``. Without
+        ``low`` (or ``high``) there is no lower (or upper) limit; rows with
+        ``None`` are not included. Uses the ``'sorted'`` index on
+        ``column`` or reads the whole column if there is none."""
+        index = self._index(column)
+        if index is not None and index.kind == 'sorted':
+            indexes = index.range(low, high)
+        else:
+            pairs = sorted((value, number) for number, value
+                           in enumerate(self[column])
+                           if value is not None and
+                           (low is None or value >= low) and
+                           (high is None or value <= high))
+            indexes = [number for value, number in pairs]
+        return self._rows_at(indexes)
 
     def reverse(self):
         """Reverse the order of rows *in place* (does not return a new
         ``Table``, change the rows in this instance of ``Table``).
         Same as ``list.reverse``.
         """
-        self._rows.reverse()
+        self._writable().reverse()
 
-    def append_column(self, name, values, position=None, row_as_dict=False):
+    def append_column(self, name, values=None, position=None,
+                      row_as_dict=False, batch=False, numpy=False,
+                      workers=None, expr=None):
         """Append a column at position ``position`` (defaults to end of
-        table)"""
-        if (type(values) != types.FunctionType and \
-            len(values) != len(self)) or \
-           name in self.headers:
+        table). ``values`` can be a list or a function that receives each
+        ``Row`` (which supports access by position and by header name) and
+        returns the new value. If ``row_as_dict`` is ``True``, the function
+        receives a ``dict`` mapping each header to its value instead.
+
+        If ``batch`` is ``True``, the function is called only once, with a
+        ``dict`` that maps each header to all the values of that column
+        (``numpy.ndarray`` objects if ``numpy`` is ``True``), and returns
+        the whole new column (a list or a ``numpy.ndarray``).
+
+        If ``workers`` is greater than 1, the function is called for each
+        row in that number of processes (see ``map``).
+
+        ``expr`` can be used instead of ``values``: an expression over the
+        columns, like ``'price * quantity'`` (see ``outputty.expression``),
+        which is compiled once and evaluated over whole columns.
+        """
+        if expr is not None:
+            values = Expression.of(expr)
+        self.append_columns([(name, values)], position=position, batch=batch,
+                            numpy=numpy, workers=workers,
+                            row_as_dict=row_as_dict)
+
+    def append_columns(self, columns, position=None, batch=False,
+                       numpy=False, workers=None, row_as_dict=False):
+        """Append many columns, computing all of them in a single pass over
+        the rows. ``columns`` is a list of ``(name, values)`` pairs, in
+        which ``values`` is like in ``append_column`` (functions receive the
+        rows without any of the new columns) or an ``Expression``. The new
+        columns are inserted in order at position ``position`` (defaults to
+        end of table).
+        """
+        names = [name for name, values in columns]
+        if len(set(names)) != len(names) or \
+           any(self._has_header(name) for name in names):
             raise ValueError
-        if position is None:
-            insert_header = lambda name: self.headers.append(name)
-            insert_data = lambda row, value: row.append(value)
-        else:
-            insert_header = lambda name: self.headers.insert(position, name)
-            insert_data = lambda row, value: row.insert(position, value)
-        for index, row in enumerate(self):
-            if type(values) == types.FunctionType:
-                if row_as_dict:
-                    value = values({header: row[index] \
-                                    for index, header in \
-                                        enumerate(self.headers)})
-                else:
-                    value = values(row)
+        new_columns = [values for name, values in columns]
+        row_functions = []
+        for index, values in enumerate(new_columns):
+            if isinstance(values, Expression):
+                new_columns[index] = values.evaluate(self)
+            elif type(values) != types.FunctionType:
+                if len(values) != len(self):
+                    raise ValueError
+            elif batch:
+                new_columns[index] = values(_Columns(self, as_numpy=numpy))
+                if hasattr(new_columns[index], 'tolist'):
+                    new_columns[index] = new_columns[index].tolist()
+                if len(new_columns[index]) != len(self):
+                    raise ValueError
+            else:
+                new_columns[index] = []
+                row_functions.append((new_columns[index].append, values))
+        if row_functions:
+            functions = [function for append, function in row_functions]
+            if workers > 1:
+                self._update_header_positions()
+                tasks = [(functions, rows, self._header_positions,
+                          row_as_dict)
+                         for rows in self._iter_chunks()]
+                results = chain.from_iterable(_parallel_map(_apply_to_rows,
+                                                            tasks, workers))
             else:
-                value = values[index]
-            insert_data(row, _str_decode(value, self.input_encoding))
-        insert_header(name)
+                rows = iter(self)
+                if row_as_dict:
+                    headers = self.headers
+                    rows = (dict(izip(headers, row)) for row in rows)
+                results = ([function(row) for function in functions]
+                           for row in rows)
+            for values in results:
+                for (append, function), value in izip(row_functions, values):
+                    append(value)
+        new_columns = [[_str_decode(value, self.input_encoding)
+                        for value in values] for values in new_columns]
+        if position is None:
+            position = len(self.headers)
+        column_types = self._tracked_types()
+        self._columns_moved()
+        self._writable(incremental=True).insert_columns(position,
+                                                         new_columns)
+        column_types.columns_inserted(position, len(new_columns))
+        self.headers[position:position] = names
+        self._update_header_positions()
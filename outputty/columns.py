@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact column containers used by ``ColumnStorage``.
+
+They behave like a ``list`` of Python values (indexing, slicing, ``insert``,
+``extend`` etc.) but keep the data in a more compact representation:
+``TypedColumn`` stores numbers and dates in an ``array.array`` and
+``DictionaryColumn`` stores text as small integer codes into a list of
+distinct values.
+Writing a value that does not fit the representation raises ``TypeError``;
+``ColumnStorage`` checks values with ``accepts`` before writing and turns the
+column back into a ``list`` when needed.
+"""
+
+import array
+import datetime
+from abc import ABCMeta, abstractmethod
+from itertools import imap, izip, repeat
+
+
+_INT_TYPECODE = 'l'
+_INT_BITS = array.array(_INT_TYPECODE).itemsize * 8
+_INT_MIN, _INT_MAX = -2 ** (_INT_BITS - 1), 2 ** (_INT_BITS - 1) - 1
+_MICROSECONDS_PER_DAY = 24 * 60 * 60 * 10 ** 6
+
+
+def _is_int(value):
+    return type(value) in (int, long) and _INT_MIN <= value <= _INT_MAX
+
+def _is_float(value):
+    return type(value) is float
+
+def _is_date(value):
+    return type(value) is datetime.date
+
+def _is_datetime(value):
+    return type(value) is datetime.datetime and value.tzinfo is None
+
+def _datetime_to_raw(value):
+    delta = value - datetime.datetime(1, 1, 1)
+    return (delta.days * _MICROSECONDS_PER_DAY + delta.seconds * 10 ** 6 +
+            delta.microseconds)
+
+def _raw_to_datetime(raw):
+    return datetime.datetime(1, 1, 1) + datetime.timedelta(microseconds=raw)
+
+_identity = lambda value: value
+
+#: Largest number of distinct values addressed by each typecode of
+#: ``DictionaryColumn.codes``
+_MAX_CODES = {'H': 2 ** (array.array('H').itemsize * 8)}
+
+#: Default for ``Table.compact``: text columns with at most this ratio of
+#: distinct values per row are dictionary-encoded
+DICTIONARY_RATIO = 0.5
+
+#: type -> (array typecode, validator, to raw value, from raw value)
+CODECS = {int: (_INT_TYPECODE, _is_int, _identity, _identity),
+          float: ('d', _is_float, _identity, _identity),
+          datetime.date: (_INT_TYPECODE, _is_date,
+                          datetime.date.toordinal, datetime.date.fromordinal),
+          datetime.datetime: (_INT_TYPECODE, _is_datetime, _datetime_to_raw,
+                              _raw_to_datetime)}
+
+
+class CompactColumn(object):
+    """Base class for the compact columns.
+
+    Each subclass has its own ``from_values`` constructor, since they need
+    different arguments; ``like`` builds a column of the same kind without
+    knowing which one it is.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def like(self, values):
+        """Return a column of the same kind with ``values`` or ``None`` if
+        they cannot be stored in it."""
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+    @abstractmethod
+    def extend(self, values):
+        pass
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def append(self, value):
+        self.extend([value])
+
+    def map_values(self, function):
+        """Return an iterator over ``function(value)`` for each value."""
+        return imap(function, self)
+
+
+class TypedColumn(CompactColumn):
+    """Column of ``int``, ``float``, ``datetime.date`` or
+    ``datetime.datetime`` values (or ``None``) stored in an ``array.array``.
+
+    ``None`` is stored as a zero in ``values`` and flagged in ``nulls`` (a
+    ``bytearray`` with one byte per value), which is only created when the
+    first ``None`` arrives.
+    """
+
+    def __init__(self, type_, values=()):
+        self.type = type_
+        typecode, self._is_valid, self._to_raw, self._from_raw = CODECS[type_]
+        self.values = array.array(typecode)
+        self.nulls = None
+        self.extend(values)
+
+    @classmethod
+    def from_values(cls, type_, values):
+        """Return a ``TypedColumn`` with ``values`` or ``None`` if any of
+        them cannot be stored in it."""
+        if type_ not in CODECS:
+            return None
+        try:
+            return cls(type_, values)
+        except TypeError:
+            return None
+
+    def like(self, values):
+        return TypedColumn.from_values(self.type, values)
+
+    def accepts(self, values):
+        is_valid = self._is_valid
+        for value in values:
+            if value is not None and not is_valid(value):
+                return False
+        return True
+
+    def _to_raw_values(self, values):
+        raw_values, nulls = array.array(self.values.typecode), bytearray()
+        to_raw, is_valid = self._to_raw, self._is_valid
+        for value in values:
+            if value is None:
+                raw_values.append(0)
+                nulls.append(1)
+            elif is_valid(value):
+                raw_values.append(to_raw(value))
+                nulls.append(0)
+            else:
+                raise TypeError('%r can not be stored in a %s column' %
+                                (value, self.type.__name__))
+        return raw_values, nulls
+
+    def _ensure_nulls(self, nulls):
+        if self.nulls is None and any(nulls):
+            self.nulls = bytearray(len(self.values))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        from_raw = self._from_raw
+        if self.nulls is None:
+            if from_raw is _identity:
+                return iter(self.values)
+            return imap(from_raw, self.values)
+        return (None if null else from_raw(raw)
+                for raw, null in izip(self.values, self.nulls))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        raw = self.values[index]
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return self._from_raw(raw)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            raw_values, nulls = self._to_raw_values(value)
+        else:
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('column assignment index out of range')
+            raw_values, nulls = self._to_raw_values([value])
+            index = slice(index, index + 1)
+        self._ensure_nulls(nulls)
+        self.values[index] = raw_values
+        if self.nulls is not None:
+            self.nulls[index] = nulls
+
+    def __delitem__(self, index):
+        del self.values[index]
+        if self.nulls is not None:
+            del self.nulls[index]
+
+    def __repr__(self):
+        return 'TypedColumn(%s, %r)' % (self.type.__name__, list(self))
+
+    def insert(self, index, value):
+        raw_values, nulls = self._to_raw_values([value])
+        self._ensure_nulls(nulls)
+        self.values.insert(index, raw_values[0])
+        if self.nulls is not None:
+            self.nulls.insert(index, nulls[0])
+
+    def extend(self, values):
+        raw_values, nulls = self._to_raw_values(values)
+        self._ensure_nulls(nulls)
+        self.values.extend(raw_values)
+        if self.nulls is not None:
+            self.nulls.extend(nulls)
+
+    def reverse(self):
+        self.values.reverse()
+        if self.nulls is not None:
+            self.nulls.reverse()
+
+    def copy(self):
+        column = TypedColumn(self.type)
+        column.values = array.array(self.values.typecode, self.values)
+        if self.nulls is not None:
+            column.nulls = bytearray(self.nulls)
+        return column
+
+    def take(self, indexes):
+        """Return a new column with the values at ``indexes``."""
+        column = TypedColumn(self.type)
+        values = self.values
+        column.values = array.array(values.typecode,
+                                    [values[i] for i in indexes])
+        if self.nulls is not None:
+            nulls = self.nulls
+            column.nulls = bytearray(nulls[i] for i in indexes)
+        return column
+
+    def sort_key(self):
+        """Return a function that maps a row index to a sort key that orders
+        like the values themselves (``None`` being the lowest)."""
+        values, nulls = self.values, self.nulls
+        if nulls is None:
+            return values.__getitem__
+        return lambda index: (not nulls[index], values[index])
+
+    def max_width(self):
+        """Return the length of the longest ``unicode`` representation of
+        the values in this column."""
+        non_null = [raw for raw, null in izip(self.values,
+                                              self.nulls or repeat(0))
+                    if not null]
+        widths = [len(unicode(None))] if len(non_null) < len(self) else [0]
+        if not non_null:
+            return max(widths)
+        if self.type is int:
+            widths.extend([len(unicode(min(non_null))),
+                           len(unicode(max(non_null)))])
+        elif self.type is datetime.date:
+            widths.append(10)
+        elif self.type is datetime.datetime:
+            has_microseconds = any(raw % 10 ** 6 for raw in non_null)
+            widths.append(26 if has_microseconds else 19)
+        else:
+            widths.extend(len(unicode(value)) for value in non_null)
+        return max(widths)
+
+    def to_numpy(self):
+        """Return the non-null values as a ``numpy.ndarray`` sharing this
+        column's buffer (only for ``int`` and ``float`` columns)."""
+        import numpy
+
+        if self.type not in (int, float):
+            raise TypeError('Only int and float columns can be converted.')
+        if not len(self):
+            return numpy.array([], dtype=self.values.typecode)
+        result = numpy.frombuffer(self.values, dtype=self.values.typecode)
+        if self.nulls is not None:
+            result = result[numpy.frombuffer(self.nulls,
+                                             dtype=numpy.uint8) == 0]
+        return result
+
+
+class DictionaryColumn(CompactColumn):
+    """Column of ``unicode`` values (or ``None``) stored as integer codes.
+
+    Each distinct value is stored once in ``values``; ``codes`` (an
+    ``array.array`` of unsigned shorts, widened when there are too many
+    distinct values) has the position in ``values`` of each row's value and
+    ``counts`` how many rows use each code. Operations that only need to
+    compare or transform values (sorting, counting, encoding) work on the
+    distinct values instead of on every row.
+    """
+
+    type = str
+
+    def __init__(self, values=()):
+        self.values = []
+        self.counts = []
+        self._codes = {}
+        self.codes = array.array('H')
+        self.extend(values)
+
+    @classmethod
+    def from_values(cls, values):
+        """Return a ``DictionaryColumn`` with ``values`` or ``None`` if any
+        of them is not ``unicode`` nor ``None``."""
+        try:
+            return cls(values)
+        except TypeError:
+            return None
+
+    def like(self, values):
+        return DictionaryColumn.from_values(values)
+
+    def accepts(self, values):
+        for value in values:
+            if value is not None and type(value) is not unicode:
+                return False
+        return True
+
+    def code(self, value):
+        """Return the code of ``value`` or ``None`` if no row has it."""
+        try:
+            code = self._codes.get(value)
+        except TypeError:  # unhashable, so it can not be here
+            return None
+        if code is None or not self.counts[code]:
+            return None
+        return code
+
+    def _to_codes(self, values):
+        codes, codes_by_value = [], self._codes
+        for value in values:
+            code = codes_by_value.get(value)
+            if code is None:
+                if value is not None and type(value) is not unicode:
+                    raise TypeError('%r can not be stored in a dictionary '
+                                    'column' % (value, ))
+                code = codes_by_value[value] = len(self.values)
+                self.values.append(value)
+                self.counts.append(0)
+            codes.append(code)
+        typecode = self.codes.typecode
+        if typecode in _MAX_CODES and len(self.values) > _MAX_CODES[typecode]:
+            self.codes = array.array(_INT_TYPECODE, self.codes)
+        return array.array(self.codes.typecode, codes)
+
+    def _count(self, codes, delta):
+        counts = self.counts
+        for code in codes:
+            counts[code] += delta
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return imap(self.values.__getitem__, self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.values[code] for code in self.codes[index]]
+        return self.values[self.codes[index]]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            codes = self._to_codes(value)
+        else:
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('column assignment index out of range')
+            codes = self._to_codes([value])
+            index = slice(index, index + 1)
+        old_codes = self.codes[index]
+        self.codes[index] = codes
+        self._count(old_codes, -1)
+        self._count(codes, 1)
+
+    def __delitem__(self, index):
+        old_codes = self.codes[index]
+        del self.codes[index]
+        self._count(old_codes if isinstance(index, slice) else [old_codes],
+                    -1)
+
+    def __repr__(self):
+        return 'DictionaryColumn(%r)' % list(self)
+
+    def insert(self, index, value):
+        codes = self._to_codes([value])
+        self.codes.insert(index, codes[0])
+        self._count(codes, 1)
+
+    def extend(self, values):
+        codes = self._to_codes(values)
+        self.codes.extend(codes)
+        self._count(codes, 1)
+
+    def reverse(self):
+        self.codes.reverse()
+
+    def _with_codes(self, codes, counts=None):
+        column = DictionaryColumn()
+        column.values = list(self.values)
+        column._codes = dict(self._codes)
+        column.codes = codes
+        if counts is None:
+            column.counts = [0] * len(self.values)
+            column._count(codes, 1)
+        else:
+            column.counts = counts
+        return column
+
+    def copy(self):
+        return self._with_codes(array.array(self.codes.typecode, self.codes),
+                                list(self.counts))
+
+    def take(self, indexes):
+        """Return a new column with the values at ``indexes``."""
+        codes = self.codes
+        return self._with_codes(array.array(codes.typecode,
+                                            [codes[i] for i in indexes]))
+
+    def sort_key(self):
+        """Return a function that maps a row index to a sort key that orders
+        like the values themselves: the rank of its value among the
+        distinct values."""
+        values = self.values
+        ranks = [0] * len(values)
+        by_value = sorted(xrange(len(values)), key=values.__getitem__)
+        for rank, code in enumerate(by_value):
+            ranks[code] = rank
+        codes = self.codes
+        return lambda index: ranks[codes[index]]
+
+    def max_width(self):
+        """Return the length of the longest ``unicode`` representation of
+        the values in this column."""
+        return max([len(unicode(value))
+                    for value, count in izip(self.values, self.counts)
+                    if count] or [0])
+
+    def map_values(self, function):
+        """Return an iterator over ``function(value)`` for each value,
+        calling ``function`` only once per distinct value."""
+        mapped = [function(value) if count else None
+                  for value, count in izip(self.values, self.counts)]
+        return imap(mapped.__getitem__, self.codes)
+
+    def distinct(self):
+        """Return a list with the values used by at least one row."""
+        return [value for value, count in izip(self.values, self.counts)
+                if count]
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Identification of the types of the columns of a ``Table``, used by
+``Table._identify_type_of_data`` and ``normalize_types``.
+
+``value_types`` finds the types a value can be converted to with a single
+regular expression match and returns them as a mask, with the bit of each
+type in ``TYPES``. The mask of a column has the types all its values can be
+converted to; the type of the column is the narrowest one (``str`` if
+there is none), unless all values are of the same type (not a string).
+
+``ColumnType`` keeps the mask of the first ``rows`` rows of a column, so
+only the rows appended after that are classified the next time the type is
+needed, and how many rows (from the first) were converted to the type of
+the column by ``normalize_types``, so only the other rows are converted
+again. ``ColumnTypes`` updates them when rows are inserted, removed or
+changed; if a removed value may have excluded a type that the other values
+do not exclude, the column is classified again from its first row.
+"""
+
+import datetime
+import re
+from itertools import imap, izip
+
+from outputty.columns import CompactColumn, DictionaryColumn
+from outputty.storage import CHUNK_SIZE
+
+
+#: Types identified, from the narrowest, and the bit of each one in the
+#: masks returned by ``value_types``
+TYPES = ((int, 1), (float, 2), (datetime.date, 4), (datetime.datetime, 8))
+ANY_TYPE = 15
+
+# Matches the values that ``int`` converts back to the same text, the ones
+# ``float`` accepts and the ones matched by ``outputty.date_regex`` and
+# ``outputty.datetime_regex``, in this order
+_value_regex = re.compile(r'(?:(?P<int>0|-?[1-9][0-9]*)\Z|'
+                          r'(?P<float>\s*[+-]?(?:(?:[0-9]+\.?[0-9]*|'
+                          r'\.[0-9]+)(?:e[+-]?[0-9]+)?|'
+                          r'inf(?:inity)?|nan)\s*)\Z|'
+                          r'(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})$|'
+                          r'(?P<datetime>[0-9]{4}-[0-9]{2}-[0-9]{2} '
+                          r'[0-9]{2}:[0-9]{2}:[0-9]{2})$)',
+                          re.IGNORECASE | re.UNICODE)
+_GROUP_TYPES = {'int': 1 | 2, 'float': 2, 'date': 4, 'datetime': 8}
+# Masks of values that are not strings, which do not depend on the value
+_VALUE_TYPES = {int: 1 | 2, long: 1 | 2, float: 2, datetime.date: 4}
+_STRINGS = (str, unicode)
+# Number of distinct strings whose masks are kept while classifying the
+# values of a column
+_CLASSIFIED_VALUES = 65536
+
+
+def value_types(value):
+    """Return the mask of the types in ``TYPES`` to which ``value`` can be
+    converted (all of them for ``None`` and ``''``)."""
+    if value is None or value == '':
+        return ANY_TYPE
+    mask = _VALUE_TYPES.get(type(value))
+    if mask is not None:
+        return mask
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    match = _value_regex.match(value)
+    return 0 if match is None else _GROUP_TYPES[match.lastgroup]
+
+
+def _classify(value, classified):
+    """Return ``value_types(value)``, keeping the masks of strings in
+    ``classified`` so each distinct string is matched once. Other values
+    are not kept, since equal values of different types (``1`` and
+    ``1.0``) can have different masks."""
+    types = classified.get(value)
+    if types is None:
+        types = value_types(value)
+        if isinstance(value, basestring) and \
+           len(classified) < _CLASSIFIED_VALUES:
+            classified[value] = types
+    return types
+
+
+def _distinct(values, mixed):
+    """Return the distinct values in ``values``, keeping equal values of
+    different types apart if ``mixed`` is ``True``."""
+    if mixed:
+        return [value for kind, value in set(izip(imap(type, values),
+                                                  values))]
+    return set(values)
+
+
+def checked_converter(type_, convert, error):
+    """Return a function that converts a value with ``convert``, raising
+    ``error`` first if the value would make ``ColumnType.identify`` find
+    another type for a column identified as ``type_`` in a sample of its
+    values. Values of a type without a bit in ``TYPES`` (as ``long`` or
+    ``decimal.Decimal``) must be of that same type; ``convert`` itself is
+    returned for ``str``, which any value accepts.
+
+    Each distinct string is checked and converted once."""
+    if type_ is str:
+        return convert
+    bit = dict(TYPES).get(type_)
+    converted = {}
+
+    def convert_checked(value):
+        result = converted.get(value, converted)
+        if result is not converted:
+            return result
+        if bit is None:
+            accepted = value is None or type(value) is type_
+        else:
+            accepted = value_types(value) & bit
+        if not accepted:
+            raise error
+        result = convert(value)
+        if isinstance(value, basestring) and \
+           len(converted) < _CLASSIFIED_VALUES:
+            converted[value] = result
+        return result
+    return convert_checked
+
+
+class ColumnType(object):
+    """Types of the values of a column (see the module documentation).
+    ``mask`` has the types to which the values of the first ``rows`` rows
+    can be converted and ``kinds`` their types (besides ``None``); the
+    first ``normalized`` rows were converted to ``type``."""
+
+    __slots__ = ('mask', 'kinds', 'rows', 'normalized', 'type')
+
+    def __init__(self):
+        self.mask, self.kinds, self.rows = ANY_TYPE, set(), 0
+        self.normalized, self.type = 0, None
+
+    def copy(self):
+        column = ColumnType()
+        column.mask, column.kinds = self.mask, set(self.kinds)
+        column.rows, column.normalized = self.rows, self.normalized
+        column.type = self.type
+        return column
+
+    def forget(self):
+        """Classify the values again from the first row."""
+        self.mask, self.kinds, self.rows = ANY_TYPE, set(), 0
+
+    def _settled(self):
+        """Return ``True`` if no value can change the type of the column
+        (only ``str`` is possible)."""
+        return not self.mask and (len(self.kinds) > 1 or
+                                  self.kinds.issubset(_STRINGS))
+
+    def identify(self, chunks, length):
+        """Classify the values of the rows from ``rows`` to ``length``, in
+        ``chunks`` (sequences of values, see ``iter_column_chunks``), and
+        return the type of the column. Each distinct value is classified
+        once and the values are read only until the type can not change."""
+        mask, kinds, classified = self.mask, self.kinds, {}
+        for values in chunks:
+            if self._settled():
+                break
+            if isinstance(values, CompactColumn):
+                kinds.add(values.type)
+                if isinstance(values, DictionaryColumn):
+                    values = values.distinct()
+            else:
+                kinds.update(imap(type, values))
+                kinds.discard(type(None))
+            mixed = not kinds.issubset(_STRINGS)
+            for start in xrange(0, len(values), CHUNK_SIZE):
+                if self._settled():
+                    break
+                for value in _distinct(values[start:start + CHUNK_SIZE],
+                                       mixed):
+                    mask &= _classify(value, classified)
+                    self.mask = mask
+                    if not mask and self._settled():
+                        break
+        self.rows = length
+        if len(kinds) == 1 and not kinds.issubset(_STRINGS):
+            return iter(kinds).next()
+        for type_, bit in TYPES:
+            if mask & bit:
+                return type_
+        return str
+
+    def add(self, index, value):
+        """Update the types after ``value`` is inserted at row ``index``."""
+        if index < self.rows:
+            self.mask &= value_types(value)
+            if value is not None:
+                self.kinds.add(type(value))
+            self.rows += 1
+        if index < self.normalized:
+            self.normalized = index
+
+    def remove(self, index, value):
+        """Update the types after ``value`` is removed from row ``index``."""
+        if index < self.rows:
+            if value is None:
+                self.rows -= 1
+            else:
+                self.forget()
+        if index < self.normalized:
+            self.normalized -= 1
+
+    def change(self, index, old_value, value):
+        """Update the types after ``old_value`` at row ``index`` is replaced
+        by ``value``."""
+        if index < self.rows:
+            mask = value_types(value)
+            if old_value is None:
+                self.mask &= mask
+                if value is not None:
+                    self.kinds.add(type(value))
+            elif type(value) is not type(old_value) or \
+                 mask & ~value_types(old_value):
+                self.forget()
+            else:
+                self.mask &= mask
+        if index < self.normalized:
+            self.normalized = index
+
+
+class ColumnTypes(object):
+    """``ColumnType`` of each column of a ``Table``, updated by the methods
+    that change single rows."""
+
+    def __init__(self, width=0):
+        self.columns = [ColumnType() for position in xrange(width)]
+
+    def __getitem__(self, position):
+        return self.columns[position]
+
+    def __len__(self):
+        return len(self.columns)
+
+    def copy(self):
+        types = ColumnTypes()
+        types.columns = [column.copy() for column in self.columns]
+        return types
+
+    def reset(self, width=None):
+        """Forget everything about the columns (after they are changed in a
+        way the types can not follow)."""
+        if width is None:
+            width = len(self.columns)
+        self.columns = [ColumnType() for position in xrange(width)]
+
+    def row_inserted(self, index, row):
+        for column, value in zip(self.columns, row):
+            column.add(index, value)
+
+    def row_removed(self, index, row):
+        for column, value in zip(self.columns, row):
+            column.remove(index, value)
+
+    def row_changed(self, index, old_row, row):
+        for column, old_value, value in zip(self.columns, old_row, row):
+            column.change(index, old_value, value)
+
+    def column_changed(self, position):
+        self.columns[position] = ColumnType()
+
+    def columns_inserted(self, position, count):
+        self.columns[position:position] = [ColumnType()
+                                           for number in xrange(count)]
+
+    def column_removed(self, position):
+        del self.columns[position]
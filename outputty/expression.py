@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Expressions over the columns of a ``Table``, used by
+``Table.append_column(name, expr=...)`` and ``Table.filter``.
+
+An expression is a Python expression in which names are column headers,
+like ``'price * quantity'`` or ``'total > 100 and status == "ok"'``;
+headers that are not valid Python names can be used with ``col``, as in
+``col("unit price") * quantity``. Only arithmetic, comparisons, boolean
+operators, conditional expressions, literals and a few builtin functions
+(see ``FUNCTIONS``) are allowed.
+
+``None`` values are treated like ``NULL`` in SQL: arithmetic, ``not``,
+ordering comparisons (``<``, ``<=``, ``>``, ``>=``) and the functions in
+``NULL_FUNCTIONS`` return ``None`` if any of their operands is ``None``, so
+rows with ``None`` in the columns compared are not selected by filters.
+``==``, ``!=``, ``is``, ``in`` and boolean operators work as in Python, so
+``col is None`` selects these rows.
+
+The expression is parsed once and compiled to a single function with a
+list comprehension over the columns it uses, so evaluating it does not
+look up names or call a Python function for each row (only rows with
+``None`` in the columns used call functions that check for it).
+"""
+
+import ast
+import copy
+import operator
+from itertools import izip
+
+
+#: Builtin functions that can be called inside expressions
+FUNCTIONS = {'abs': abs, 'bool': bool, 'float': float, 'int': int,
+             'len': len, 'max': max, 'min': min, 'round': round, 'str': str,
+             'unicode': unicode}
+
+#: Functions that return ``None`` when called with ``None``
+NULL_FUNCTIONS = ('abs', 'float', 'int', 'round')
+
+_CONSTANTS = ('True', 'False', 'None')
+
+_ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.BinOp,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv,
+                  ast.Mod, ast.Pow, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                  ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt,
+                  ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot, ast.IfExp,
+                  ast.Call, ast.Name, ast.Load, ast.Num, ast.Str, ast.Tuple,
+                  ast.List)
+
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub,
+              ast.Mult: operator.mul, ast.Div: operator.div,
+              ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+              ast.Pow: operator.pow, ast.USub: operator.neg,
+              ast.UAdd: operator.pos, ast.Not: operator.not_,
+              ast.Eq: operator.eq, ast.NotEq: operator.ne,
+              ast.Lt: operator.lt, ast.LtE: operator.le,
+              ast.Gt: operator.gt, ast.GtE: operator.ge,
+              ast.Is: operator.is_, ast.IsNot: operator.is_not,
+              ast.In: lambda value, values: value in values,
+              ast.NotIn: lambda value, values: value not in values}
+
+_ORDERINGS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+_FUNCTION = 'lambda __columns__, __length__: %s'
+_VALUES_TEMPLATE = '[__expression__ for (%s) in __izip__(*__columns__)]'
+_INDEXES_TEMPLATE = ('[__index__ for __index__, (%s) in '
+                     '__enumerate__(__izip__(*__columns__)) '
+                     'if __expression__]')
+_CONSTANT_VALUES_TEMPLATE = ('[__expression__ for __index__ in '
+                             '__xrange__(__length__)]')
+_CONSTANT_INDEXES_TEMPLATE = ('[__index__ for __index__ in '
+                              '__xrange__(__length__) if __expression__]')
+
+
+def _null_safe(function):
+    """Return a function like ``function`` that returns ``None`` if any
+    of its arguments is ``None``."""
+    def null_safe(*arguments):
+        for argument in arguments:
+            if argument is None:
+                return None
+        return function(*arguments)
+    return null_safe
+
+
+def _compare(operators, *values):
+    """Return the result of the comparisons ``values[0] operators[0]
+    values[1] operators[1] ...`` (``None`` if an ordering comparison has a
+    ``None`` operand)."""
+    for (kind, function), left, right in izip(operators, values, values[1:]):
+        if kind in _ORDERINGS and (left is None or right is None):
+            return None
+        if not function(left, right):
+            return False
+    return True
+
+
+_GLOBALS = dict(FUNCTIONS, __builtins__={}, __izip__=izip,
+                __enumerate__=enumerate, __xrange__=xrange, True=True,
+                False=False, __compare__=_compare)
+_GLOBALS.update(('__null_%s__' % name, _null_safe(FUNCTIONS[name]))
+                for name in NULL_FUNCTIONS)
+_GLOBALS.update(('__%s__' % kind.__name__, (kind, function))
+                for kind, function in _OPERATORS.iteritems())
+_GLOBALS.update(('__null_%s__' % kind.__name__, _null_safe(function))
+                for kind, function in _OPERATORS.iteritems())
+
+
+class _ColumnNames(ast.NodeTransformer):
+    """Check that only allowed nodes are used and replace each column
+    (``header`` or ``col("header")``) by a local variable name."""
+
+    def __init__(self):
+        self.columns = []
+
+    def _variable(self, header, node):
+        if header not in self.columns:
+            self.columns.append(header)
+        name = ast.Name(id='_c%d' % self.columns.index(header),
+                        ctx=ast.Load())
+        return ast.copy_location(name, node)
+
+    def generic_visit(self, node):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError('%s is not allowed in expressions.' %
+                             type(node).__name__)
+        return super(_ColumnNames, self).generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id in _CONSTANTS:
+            return node
+        return self._variable(_decode(node.id), node)
+
+    def visit_Str(self, node):
+        node.s = _decode(node.s)
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords or \
+           node.starargs or node.kwargs:
+            raise ValueError('Only calls like function(arguments) are '
+                             'allowed in expressions.')
+        if node.func.id == 'col':
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Str):
+                raise ValueError('col must receive only the header name.')
+            return self._variable(_decode(node.args[0].s), node)
+        if node.func.id not in FUNCTIONS:
+            raise ValueError('Function %s is not allowed in expressions.' %
+                             node.func.id)
+        node.args = [self.visit(argument) for argument in node.args]
+        return node
+
+
+class _NullSafe(ast.NodeTransformer):
+    """Replace the operations that may have ``None`` operands by calls to
+    functions that return ``None`` in that case (see the module
+    documentation). ``changed`` tells if any operation was replaced."""
+
+    def __init__(self):
+        self.changed = False
+
+    def _call(self, name, arguments, node):
+        self.changed = True
+        call = ast.Call(func=ast.Name(id=name, ctx=ast.Load()),
+                        args=arguments, keywords=[], starargs=None,
+                        kwargs=None)
+        return ast.copy_location(call, node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        return self._call('__null_%s__' % type(node.op).__name__,
+                          [node.left, node.right], node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self._call('__null_%s__' % type(node.op).__name__,
+                          [node.operand], node)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if not any(isinstance(op, _ORDERINGS) for op in node.ops):
+            return node
+        operators = ast.Tuple(elts=[ast.Name(id='__%s__' % type(op).__name__,
+                                             ctx=ast.Load())
+                                    for op in node.ops],
+                              ctx=ast.Load())
+        return self._call('__compare__',
+                          [operators, node.left] + node.comparators, node)
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if node.func.id in NULL_FUNCTIONS:
+            node.func = ast.copy_location(
+                    ast.Name(id='__null_%s__' % node.func.id,
+                             ctx=ast.Load()), node.func)
+            self.changed = True
+        return node
+
+
+class _Placeholder(ast.NodeTransformer):
+    def __init__(self, expression):
+        self.expression = expression
+
+    def visit_Name(self, node):
+        if node.id == '__expression__':
+            return self.expression
+        return node
+
+
+def _decode(value):
+    if isinstance(value, str):
+        return value.decode('utf8')
+    return value
+
+
+class Expression(object):
+    """Expression parsed from ``source`` (see the module documentation).
+    ``columns`` has the headers used by it, in order of appearance.
+    Raises ``ValueError`` if ``source`` is not a valid expression.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as exception:
+            raise ValueError('Invalid expression %r: %s' % (source,
+                                                            exception.msg))
+        transformer = _ColumnNames()
+        self._tree = transformer.visit(tree)
+        self.columns = transformer.columns
+        self._null_safe_tree = self._null_safe(self._tree.body)
+        self._values = self._compile(_VALUES_TEMPLATE,
+                                     _CONSTANT_VALUES_TEMPLATE)
+        self._indexes = self._compile(_INDEXES_TEMPLATE,
+                                      _CONSTANT_INDEXES_TEMPLATE)
+
+    @classmethod
+    def of(cls, expression):
+        """Return ``expression`` if it is an ``Expression`` or parse it."""
+        if isinstance(expression, Expression):
+            return expression
+        return cls(expression)
+
+    def _null_safe(self, expression):
+        """Return ``expression`` with the operations replaced by
+        ``_NullSafe`` or ``None`` if there are no such operations."""
+        if not self.columns:
+            return None
+        transformer = _NullSafe()
+        expression = transformer.visit(copy.deepcopy(expression))
+        return expression if transformer.changed else None
+
+    def _expression(self):
+        """Return the tree of the expression evaluated for each row: the
+        one from ``_null_safe`` for rows with ``None`` in the columns used,
+        if there is one."""
+        if self._null_safe_tree is None:
+            return self._tree.body
+        not_null = ' and '.join('_c%d is not None' % index
+                                for index in xrange(len(self.columns)))
+        tree = ast.parse('__expression__ if %s else __null_safe__' %
+                         not_null, mode='eval').body
+        tree = _Placeholder(self._tree.body).visit(tree)
+        tree.orelse = self._null_safe_tree
+        return tree
+
+    def _compile(self, template, constant_template):
+        if self.columns:
+            names = ''.join('_c%d, ' % index
+                            for index in xrange(len(self.columns)))
+            source = template % names
+        else:
+            source = constant_template
+        tree = ast.parse(_FUNCTION % source, mode='eval')
+        tree = _Placeholder(self._expression()).visit(tree)
+        ast.fix_missing_locations(tree)
+        code = compile(tree, '<expression %r>' % self.source, 'eval')
+        return eval(code, dict(_GLOBALS))
+
+    def _run(self, function, table):
+        return function([table._get_column(header)
+                         for header in self.columns], len(table))
+
+    def evaluate(self, table):
+        """Return a list with the value of the expression for each row of
+        ``table``."""
+        return self._run(self._values, table)
+
+    def select(self, table):
+        """Return a list with the indexes of the rows of ``table`` for which
+        the expression is true."""
+        return self._run(self._indexes, table)
+
+    def __repr__(self):
+        return 'Expression(%r)' % (self.source, )
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Grouping and aggregation of the rows of a ``Table``, used by
+``Table.group_by``.
+
+``GroupBy.aggregate`` reads the columns it needs in blocks of rows, in a
+single pass. For each block it finds the group number of each row in a
+``dict`` (hash aggregation) and then updates the aggregates of the groups
+one column at a time. Typed columns without ``None`` values (see
+``outputty.columns``) are read straight from their arrays and updated
+without checking for ``None``, and dictionary-encoded columns are grouped
+by their integer codes.
+
+With ``max_groups``, the partial aggregates are written to a temporary
+file (sorted by group) whenever there are more groups than that in memory;
+at the end the sorted runs are merged, combining the partial aggregates of
+each group, so the groups come out ordered by their values instead of in
+the order they first appear.
+"""
+
+import heapq
+from itertools import izip, islice
+
+from outputty.columns import DictionaryColumn, TypedColumn
+from outputty.storage import MERGE_BLOCK_SIZE, SpillFile
+
+
+class _Count(object):
+    @staticmethod
+    def new():
+        return 0
+
+    @staticmethod
+    def update(state, groups, values, nulls):
+        if nulls:
+            for group, value in izip(groups, values):
+                if value is not None:
+                    state[group] += 1
+        else:
+            for group in groups:
+                state[group] += 1
+
+    @staticmethod
+    def combine(state, other):
+        return state + other
+
+    @staticmethod
+    def result(state):
+        return state
+
+
+class _Sum(_Count):
+    @staticmethod
+    def update(state, groups, values, nulls):
+        if nulls:
+            for group, value in izip(groups, values):
+                if value is not None:
+                    state[group] += value
+        else:
+            for group, value in izip(groups, values):
+                state[group] += value
+
+
+class _Min(object):
+    @staticmethod
+    def new():
+        return None
+
+    @staticmethod
+    def update(state, groups, values, nulls):
+        for group, value in izip(groups, values):
+            if value is not None:
+                current = state[group]
+                if current is None or value < current:
+                    state[group] = value
+
+    @staticmethod
+    def combine(state, other):
+        if state is None or (other is not None and other < state):
+            return other
+        return state
+
+    @staticmethod
+    def result(state):
+        return state
+
+
+class _Max(_Min):
+    @staticmethod
+    def update(state, groups, values, nulls):
+        for group, value in izip(groups, values):
+            if value is not None:
+                current = state[group]
+                if current is None or value > current:
+                    state[group] = value
+
+    @staticmethod
+    def combine(state, other):
+        if state is None or (other is not None and other > state):
+            return other
+        return state
+
+
+class _Mean(object):
+    @staticmethod
+    def new():
+        return [0, 0]
+
+    @staticmethod
+    def update(state, groups, values, nulls):
+        for group, value in izip(groups, values):
+            if value is not None:
+                total = state[group]
+                total[0] += value
+                total[1] += 1
+
+    @staticmethod
+    def combine(state, other):
+        return [state[0] + other[0], state[1] + other[1]]
+
+    @staticmethod
+    def result(state):
+        total, count = state
+        return total / float(count) if count else None
+
+
+#: Aggregate functions accepted by ``GroupBy.aggregate``, in the order
+#: their columns are added to the result
+AGGREGATES = ('count', 'sum', 'min', 'max', 'mean')
+
+_FUNCTIONS = {'count': _Count, 'sum': _Sum, 'min': _Min, 'max': _Max,
+              'mean': _Mean}
+
+
+def _key_block(column, start, stop):
+    """Return the values of ``column`` from ``start`` to ``stop`` to be
+    used as group keys and a function that decodes them (or ``None``)."""
+    if isinstance(column, DictionaryColumn):
+        return column.codes[start:stop], column.values.__getitem__
+    if isinstance(column, TypedColumn) and column.nulls is None:
+        return column.values[start:stop], column._from_raw
+    return column[start:stop], None
+
+
+def _value_block(column, start, stop):
+    """Return the values of ``column`` from ``start`` to ``stop`` and if
+    they can be ``None``."""
+    if isinstance(column, TypedColumn) and column.nulls is None and \
+       column.type in (int, float):
+        return column.values[start:stop], False
+    return column[start:stop], True
+
+
+class GroupBy(object):
+    """Rows of ``table`` grouped by the values of the columns with headers
+    in ``columns`` (see ``Table.group_by``). If ``max_groups`` is given,
+    partial aggregates are spilled to disk when there are more groups than
+    that (see the module documentation)."""
+
+    def __init__(self, table, columns, max_groups=None):
+        if isinstance(columns, basestring):
+            columns = [columns]
+        if not columns:
+            raise ValueError('At least one column is needed to group rows.')
+        self.table = table
+        self.columns = list(columns)
+        self.max_groups = max_groups
+        self._positions = [table._header_position(column)
+                           for column in self.columns]
+
+    def _outputs(self, aggregations):
+        """Return ``(header, function, position)`` for each column of the
+        result besides the group columns."""
+        unknown = set(aggregations) - set(AGGREGATES)
+        if unknown:
+            raise ValueError('Unknown aggregate functions: %s.' %
+                             ', '.join(sorted(unknown)))
+        outputs = []
+        for name in AGGREGATES:
+            headers = aggregations.get(name)
+            if headers is None:
+                continue
+            if name == 'count' and headers is True:
+                outputs.append(('count', _Count, None))
+                continue
+            if isinstance(headers, basestring):
+                headers = [headers]
+            for header in headers:
+                outputs.append(('%s_%s' % (name, header), _FUNCTIONS[name],
+                                self.table._header_position(header)))
+        return outputs
+
+    def aggregate(self, **aggregations):
+        """Return a new ``Table`` with one row for each group: the values of
+        the group columns followed by the aggregates in ``aggregations``,
+        which maps the name of a function in ``AGGREGATES`` to a header or
+        a list of headers, like ``aggregate(sum='amount', max=['amount',
+        'date'])``. The column of each aggregate is named
+        ``<function>_<header>`` (like ``sum_amount``); ``count=True`` adds
+        a ``count`` column with the number of rows of each group.
+
+        ``None`` values are ignored: ``count`` counts the values that are
+        not ``None``, ``sum`` is ``0`` and ``min``, ``max`` and ``mean``
+        are ``None`` for groups without values. Groups are in the order
+        they first appear (ordered by their values with ``max_groups``).
+        """
+        table = self.table
+        outputs = self._outputs(aggregations)
+        headers = self.columns + [header for header, function, position
+                                  in outputs]
+        result = table._new_table(headers=headers)
+        rows = self._aggregate(outputs)
+        size = table.chunk_size
+        for block in iter(lambda: list(islice(rows, size)), []):
+            result.extend(block)
+        return result
+
+    def _aggregate(self, outputs):
+        """Iterate over the rows of the result (see ``aggregate``)."""
+        storage = self.table._storage
+        key_positions = self._positions
+        positions = list(key_positions)
+        for header, function, position in outputs:
+            if position is not None and position not in positions:
+                positions.append(position)
+        groups, keys, decoders = {}, [], None
+        states = [[] for output in outputs]
+        runs_file, runs = None, []
+        size = self.table.chunk_size
+        for chunk in izip(*[storage.iter_column_chunks(position)
+                            for position in positions]):
+            columns = dict(izip(positions, chunk))
+            length = len(chunk[0])
+            for start in xrange(0, length, size):
+                stop = min(start + size, length)
+                # Compact columns are only used by the ``'columns'``
+                # storage, which has a single chunk, so the decoders are
+                # the same for all blocks.
+                key_blocks = [_key_block(columns[position], start, stop)
+                              for position in key_positions]
+                decoders = [decode for values, decode in key_blocks]
+                ids = []
+                for key in izip(*[values for values, decode in key_blocks]):
+                    group = groups.get(key)
+                    if group is None:
+                        group = groups[key] = len(keys)
+                        keys.append(key)
+                    ids.append(group)
+                for (header, function, position), state in izip(outputs,
+                                                                 states):
+                    state.extend(function.new()
+                                 for index in xrange(len(keys) - len(state)))
+                    if position is None:
+                        values, nulls = ids, False
+                    else:
+                        values, nulls = _value_block(columns[position],
+                                                     start, stop)
+                    function.update(state, ids, values, nulls)
+                if self.max_groups is not None and \
+                   len(keys) > self.max_groups:
+                    runs_file = runs_file or SpillFile()
+                    runs.append(self._spill(runs_file, keys, decoders,
+                                            outputs, states))
+                    groups, keys = {}, []
+                    states = [[] for output in outputs]
+        if not runs:
+            return self._rows(keys, decoders, outputs, states)
+        runs.append(self._spill(runs_file, keys, decoders, outputs, states))
+        return self._merge(runs_file, runs, outputs)
+
+    def _decoded(self, keys, decoders):
+        if decoders is None or not any(decoders):
+            return keys
+        return [tuple(value if decode is None or value is None
+                      else decode(value)
+                      for value, decode in izip(key, decoders))
+                for key in keys]
+
+    def _rows(self, keys, decoders, outputs, states):
+        functions = [function for header, function, position in outputs]
+        for group, key in enumerate(self._decoded(keys, decoders)):
+            yield list(key) + [function.result(state[group])
+                               for function, state in izip(functions,
+                                                           states)]
+
+    def _spill(self, runs_file, keys, decoders, outputs, states):
+        """Write the partial aggregates sorted by group to ``runs_file`` in
+        blocks and return their locations."""
+        partials = sorted(izip(self._decoded(keys, decoders),
+                               izip(*states) if states else
+                               [()] * len(keys)))
+        return [runs_file.dump(partials[start:start + MERGE_BLOCK_SIZE])
+                for start in xrange(0, len(partials), MERGE_BLOCK_SIZE)]
+
+    def _merge(self, runs_file, runs, outputs):
+        """Iterate over the rows of the result merging the sorted runs of
+        partial aggregates written by ``_spill``."""
+        functions = [function for header, function, position in outputs]
+
+        def read_run(number, run):
+            for location in run:
+                for key, partial in runs_file.load(location):
+                    yield key, number, partial
+
+        current_key, current = None, None
+        merged = heapq.merge(*[read_run(number, run)
+                               for number, run in enumerate(runs)])
+        for key, number, partial in merged:
+            if current is not None and key == current_key:
+                current = [function.combine(state, other)
+                           for function, state, other
+                           in izip(functions, current, partial)]
+                continue
+            if current is not None:
+                yield list(current_key) + [function.result(state)
+                                           for function, state
+                                           in izip(functions, current)]
+            current_key, current = key, list(partial)
+        if current is not None:
+            yield list(current_key) + [function.result(state)
+                                       for function, state
+                                       in izip(functions, current)]
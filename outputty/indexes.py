@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Indexes used by ``Table.create_index`` to find rows by the value of a
+column without reading the whole table.
+
+``HashIndex`` maps each value to the indexes of the rows that have it, so
+finding them takes constant time. ``SortedIndex`` keeps the values sorted,
+so it also answers range queries, in ``O(log n)``.
+
+Both keep the row indexes of each value in increasing order and are
+changed with ``add`` and ``discard`` when a row is appended, changed or
+removed at the end of the table. Other changes make the ``Table`` mark the
+index as ``stale``; it is rebuilt the next time it is used.
+
+``RowIndex`` is a ``HashIndex`` of whole rows, used by ``Table.count``,
+``index``, ``remove`` and ``in``.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+
+class HashIndex(object):
+    """Index of ``values`` (one for each row) in a ``dict``."""
+
+    kind = 'hash'
+
+    def __init__(self, values):
+        self.stale = False
+        self._rows = rows = {}
+        for index, value in enumerate(values):
+            if value in rows:
+                rows[value].append(index)
+            else:
+                rows[value] = [index]
+
+    def add(self, index, value):
+        """Add row ``index`` with ``value``."""
+        rows = self._rows.get(value)
+        if rows is None:
+            self._rows[value] = [index]
+        elif rows[-1] < index:
+            rows.append(index)
+        else:
+            insort(rows, index)
+
+    def discard(self, index, value):
+        """Remove row ``index``, which has ``value``."""
+        rows = self._rows[value]
+        rows.remove(index)
+        if not rows:
+            del self._rows[value]
+
+    def lookup(self, value):
+        """Return the indexes of the rows with ``value``."""
+        return list(self._rows.get(value, ()))
+
+    def first(self, value, start=0, stop=None):
+        """Return the first index from ``start`` to ``stop`` (not included)
+        of a row with ``value`` or ``None`` if there is none."""
+        rows = self._rows.get(value, ())
+        position = bisect_left(rows, start)
+        if position < len(rows) and (stop is None or rows[position] < stop):
+            return rows[position]
+        return None
+
+
+class RowIndex(HashIndex):
+    """``HashIndex`` of whole rows, given as tuples. It also keeps how many
+    times each row is in the table in ``counts``, which does not depend on
+    where the rows are: when rows are inserted or removed in the middle of
+    the table ``counted`` is called, so the counts are still up to date
+    (``counts_stale`` is ``False``) while the row indexes are ``stale``.
+    ``scanned`` is set by ``Table.index`` when it reads the rows instead of
+    rebuilding the stale row indexes.
+    """
+
+    kind = 'rows'
+
+    def __init__(self, rows):
+        super(RowIndex, self).__init__(rows)
+        self.counts_stale = self.scanned = False
+        self.counts = {row: len(indexes)
+                       for row, indexes in self._rows.iteritems()}
+
+    def add(self, index, row):
+        super(RowIndex, self).add(index, row)
+        self.counted(row, 1)
+
+    def discard(self, index, row):
+        super(RowIndex, self).discard(index, row)
+        self.counted(row, -1)
+
+    def counted(self, row, change):
+        """Change the number of times ``row`` is in the table by
+        ``change``."""
+        count = self.counts.get(row, 0) + change
+        if count:
+            self.counts[row] = count
+        else:
+            del self.counts[row]
+
+
+class SortedIndex(object):
+    """Index of ``values`` (one for each row) in two lists sorted by value
+    (and row index, for equal values)."""
+
+    kind = 'sorted'
+
+    def __init__(self, values):
+        self.stale = False
+        pairs = sorted((value, index) for index, value in enumerate(values))
+        self._values = [value for value, index in pairs]
+        self._rows = [index for value, index in pairs]
+
+    def _bounds(self, value):
+        return (bisect_left(self._values, value),
+                bisect_right(self._values, value))
+
+    def add(self, index, value):
+        """Add row ``index`` with ``value``."""
+        start, stop = self._bounds(value)
+        position = bisect_left(self._rows, index, start, stop)
+        self._values.insert(position, value)
+        self._rows.insert(position, index)
+
+    def discard(self, index, value):
+        """Remove row ``index``, which has ``value``."""
+        start, stop = self._bounds(value)
+        position = bisect_left(self._rows, index, start, stop)
+        del self._values[position]
+        del self._rows[position]
+
+    def lookup(self, value):
+        """Return the indexes of the rows with ``value``."""
+        start, stop = self._bounds(value)
+        return self._rows[start:stop]
+
+    def range(self, low=None, high=None):
+        """Return the indexes of the rows with values from ``low`` to
+        ``high`` (both included), ordered by value. Without ``low`` (or
+        ``high``) there is no lower (or upper) limit; rows with ``None`` are
+        never included."""
+        values = self._values
+        start = bisect_right(values, None) if low is None \
+                else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        return self._rows[start:stop]
+
+
+#: Kinds of index accepted by ``Table.create_index``
+INDEXES = {'hash': HashIndex, 'sorted': SortedIndex}
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Joins between two ``Table`` objects, used by ``Table.join``.
+
+``hash_join`` keeps the rows of the smaller table in a ``dict`` by key and
+reads the larger one once, looking up the rows with the same key, so it
+takes ``O(n + m)`` time and only the smaller table is kept in memory.
+``merge_join`` reads both tables at the same time and needs only the rows
+of one key in memory, but the tables must be ordered by the key.
+
+Rows with ``None`` in the key never match other rows (as in SQL).
+"""
+
+from itertools import groupby
+from operator import itemgetter
+
+
+#: Kinds of join accepted by ``Table.join``
+JOINS = ('inner', 'left', 'right', 'outer')
+
+
+class Join(object):
+    """Join of ``left`` and ``right`` (``Table`` objects) by the columns
+    with headers in ``on``, which must be in both tables. ``how`` is in
+    ``JOINS``. ``headers`` has the headers of the result: the headers of
+    ``left`` and then the other headers of ``right``, with ``suffixes``
+    added to the headers that are in both tables but not in ``on``.
+    """
+
+    def __init__(self, left, right, on, how='inner',
+                 suffixes=('_left', '_right')):
+        if how not in JOINS:
+            raise ValueError('how must be one of: %s.' % ', '.join(JOINS))
+        if isinstance(on, basestring):
+            on = [on]
+        if not on:
+            raise ValueError('At least one column is needed to join tables.')
+        self.left, self.right, self.how = left, right, how
+        left_positions = [left._header_position(header) for header in on]
+        right_positions = [right._header_position(header) for header in on]
+        self.left_key = itemgetter(*left_positions)
+        self.right_key = itemgetter(*right_positions)
+        self._left_on = zip(left_positions, right_positions)
+        self._right_rest = [position for position, header
+                            in enumerate(right.headers) if header not in on]
+        right_rest = [right.headers[position]
+                      for position in self._right_rest]
+        left_suffix, right_suffix = suffixes
+        self.headers = [header + left_suffix if header in right_rest
+                        else header for header in left.headers]
+        self.headers.extend(header + right_suffix
+                            if header in left.headers else header
+                            for header in right_rest)
+        self.types = {}
+        for header, new_header in zip(left.headers, self.headers):
+            if header in left.types:
+                self.types[new_header] = left.types[header]
+        for position, new_header in zip(self._right_rest,
+                                        self.headers[len(left.headers):]):
+            header = right.headers[position]
+            if header in right.types:
+                self.types[new_header] = right.types[header]
+        self._keep_left = how in ('left', 'outer')
+        self._keep_right = how in ('right', 'outer')
+        self._no_left = [None] * len(left.headers)
+        self._no_right = [None] * len(self._right_rest)
+        self._single = len(on) == 1
+
+    def _has_null(self, key):
+        return key is None if self._single else None in key
+
+    def _row(self, left_row, right_row):
+        """Return a row of the result. ``left_row`` or ``right_row`` is
+        ``None`` for rows without match."""
+        if right_row is None:
+            return list(left_row) + self._no_right
+        if left_row is None:
+            row = list(self._no_left)
+            for left_position, right_position in self._left_on:
+                row[left_position] = right_row[right_position]
+        else:
+            row = list(left_row)
+        row.extend(right_row[position] for position in self._right_rest)
+        return row
+
+    def hash_join(self):
+        """Iterate over the rows of the result, keeping the rows of the
+        smaller table in a ``dict``. The rows are in the order of the
+        larger table; rows of the smaller table without match come at the
+        end."""
+        left_rows = self.left._storage.iter_rows()
+        right_rows = self.right._storage.iter_rows()
+        if len(self.left) <= len(self.right):
+            build, build_key, keep_build = left_rows, self.left_key, \
+                                           self._keep_left
+            probe, probe_key, keep_probe = right_rows, self.right_key, \
+                                           self._keep_right
+            row = lambda build_row, probe_row: self._row(build_row,
+                                                         probe_row)
+        else:
+            build, build_key, keep_build = right_rows, self.right_key, \
+                                           self._keep_right
+            probe, probe_key, keep_probe = left_rows, self.left_key, \
+                                           self._keep_left
+            row = lambda build_row, probe_row: self._row(probe_row,
+                                                         build_row)
+        table, unmatched = {}, []
+        for build_row in build:
+            key = build_key(build_row)
+            if self._has_null(key):
+                unmatched.append(build_row)
+            elif key in table:
+                table[key].append(build_row)
+            else:
+                table[key] = [build_row]
+        matched = set()
+        for probe_row in probe:
+            key = probe_key(probe_row)
+            build_rows = table.get(key) if not self._has_null(key) else None
+            if build_rows:
+                matched.add(key)
+                for build_row in build_rows:
+                    yield row(build_row, probe_row)
+            elif keep_probe:
+                yield row(None, probe_row)
+        if keep_build:
+            for key, build_rows in table.iteritems():
+                if key not in matched:
+                    unmatched.extend(build_rows)
+            for build_row in unmatched:
+                yield row(build_row, None)
+
+    def _groups(self, table, key):
+        """Iterate over ``(key, rows)`` for each key of ``table``, checking
+        that the rows are ordered by the key."""
+        previous = None
+        for value, rows in groupby(table._storage.iter_rows(), key):
+            if previous is not None and value < previous[0]:
+                raise ValueError('Table is not ordered by the join columns.')
+            previous = (value, )
+            yield value, list(rows)
+
+    def merge_join(self):
+        """Iterate over the rows of the result reading both tables at the
+        same time. Both must be ordered by the ``on`` columns (ascending);
+        ``ValueError`` is raised otherwise. The rows are in the order of
+        the key."""
+        lefts = self._groups(self.left, self.left_key)
+        rights = self._groups(self.right, self.right_key)
+        left, right = next(lefts, None), next(rights, None)
+        while left is not None or right is not None:
+            if right is None or (left is not None and
+                                 (left[0] < right[0] or
+                                  self._has_null(left[0]))):
+                if self._keep_left:
+                    for left_row in left[1]:
+                        yield self._row(left_row, None)
+                left = next(lefts, None)
+            elif left is None or right[0] < left[0] or \
+                 self._has_null(right[0]):
+                if self._keep_right:
+                    for right_row in right[1]:
+                        yield self._row(None, right_row)
+                right = next(rights, None)
+            else:
+                for left_row in left[1]:
+                    for right_row in right[1]:
+                        yield self._row(left_row, right_row)
+                left, right = next(lefts, None), next(rights, None)
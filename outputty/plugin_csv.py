@@ -2,8 +2,12 @@
 # coding: utf-8
 
 import csv
+from itertools import islice
 from StringIO import StringIO
 
+from outputty import _orderings
+from outputty.expression import Expression
+
 
 DELIMITER = ','
 QUOTE_CHAR = '"'
@@ -14,8 +18,84 @@ class MyCSV(csv.Dialect):
     skipinitialspace = False
     quoting = csv.QUOTE_ALL
 
+def _encode(table, value):
+    if isinstance(value, str):
+        value = value.decode(table.input_encoding)
+    if isinstance(value, unicode):
+        value = value.encode(table.output_encoding)
+    return value
+
+def _rows(info, positions=None):
+    """Iterate over the rows of the CSV in ``info``, with only the values
+    at ``positions`` (if given); the other values are not decoded."""
+    reader = csv.reader(info.split('\n'), dialect=MyCSV)
+    if positions is None:
+        return ([value.decode('utf8') for value in row]
+                for row in reader if row)
+    return ([row[position].decode('utf8') for position in positions]
+            for row in reader if row)
+
+def _data_rows(info, selected=None, positions=None):
+    """Iterate over the rows of the CSV in ``info`` after the headers (only
+    the ones at the indexes in ``selected``, if given), with only the
+    values at ``positions`` (if given)."""
+    rows = islice(_rows(info, positions), 1, None)
+    if selected is None:
+        return rows
+    return (row for index, row in enumerate(rows) if index in selected)
+
+def _keys(table, info, csv_headers, headers, selected=None):
+    """Return a table with the values of the columns ``headers`` (found in
+    ``csv_headers``, all the headers of the CSV) of the rows returned by
+    ``_data_rows``, with their types identified and converted as in the
+    whole table."""
+    positions = [csv_headers.index(header) for header in headers]
+    keys = table._new_table(headers)
+    keys.extend(list(_data_rows(info, selected, positions)))
+    if table.convert_types:
+        keys.normalize_types()
+    return keys
+
+def _where(table, info, csv_headers, where):
+    """Return the indexes (in a ``set``) of the rows of the CSV in ``info``
+    for which ``where`` is true (see ``Table.filter``). If ``where`` is an
+    expression only the columns it uses are kept and converted."""
+    if isinstance(where, (str, unicode, Expression)):
+        where = Expression.of(where)
+        headers = where.columns
+    else:
+        headers = csv_headers
+    return set(_keys(table, info, csv_headers, headers)._select(where))
+
+def _read_top(table, info, csv_headers, order_by, ordering, limit,
+              selected=None, positions=None):
+    """Add to ``table`` only the first ``limit`` rows of the CSV in
+    ``info`` (from the ones in ``selected``, if given, and with only the
+    values at ``positions``) in the order given by ``order_by`` and
+    ``ordering`` (see ``Table.order_by``), which can use any of the
+    ``csv_headers``. Only the values of the ``order_by`` columns are kept
+    for all rows; the selected rows are taken in a second pass."""
+    if order_by is None:
+        table.extend(list(islice(_data_rows(info, selected, positions),
+                                 limit)))
+        return
+    headers = []
+    for header, descending in _orderings(order_by, ordering):
+        if header not in headers:
+            headers.append(header)
+    keys = _keys(table, info, csv_headers, headers, selected)
+    order = {index: number for number, index
+             in enumerate(keys._top_indexes(order_by, ordering, None, limit))}
+    rows = [None] * len(order)
+    for index, row in enumerate(_data_rows(info, selected, positions)):
+        if index in order:
+            rows[order[index]] = row
+    table.extend(rows)
+
 def read(table, file_name_or_pointer, convert_types=True, delimiter=DELIMITER,
-         quote_char=QUOTE_CHAR, line_terminator=LINE_TERMINATOR):
+         quote_char=QUOTE_CHAR, line_terminator=LINE_TERMINATOR,
+         compact=False, order_by=None, ordering='asc', limit=None,
+         where=None, columns=None, sample_size=None):
     MyCSV.delimiter = delimiter
     MyCSV.quotechar = quote_char
     MyCSV.lineterminator = line_terminator
@@ -26,24 +106,48 @@ def read(table, file_name_or_pointer, convert_types=True, delimiter=DELIMITER,
     else:
         fp = file_name_or_pointer
     info = fp.read().decode(table.input_encoding).encode('utf8')
-    reader = csv.reader(info.split('\n'), dialect=MyCSV)
-    table.data = [x for x in reader if x]
     if table.csv_filename:
         fp.close()
-    table.headers = []
-    if table.data:
-        table.headers = [x.decode('utf8') for x in table.data[0]]
-        table.extend([[y.decode('utf8') for y in x] for x in table.data[1:]])
-        if table.convert_types:
-            table.normalize_types()
+    csv_headers = next(_rows(info), [])
+    table.headers = list(csv_headers)
+    selected = positions = None
+    if where is not None and csv_headers:
+        selected = _where(table, info, csv_headers, where)
+    kept = columns
+    if columns is not None and csv_headers:
+        if order_by is not None and limit is None:
+            # rows are ordered after being read: keep the order_by
+            # columns until then
+            columns = list(columns)
+            for header, descending in _orderings(order_by, ordering):
+                if header not in columns:
+                    columns.append(header)
+        positions = [table._header_position(header) for header in columns]
+        table.headers = [csv_headers[position] for position in positions]
+    if limit is not None:
+        _read_top(table, info, csv_headers, order_by, ordering, limit,
+                  selected, positions)
+    elif selected is not None or positions is not None:
+        table.extend(list(_data_rows(info, selected, positions)))
+    else:
+        reader = csv.reader(info.split('\n'), dialect=MyCSV)
+        table.data = [x for x in reader if x]
+        if table.data:
+            table.headers = [x.decode('utf8') for x in table.data[0]]
+            table.extend([[y.decode('utf8') for y in x]
+                          for x in table.data[1:]])
+    if table.headers and table.convert_types:
+        table.normalize_types(compact=compact, sample_size=sample_size)
+    if order_by is not None and limit is None:
+        table.order_by(order_by, ordering)
+    if kept is not None and csv_headers:
+        table._keep_columns(kept)
 
 def write(table, filename_or_pointer=None, delimiter=DELIMITER,
           quote_char=QUOTE_CHAR, line_terminator=LINE_TERMINATOR):
     MyCSV.delimiter = delimiter
     MyCSV.quotechar = quote_char
     MyCSV.lineterminator = line_terminator
-    table.decode()
-    table.encode()
     if filename_or_pointer is not None:
         if isinstance(filename_or_pointer, (str, unicode)):
             fp = open(filename_or_pointer, 'w')
@@ -54,9 +158,9 @@ def write(table, filename_or_pointer=None, delimiter=DELIMITER,
     else:
         fp = StringIO()
     writer = csv.writer(fp, dialect=MyCSV)
-    writer.writerow(table.headers)
-    writer.writerows(table)
-    table.decode(table.output_encoding)
+    writer.writerow([_encode(table, value) for value in table.headers])
+    for row in table._iter_mapped_rows(lambda value: _encode(table, value)):
+        writer.writerow(row)
     if filename_or_pointer is None:
         contents = fp.getvalue()
         fp.close()
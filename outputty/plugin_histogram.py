@@ -7,7 +7,9 @@ from numpy import histogram, ceil
 
 def write(table, column, orientation='vertical', height=4, character='|',
           bins=5):
-    values = zip(*table)[table.headers.index(column)]
+    values = table._get_column(column)
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
     table.histogram = histogram(values, bins)
     his = []
     bars = table.histogram[0] / max(table.histogram[0]) * height
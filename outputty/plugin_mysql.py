@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import ast
 import datetime
 from unicodedata import normalize
 import MySQLdb
 
+from outputty.expression import Expression
+
 
 MYSQL_TYPE = {str: 'TEXT', int: 'INT', float: 'FLOAT', datetime.date: 'DATE',
               datetime.datetime: 'DATETIME'}
@@ -30,6 +33,8 @@ MYSQLDB_TO_PYTHON = {'ENUM': str,
                      'TIME': int,
                      'TIMESTAMP': int,
                      'DATETIME': datetime.datetime}
+SQL_OPERATORS = {ast.Eq: '=', ast.NotEq: '<>', ast.Lt: '<', ast.LtE: '<=',
+                 ast.Gt: '>', ast.GtE: '>=', ast.In: 'IN', ast.NotIn: 'NOT IN'}
 
 def slug(text, encoding=None, separator='_',
          permitted_chars='ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_',
@@ -71,31 +76,124 @@ def _get_mysql_config(connection_str):
 def _connect_to_mysql(config):
     return MySQLdb.connect(**config)
 
-def read(table, connection_string, limit=None, order_by=None, query=''):
+def _sql_name(header):
+    return '`' + header.replace('`', '``') + '`'
+
+def _sql_number(number):
+    if isinstance(number, (int, long)):
+        return str(number)
+    if isinstance(number, float) and number - number == 0:
+        return repr(number)
+    raise ValueError('Value can not be used in SQL.')
+
+def _sql_value(node, columns, quote):
+    if isinstance(node, ast.Name):
+        if node.id in ('True', 'False'):
+            return '1' if node.id == 'True' else '0'
+        if node.id.startswith('_c'):
+            return _sql_name(columns[int(node.id[2:])])
+    elif isinstance(node, ast.Num):
+        return _sql_number(node.n)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and \
+         isinstance(node.operand, ast.Num):
+        return _sql_number(-node.operand.n)
+    elif isinstance(node, ast.Str):
+        return quote(node.s)
+    elif isinstance(node, (ast.Tuple, ast.List)) and node.elts:
+        return '(' + ', '.join(_sql_value(element, columns, quote)
+                               for element in node.elts) + ')'
+    raise ValueError('Value can not be used in SQL.')
+
+def _sql_condition(node, columns, quote):
+    if isinstance(node, ast.BoolOp):
+        operator = ' AND ' if isinstance(node.op, ast.And) else ' OR '
+        return '(' + operator.join(_sql_condition(value, columns, quote)
+                                   for value in node.values) + ')'
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return 'NOT ' + _sql_condition(node.operand, columns, quote)
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        operator, other = type(node.ops[0]), node.comparators[0]
+        left = _sql_value(node.left, columns, quote)
+        if isinstance(other, ast.Name) and other.id == 'None':
+            if operator in (ast.Eq, ast.Is):
+                return '(' + left + ' IS NULL)'
+            if operator in (ast.NotEq, ast.IsNot):
+                return '(' + left + ' IS NOT NULL)'
+        elif operator in SQL_OPERATORS:
+            return '({} {} {})'.format(left, SQL_OPERATORS[operator],
+                                       _sql_value(other, columns, quote))
+    raise ValueError('Condition can not be translated to SQL.')
+
+def _where_clause(where, quote):
+    """Return the SQL condition for the expression ``where`` (see
+    ``outputty.expression``), using ``quote`` to quote strings, or ``None``
+    if it is not made only of comparisons (``==``, ``!=``, ``<``, ``<=``,
+    ``>``, ``>=``, ``in`` and ``not in``) between columns and literals,
+    ``is None``, ``and``, ``or`` and ``not``."""
+    if not isinstance(where, (str, unicode, Expression)):
+        return None
+    where = Expression.of(where)
+    try:
+        return _sql_condition(where._tree.body, where.columns, quote)
+    except ValueError:
+        return None
+
+def read(table, connection_string, limit=None, order_by=None, query='',
+         where=None, columns=None):
+    """Read the rows of the table in ``connection_string`` (or the result
+    of ``query``). ``where`` (see ``Table.filter``) is sent to the server in
+    the ``WHERE`` clause if it is an expression that can be translated to
+    SQL (see ``_where_clause``); rows with ``NULL`` in the columns compared
+    never match it, as in SQL. Otherwise the rows are filtered after being
+    read. Only the columns with headers in ``columns`` (all by default)
+    are selected."""
     config, table_name = _get_mysql_config(connection_string)
     connection = _connect_to_mysql(config)
     cursor = connection.cursor()
+    encoding = connection.character_set_name()
     if query:
         sql = query
     else:
-        sql = 'SELECT * FROM ' + table_name
-        if limit is not None:
-            sql += ' LIMIT {0[0]}, {0[1]}'.format(limit)
+        condition = None
+        if where is not None:
+            quote = lambda value: '"' + connection.escape_string(
+                    value.encode(encoding)).decode(encoding) + '"'
+            condition = _where_clause(where, quote)
+            if condition is not None:
+                where = None
+        if columns is not None and where is None:
+            sql = 'SELECT ' + ', '.join(_sql_name(header)
+                                        for header in columns)
+            sql += ' FROM ' + table_name
+            columns = None
+        else:
+            sql = 'SELECT * FROM ' + table_name
+        if condition is not None:
+            sql += ' WHERE ' + condition
         if order_by is not None:
             sql += ' ORDER BY ' + order_by
+        if limit is not None and where is None:
+            sql += ' LIMIT {0[0]}, {0[1]}'.format(limit)
     cursor.execute(sql)
     column_info = [(x[0], x[1]) for x in cursor.description]
     table.headers = [x[0] for x in cursor.description]
     table.types = {name: MYSQLDB_TO_PYTHON[MYSQLDB_TYPE[type_]] \
                    for name, type_ in column_info}
-    table._rows = [list(row) for row in cursor.fetchall()]
-    encoding = connection.character_set_name()
-    for row_index, row in enumerate(table):
-        for column_index, value in enumerate(row):
-            if type(value) is str:
-                table[row_index][column_index] = value.decode(encoding)
+    rows = []
+    for row in cursor.fetchall():
+        rows.append([value.decode(encoding) if type(value) is str else value
+                     for value in row])
+    del table[:]
+    table.extend(rows)
     cursor.close()
     connection.close()
+    if where is not None:
+        indexes = table._select(where)
+        if limit is not None and not query:
+            indexes = indexes[limit[0]:limit[0] + limit[1]]
+        table._keep_rows(indexes)
+    if columns is not None:
+        table._keep_columns(columns)
 
 def write(table, connection_string, encoding=None):
     config, table_name = _get_mysql_config(connection_string)
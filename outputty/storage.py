@@ -0,0 +1,1358 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Storage engines used by ``Table`` to keep its data.
+
+``RowStorage`` (the default) keeps a list of rows, each row being a ``list``.
+``ColumnStorage`` keeps a list of columns instead, so reading one column does
+not need to touch the others and rows are created on demand (as
+``ReadOnlyRow`` objects, since changing them would not change the table;
+use ``table[index] = row`` instead). Its columns can
+be compacted into typed arrays or dictionary-encoded (see
+``outputty.columns``). ``ChunkedStorage`` keeps the rows in chunks of at
+most ``chunk_size`` rows, each with its own statistics, so appending never
+needs to move the rows already stored and each chunk can be processed on its
+own; with ``max_memory`` it writes the oldest chunks to a temporary file
+instead of keeping all of them in memory.
+
+All of them have the same interface and ``Table`` only talks to its data
+through it, so plugins and ``Table`` methods do not need to know which one is
+in use.
+"""
+
+import cPickle
+import heapq
+import mmap
+import re
+import tempfile
+from bisect import bisect_left, bisect_right
+from itertools import chain, count, imap, islice, izip
+from operator import itemgetter
+from sys import getsizeof
+
+from outputty.columns import CompactColumn, DictionaryColumn, TypedColumn
+
+
+#: Default number of rows per chunk (see ``ChunkedStorage`` and
+#: ``iter_column_chunks``)
+CHUNK_SIZE = 10000
+
+#: Number of rows used by ``Chunk.size`` to estimate the memory used by a
+#: chunk
+SIZE_SAMPLE = 100
+
+#: Maximum number of rows read at a time from each sorted run by
+#: ``ChunkedStorage.sort`` when it is spilling to disk
+MERGE_BLOCK_SIZE = 1000
+
+_SIZE_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d*)?)\s*([KMGT]?)B?\s*$', re.IGNORECASE)
+
+
+def parse_size(size):
+    """Return the number of bytes in ``size``: a number or a string like
+    ``'512MB'``, ``'1.5G'`` or ``'100 KB'`` (units are powers of 1024).
+    Raises ``ValueError`` if it is not a valid size."""
+    if isinstance(size, (int, long, float)):
+        return int(size)
+    match = _SIZE.match(size)
+    if match is None:
+        raise ValueError('Invalid size: %r' % (size, ))
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+class ReadOnlyRow(list):
+    """A row created from the data of a storage that does not keep it as a
+    ``list`` (see ``ColumnStorage.get_row``). Changing it would not change
+    the storage, so the methods that change it raise ``TypeError``."""
+
+    def _read_only(self, *args):
+        raise TypeError('This row is a copy of the data in the table and can '
+                        'not be changed; use table[index] = row instead.')
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _read_only
+    __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __reduce__(self):
+        return (list, (list(self), ))
+
+
+class RowStorage(object):
+    def __init__(self, rows=None):
+        self.rows = rows if rows is not None else []
+        self._shared_list = self._shared_rows = False
+        self._owned = set()
+
+    def copy(self):
+        """Return a new storage sharing the data with this one. Both copy
+        the list of rows before changing it and each row before handing it
+        out or changing it in place (copy-on-write), keeping the ``id`` of
+        the rows already copied in ``_owned``."""
+        storage = RowStorage(self.rows)
+        for shared in (self, storage):
+            shared._shared_list = shared._shared_rows = True
+            shared._owned = set()
+        return storage
+
+    def _own_list(self):
+        if self._shared_list:
+            self.rows = list(self.rows)
+            self._shared_list = False
+        return self.rows
+
+    def _own_rows(self):
+        if self._shared_rows:
+            owned = self._owned
+            self._replace_rows([row if id(row) in owned else list(row)
+                                for row in self.rows])
+        return self.rows
+
+    def _own_row(self, index):
+        """Return the row at ``index`` (an ``int``), copying it first if it
+        may be shared with a copy of this storage."""
+        row = self.rows[index]
+        if self._shared_rows and id(row) not in self._owned:
+            row = list(row)
+            self._own_list()[index] = row
+            self._owned.add(id(row))
+        return row
+
+    def _replace_rows(self, rows):
+        self.rows = rows
+        self._shared_list = self._shared_rows = False
+        self._owned = set()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_row(self, index):
+        """Return the row at ``index``, which can be changed in place
+        without changing the copies of this storage."""
+        return self._own_row(index)
+
+    def get_raw_row(self, index):
+        """Return the row at ``index`` as stored (not to be changed)."""
+        return self.rows[index]
+
+    def get_rows(self, index):
+        if not self._shared_rows:
+            return self.rows[index]
+        return [self._own_row(i)
+                for i in xrange(*index.indices(len(self.rows)))]
+
+    def iter_rows(self):
+        return iter(self.rows)
+
+    def iter_mapped_rows(self, functions):
+        """Iterate over rows with each value replaced by
+        ``functions[position](value)``, without changing the storage."""
+        return ([function(value) for function, value in izip(functions, row)]
+                for row in self.rows)
+
+    def set_rows(self, index, rows):
+        self._own_list()[index] = rows
+
+    def delete_rows(self, index):
+        del self._own_list()[index]
+
+    def insert_row(self, index, row):
+        self._own_list().insert(index, row)
+
+    def extend(self, rows):
+        self._own_list().extend(rows)
+
+    def pop(self, index):
+        row = self._own_list().pop(index)
+        if self._shared_rows and id(row) not in self._owned:
+            return list(row)
+        return row
+
+    def reverse(self):
+        self._own_list().reverse()
+
+    def count(self, row):
+        return self.rows.count(row)
+
+    def find(self, row, *args):
+        return self.rows.index(row, *args)
+
+    def get_column(self, position):
+        return [row[position] for row in self.rows]
+
+    get_raw_column = get_column
+
+    def iter_column_chunks(self, position, start=0):
+        """Iterate over the values of the column at ``position`` (from row
+        ``start``) in lists of at most ``CHUNK_SIZE`` values."""
+        rows = self.rows
+        for start in xrange(start, len(rows), CHUNK_SIZE):
+            yield [row[position] for row in islice(rows, start,
+                                                   start + CHUNK_SIZE)]
+
+    def column_width(self, position):
+        return max([len(unicode(row[position])) for row in self.rows] or [0])
+
+    def set_column(self, position, values):
+        for row, value in izip(self._own_rows(), values):
+            row[position] = value
+
+    def set_columns(self, columns):
+        """Replace the values of many columns (``columns`` maps positions
+        to lists of values) in a single pass over the rows."""
+        columns = columns.items()
+        for index, row in enumerate(self._own_rows()):
+            for position, values in columns:
+                row[position] = values[index]
+
+    def take_rows(self, indexes):
+        """Return a new storage with a copy of the rows at ``indexes``."""
+        rows = self.rows
+        return RowStorage([list(rows[index]) for index in indexes])
+
+    def insert_columns(self, position, columns):
+        """Insert ``columns`` (one list of values for each) starting at
+        ``position``, in a single pass over the rows."""
+        for row, values in izip(self._own_rows(), izip(*columns)):
+            row[position:position] = values
+
+    def delete_column(self, position):
+        for row in self._own_rows():
+            del row[position]
+
+    def sort(self, keys):
+        """Sort the rows (stable) by ``keys``: a list of ``(position,
+        descending, nulls)``, the first one being the most significant (see
+        ``Table.order_by``)."""
+        _stable_sort(self._own_list(), _row_keys(keys))
+
+    def top(self, keys, limit):
+        """Return the indexes of the first ``limit`` rows in the order of
+        ``keys`` (see ``sort``), without sorting all rows."""
+        return _top(self.rows, _row_keys(keys), limit)
+
+    def map_columns(self, functions, start=0):
+        """Replace each value of the rows from ``start`` by
+        ``functions[position](value)`` (the values of the columns whose
+        function is ``None`` are kept)."""
+        functions = [function or _same for function in functions]
+        rows = self.rows
+        shared = self._shared_rows and start > 0
+        self._replace_rows(rows[:start] +
+                           [[function(value)
+                             for function, value in izip(functions, row)]
+                            for row in islice(rows, start, None)])
+        self._shared_rows = shared
+
+
+class ColumnStorage(object):
+    def __init__(self, columns=None):
+        self.columns = columns if columns is not None else []
+        self.length = len(self.columns[0]) if self.columns else 0
+        self._shared = set()
+
+    def __len__(self):
+        return self.length
+
+    def copy(self):
+        """Return a new storage sharing the columns with this one. Each
+        column is copied by a storage only before that storage changes it
+        (copy-on-write), so untouched columns are never duplicated."""
+        shared = set(id(column) for column in self.columns)
+        self._shared |= shared
+        storage = ColumnStorage(list(self.columns))
+        storage._shared = set(shared)
+        return storage
+
+    def _own(self, position):
+        column = self.columns[position]
+        if id(column) in self._shared:
+            self._shared.discard(id(column))
+            column = column.copy() if isinstance(column, CompactColumn) \
+                     else list(column)
+            self.columns[position] = column
+        return column
+
+    def _own_all(self):
+        if self._shared:
+            for position in xrange(len(self.columns)):
+                self._own(position)
+        return self.columns
+
+    def _row_indexes(self, index):
+        return xrange(*index.indices(self.length))
+
+    def get_row(self, index):
+        """Return the row at ``index`` as a ``ReadOnlyRow``."""
+        return ReadOnlyRow(self.get_raw_row(index))
+
+    def get_raw_row(self, index):
+        if index < -self.length or index >= self.length:
+            raise IndexError('row index out of range')
+        return [column[index] for column in self.columns]
+
+    def get_rows(self, index):
+        return [self.get_row(i) for i in self._row_indexes(index)]
+
+    def iter_rows(self):
+        if not self.columns:
+            return iter([[]] * self.length)
+        return (list(row) for row in izip(*self.columns))
+
+    def iter_mapped_rows(self, functions):
+        """Iterate over rows with each value replaced by
+        ``functions[position](value)``, without changing the storage.
+        Dictionary-encoded columns call the function once per distinct
+        value."""
+        if not self.columns:
+            return iter([[]] * self.length)
+        columns = [column.map_values(function)
+                   if isinstance(column, CompactColumn)
+                   else imap(function, column)
+                   for function, column in izip(functions, self.columns)]
+        return (list(row) for row in izip(*columns))
+
+    def set_rows(self, index, rows):
+        if isinstance(index, slice):
+            indexes = self._row_indexes(index)
+            if index.step not in (None, 1):
+                if len(indexes) != len(rows):
+                    raise ValueError('attempt to assign sequence of size %d '
+                                     'to extended slice of size %d' %
+                                     (len(rows), len(indexes)))
+            if rows:
+                self._prepare_columns(rows[0])
+            new_columns = zip(*rows) if rows else [()] * len(self.columns)
+            self._accept(new_columns)
+            for column, values in izip(self._own_all(), new_columns):
+                column[index] = values
+            self.length += len(rows) - len(indexes)
+        else:
+            self.get_raw_row(index)  # raises IndexError
+            self._accept([[value] for value in rows])
+            for column, value in izip(self._own_all(), rows):
+                column[index] = value
+
+    def delete_rows(self, index):
+        if isinstance(index, slice):
+            removed = len(self._row_indexes(index))
+        else:
+            self.get_raw_row(index)
+            removed = 1
+        for column in self._own_all():
+            del column[index]
+        self.length -= removed
+
+    def insert_row(self, index, row):
+        self._prepare_columns(row)
+        self._accept([[value] for value in row])
+        for column, value in izip(self._own_all(), row):
+            column.insert(index, value)
+        self.length += 1
+
+    def _prepare_columns(self, row):
+        if not self.length:
+            self.columns = [[] for value in row]
+
+    def _accept(self, new_columns):
+        """Turn typed columns that can not store the values of
+        ``new_columns`` (one sequence of values per column) into lists."""
+        for position, values in enumerate(new_columns):
+            column = self.columns[position]
+            if isinstance(column, CompactColumn) and \
+               not column.accepts(values):
+                self.columns[position] = list(column)
+
+    def _compact_like(self, column, values):
+        if isinstance(column, CompactColumn):
+            compact_column = column.like(values)
+            if compact_column is not None:
+                return compact_column
+        return values
+
+    def extend(self, rows):
+        if not rows:
+            return
+        self._prepare_columns(rows[0])
+        new_columns = zip(*rows)
+        self._accept(new_columns)
+        for column, values in izip(self._own_all(), new_columns):
+            column.extend(values)
+        self.length += len(rows)
+
+    def pop(self, index):
+        row = self.get_raw_row(index)
+        self.delete_rows(index)
+        return row
+
+    def reverse(self):
+        for column in self._own_all():
+            column.reverse()
+
+    def _candidates(self, row):
+        """Return the indexes of the rows that can be equal to ``row``,
+        selected by the codes of its dictionary-encoded columns, or ``None``
+        if there are no such columns."""
+        candidates = None
+        for column, value in izip(self.columns, row):
+            if isinstance(column, DictionaryColumn):
+                code = column.code(value)
+                if code is None:
+                    return []
+                codes = column.codes
+                if candidates is None:
+                    candidates = [index for index, other in enumerate(codes)
+                                  if other == code]
+                else:
+                    candidates = [index for index in candidates
+                                  if codes[index] == code]
+        return candidates
+
+    def count(self, row):
+        candidates = self._candidates(row)
+        if candidates is None:
+            return sum(1 for other in self.iter_rows() if other == row)
+        return sum(1 for index in candidates
+                   if self.get_raw_row(index) == row)
+
+    def find(self, row, start=0, stop=None):
+        start, stop, step = slice(start, stop).indices(self.length)
+        candidates = self._candidates(row)
+        if candidates is None:
+            candidates = xrange(start, stop)
+        for index in candidates:
+            if start <= index < stop and self.get_raw_row(index) == row:
+                return index
+        raise ValueError('row not in table')
+
+    def get_column(self, position):
+        if not self.length:
+            return []
+        return list(self.columns[position])
+
+    def set_column(self, position, values):
+        self.columns[position] = self._compact_like(self.columns[position],
+                                                    list(values))
+
+    def set_columns(self, columns):
+        for position, values in columns.iteritems():
+            self.set_column(position, values)
+
+    def take_rows(self, indexes):
+        if not indexes:
+            return ColumnStorage([[] for column in self.columns])
+        return ColumnStorage([column.take(indexes)
+                              if isinstance(column, CompactColumn)
+                              else [column[index] for index in indexes]
+                              for column in self.columns])
+
+    def insert_columns(self, position, columns):
+        self.columns[position:position] = [list(values) for values in columns]
+
+    def delete_column(self, position):
+        del self.columns[position]
+
+    def permute(self, indexes):
+        """Reorder all rows so the row at ``indexes[i]`` goes to ``i``."""
+        self.columns = [column.take(indexes)
+                        if isinstance(column, CompactColumn)
+                        else [column[i] for i in indexes]
+                        for column in self.columns]
+
+    def sort(self, keys):
+        """Sort the rows (stable) by ``keys`` (see ``RowStorage.sort``).
+        Row indexes are sorted using keys precomputed by compact columns,
+        then all columns are permuted at once."""
+        indexes = range(self.length)
+        if self.length:
+            _stable_sort(indexes, self._index_keys(keys))
+        self.permute(indexes)
+
+    def top(self, keys, limit):
+        """Return the indexes of the first ``limit`` rows in the order of
+        ``keys``, without sorting all rows."""
+        if not self.length:
+            return []
+        return _top(xrange(self.length), self._index_keys(keys), limit)
+
+    def _index_keys(self, keys):
+        """Return a ``(key function, descending)`` pair over row indexes for
+        each ``(position, descending, nulls)`` in ``keys``."""
+        index_keys = []
+        for position, descending, nulls in keys:
+            column = self.columns[position]
+            if isinstance(column, CompactColumn):
+                key = column.sort_key()
+            else:
+                key = column.__getitem__
+            index_keys.append((_null_key(key, column.__getitem__,
+                                         descending, nulls), descending))
+        return index_keys
+
+    def map_columns(self, functions, start=0):
+        """Replace each value of the rows from ``start`` by
+        ``functions[position](value)`` (the columns whose function is
+        ``None`` are kept)."""
+        self.columns = [column if function is None or start >= self.length
+                        else self._map_column(column, function, start)
+                        for function, column in izip(functions, self.columns)]
+
+    def _map_column(self, column, function, start):
+        if not start:
+            values = (list(column.map_values(function))
+                      if isinstance(column, CompactColumn)
+                      else [function(value) for value in column])
+        else:
+            values = list(column[:start])
+            values.extend(function(value) for value in column[start:])
+        return self._compact_like(column, values)
+
+    def compact(self, types, dictionary=(), max_distinct_ratio=0):
+        """Store each column whose type (``types[position]``) is supported
+        by ``TypedColumn`` in a typed array. Text columns at ``dictionary``
+        positions, or with at most ``max_distinct_ratio`` distinct values
+        per row, are stored in a ``DictionaryColumn``."""
+        for position, type_ in enumerate(types[:len(self.columns)]):
+            column = self.columns[position]
+            if isinstance(column, CompactColumn):
+                continue
+            compact_column = TypedColumn.from_values(type_, column)
+            if compact_column is None and \
+               (position in dictionary or
+                (type_ is str and
+                 self._distinct_ratio(column) <= max_distinct_ratio)):
+                compact_column = DictionaryColumn.from_values(column)
+            if compact_column is not None:
+                self.columns[position] = compact_column
+
+    def _distinct_ratio(self, column):
+        if not column:
+            return 1.0
+        try:
+            return len(set(column)) / float(len(column))
+        except TypeError:  # unhashable values
+            return 1.0
+
+    def column_width(self, position):
+        if not self.length:
+            return 0
+        column = self.columns[position]
+        if isinstance(column, CompactColumn):
+            return column.max_width()
+        return max(len(unicode(value)) for value in column)
+
+    def get_raw_column(self, position):
+        """Return the column object itself (a ``list`` or a compact column),
+        without copying it. It must not be changed."""
+        if not self.length:
+            return []
+        return self.columns[position]
+
+    def iter_column_chunks(self, position, start=0):
+        if start < self.length:
+            column = self.columns[position]
+            yield column[start:] if start else column
+
+
+class SpillFile(object):
+    """Temporary file to which chunks of rows are written (pickled) when
+    they do not fit in memory. They are read back through a memory map of
+    the file; the last value read is kept, so reading the rows of a chunk
+    one by one does not unpickle it again for each row.
+
+    The space of the values released (see ``release``) is written again by
+    the next values that fit in it. When there is more free space than
+    space used, the values kept are copied to a new file without it."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix='outputty-')
+        self._size = 0
+        self._map = None
+        self._last = (None, None)
+        self._locations = {}
+        self._free = []
+        self._used = 0
+        self._keys = count()
+
+    def dump(self, value):
+        """Write ``value`` and return its location, to be used by ``load``
+        and ``release``."""
+        data = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+        start = self._allocate(len(data))
+        self._file.seek(start)
+        self._file.write(data)
+        self._file.flush()
+        location = next(self._keys)
+        self._locations[location] = (start, len(data))
+        self._used += len(data)
+        return location
+
+    def _allocate(self, length):
+        """Return where to write ``length`` bytes: the first free space in
+        which they fit or the end of the file."""
+        for number, (start, free) in enumerate(self._free):
+            if free >= length:
+                if free > length:
+                    self._free[number] = (start + length, free - length)
+                else:
+                    del self._free[number]
+                return start
+        start = self._size
+        self._size += length
+        return start
+
+    def load(self, location):
+        if self._last[0] == location:
+            return self._last[1]
+        start, length = self._locations[location]
+        if self._map is None or len(self._map) < start + length:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        value = cPickle.loads(self._map[start:start + length])
+        self._last = (location, value)
+        return value
+
+    def release(self, location):
+        """Free the space of the value at ``location``, which is not going
+        to be loaded again."""
+        if self._last[0] == location:
+            self._last = (None, None)
+        start, length = self._locations.pop(location)
+        self._used -= length
+        free = self._free
+        position = bisect_left(free, (start, length))
+        if position < len(free) and start + length == free[position][0]:
+            length += free.pop(position)[1]
+        if position and sum(free[position - 1]) == start:
+            position -= 1
+            start, before = free.pop(position)
+            length += before
+        if start + length == self._size:
+            self._size = start
+        else:
+            free.insert(position, (start, length))
+        if self._size - self._used > self._used:
+            self._compact()
+
+    def _compact(self):
+        """Copy the values kept to a new file, without the free space."""
+        new_file = tempfile.TemporaryFile(prefix='outputty-')
+        size = 0
+        for location, (start, length) in sorted(self._locations.iteritems(),
+                                                key=itemgetter(1)):
+            self._file.seek(start)
+            new_file.write(self._file.read(length))
+            self._locations[location] = (size, length)
+            size += length
+        new_file.flush()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self._file, self._size, self._free = new_file, size, []
+
+
+class _Descending(object):
+    """Sort key that orders ``value`` in reverse."""
+
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _same(value):
+    return value
+
+
+def _null_key(key, value, descending, nulls):
+    """Wrap sort key function ``key`` so ``None`` values (``value(item) is
+    None``) go ``'first'`` or ``'last'`` in an ordering ``descending`` or
+    not. With ``nulls=None`` they are left where Python puts them: before
+    any other value."""
+    if nulls is None:
+        return key
+    if (nulls == 'first') != descending:
+        return lambda item: (value(item) is not None, key(item))
+    return lambda item: (value(item) is None, key(item))
+
+
+def _row_keys(keys):
+    """Return a ``(key function, descending)`` pair over rows for each
+    ``(position, descending, nulls)`` in ``keys``."""
+    result = []
+    for position, descending, nulls in keys:
+        value = itemgetter(position)
+        result.append((_null_key(value, value, descending, nulls),
+                       descending))
+    return result
+
+
+def _stable_sort(items, keys):
+    """Sort the list ``items`` in place by ``keys``, a list of ``(key
+    function, descending)`` pairs (the first one being the most
+    significant). If all keys have the same direction it is a single sort
+    on the tuple of keys; otherwise it is one stable sort per key, from the
+    least significant to the most significant one."""
+    directions = set(descending for key, descending in keys)
+    if len(directions) == 1:
+        functions = [key for key, descending in keys]
+        if len(functions) == 1:
+            key = functions[0]
+        else:
+            key = lambda item: tuple([function(item)
+                                      for function in functions])
+        items.sort(key=key, reverse=directions.pop())
+    else:
+        for key, descending in reversed(keys):
+            items.sort(key=key, reverse=descending)
+
+
+def _top(items, keys, limit):
+    """Return the indexes of the first ``limit`` items of the iterable
+    ``items`` in the order of ``keys`` (see ``_stable_sort``), keeping at
+    most ``limit`` items at a time in a heap (``O(n log limit)``)."""
+    keys = [(lambda pair, key=key: key(pair[1]), descending)
+            for key, descending in keys]
+    directions = set(descending for key, descending in keys)
+    if len(directions) == 1:
+        functions = [key for key, descending in keys]
+        if len(functions) == 1:
+            key = functions[0]
+        else:
+            key = lambda pair: tuple([function(pair)
+                                      for function in functions])
+        select = heapq.nlargest if directions.pop() else heapq.nsmallest
+    else:
+        key, select = _merge_key(keys), heapq.nsmallest
+    return [index for index, item in select(limit, enumerate(items), key)]
+
+
+def _write_run(runs_file, rows, block_size):
+    """Write the sorted ``rows`` (an iterable) to ``runs_file`` in blocks of
+    ``block_size`` rows and return their locations."""
+    rows = iter(rows)
+    return [runs_file.dump(block)
+            for block in iter(lambda: list(islice(rows, block_size)), [])]
+
+
+def _merge_runs(runs_file, runs, key):
+    """Iterate over the rows of the sorted ``runs`` (the locations of their
+    blocks in ``runs_file``, see ``ChunkedStorage.sort``) merged by
+    ``key`` (see ``_merge_key``), reading one block of each run at a time.
+    Equal rows are kept in the order of the runs."""
+
+    def read_run(number, run):
+        for location in run:
+            rows = runs_file.load(location)
+            runs_file.release(location)
+            for row in rows:
+                yield key(row), number, row
+
+    merged = heapq.merge(*[read_run(number, run)
+                           for number, run in enumerate(runs)])
+    return (row for sort_key, number, row in merged)
+
+
+def _merge_key(keys):
+    """Return a function that maps an item to a single ascending sort key
+    for ``keys`` (see ``_stable_sort``), used to merge sorted runs."""
+    return lambda item: tuple([_Descending(key(item)) if descending
+                               else key(item)
+                               for key, descending in keys])
+
+
+class Chunk(object):
+    """Rows of a ``ChunkedStorage``. Its statistics (see ``statistics`` and
+    ``widths``) are computed when first needed and kept until the chunk is
+    changed. ``shared`` is ``True`` while the rows may be used by a copy of
+    the storage (see ``ChunkedStorage.copy``).
+
+    A chunk can be spilled to a ``SpillFile`` (see ``spill``); ``rows``
+    then reads the rows from the file each time and ``load`` brings them
+    back to memory.
+    """
+
+    __slots__ = ('_rows', '_length', 'shared', '_spill_file', '_location',
+                 '_statistics', '_widths', '_size')
+
+    def __init__(self, rows, shared=False):
+        self._rows = rows
+        self.shared = shared
+        self._spill_file = self._location = None
+        self.changed()
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            return self._spill_file.load(self._location)
+        return self._rows
+
+    @property
+    def in_memory(self):
+        return self._rows is not None
+
+    def __len__(self):
+        return self._length if self._rows is None else len(self._rows)
+
+    def changed(self):
+        self._statistics = self._widths = self._size = None
+
+    def statistics(self):
+        """Return a list with ``(minimum, maximum)`` of each column, not
+        counting ``None`` values. Both are ``None`` if the column has only
+        ``None`` values or values that can not be compared."""
+        if self._statistics is None:
+            self._statistics = []
+            for values in izip(*self.rows):
+                values = [value for value in values if value is not None]
+                try:
+                    statistics = (min(values), max(values))
+                except (TypeError, ValueError):
+                    statistics = (None, None)
+                self._statistics.append(statistics)
+        return self._statistics
+
+    def widths(self):
+        """Return the length of the longest ``unicode`` representation of
+        the values of each column."""
+        if self._widths is None:
+            self._widths = [max(len(unicode(value)) for value in values)
+                            for values in izip(*self.rows)]
+        return self._widths
+
+    def size(self):
+        """Return an estimate of the memory used by the rows in bytes,
+        measured on (at most) ``SIZE_SAMPLE`` of them."""
+        if self._size is None:
+            rows = self.rows
+            sample = rows[::max(1, len(rows) // SIZE_SAMPLE)]
+            used = sum(getsizeof(row) + sum(imap(getsizeof, row))
+                       for row in sample)
+            self._size = used * len(rows) // max(1, len(sample))
+        return self._size
+
+    def may_contain(self, row):
+        """Return ``False`` if ``statistics`` show that no row of this chunk
+        is equal to ``row``."""
+        for value, (minimum, maximum) in izip(row, self.statistics()):
+            if value is None or minimum is None:
+                continue
+            try:
+                if value < minimum or value > maximum:
+                    return False
+            except TypeError:
+                pass
+        return True
+
+    def spill(self, spill_file):
+        """Write the rows to ``spill_file`` and remove them from memory (the
+        statistics are kept)."""
+        self.statistics()
+        try:
+            self.widths()
+        except UnicodeError:
+            pass  # encoded values: ``column_width`` will fail the same way
+        self._length = len(self._rows)
+        self._location = spill_file.dump(self._rows)
+        self._spill_file = spill_file
+        self._rows = None
+
+    def load(self):
+        """Bring the rows back to memory, so they can be changed."""
+        if self._rows is None:
+            self._rows = self._spill_file.load(self._location)
+            self._spill_file.release(self._location)
+            self._spill_file = self._location = None
+
+
+class ChunkedStorage(object):
+    """Keeps the rows in a list of ``Chunk`` objects with at most
+    ``chunk_size`` rows each (chunks can get up to twice that when rows are
+    inserted in the middle). ``extend`` only fills the last chunk and
+    creates new ones, so the rows already stored are never moved.
+
+    If ``max_memory`` (in bytes or a string accepted by ``parse_size``) is
+    given, the oldest chunks are spilled to a temporary file (see
+    ``SpillFile``) while the rows in memory take more than that. Spilled
+    chunks are read back one at a time when needed, so iterating over the
+    rows (which is what the plugins do) needs only one chunk in memory;
+    ``sort`` does an external merge sort.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_memory=None):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
+        self.chunk_size = chunk_size
+        self.max_memory = (parse_size(max_memory) if max_memory is not None
+                           else None)
+        self.chunks = []
+        self.length = 0
+        self._starts = None
+        self._spill_file = None
+
+    def __len__(self):
+        return self.length
+
+    def copy(self):
+        """Return a new storage sharing the chunks with this one. Each
+        chunk is copied by a storage only before that storage changes it
+        (copy-on-write)."""
+        storage = ChunkedStorage(self.chunk_size, self.max_memory)
+        for chunk in self.chunks:
+            chunk.shared = True
+        storage.chunks = list(self.chunks)
+        storage.length = self.length
+        return storage
+
+    def _own(self, number):
+        """Return chunk ``number``, in memory and ready to be changed."""
+        chunk = self.chunks[number]
+        if chunk.shared:
+            chunk = Chunk([list(row) for row in chunk.rows])
+            self.chunks[number] = chunk
+        chunk.load()
+        chunk.changed()
+        return chunk
+
+    def _iter_own(self):
+        """Iterate over all chunks as ``_own`` does, spilling each one (if
+        needed) before the next is loaded."""
+        for number in xrange(len(self.chunks)):
+            yield self._own(number)
+            self._spill()
+
+    def limit_memory(self, max_memory):
+        """Change ``max_memory``, spilling chunks to fit in the new limit."""
+        self.max_memory = parse_size(max_memory)
+        self._spill()
+
+    def _spill(self):
+        """Spill the oldest chunks in memory (never the last one) until the
+        rows in memory fit in ``max_memory``."""
+        if self.max_memory is None:
+            return
+        in_memory = [chunk for chunk in self.chunks if chunk.in_memory]
+        used = sum(chunk.size() for chunk in in_memory)
+        for chunk in in_memory[:-1]:
+            if used <= self.max_memory:
+                break
+            if chunk is not self.chunks[-1]:
+                used -= chunk.size()
+                if self._spill_file is None:
+                    self._spill_file = SpillFile()
+                chunk.spill(self._spill_file)
+
+    def _replace_rows(self, rows):
+        """Replace all rows by the ones from iterable ``rows`` (which can be
+        reading the current chunks)."""
+        shared = any(chunk.shared for chunk in self.chunks)
+        self.chunks, self.length, self._starts = [], 0, None
+        if self.max_memory is not None:
+            self._spill_file = None  # the old chunks keep their own file
+        rows = iter(rows)
+        while True:
+            chunk_rows = list(islice(rows, self.chunk_size))
+            if not chunk_rows:
+                break
+            self._append_chunks(chunk_rows, shared)
+            self._spill()
+
+    def _append_chunks(self, rows, shared=False):
+        size = self.chunk_size
+        for start in xrange(0, len(rows), size):
+            self.chunks.append(Chunk(rows[start:start + size], shared))
+        self.length += len(rows)
+        self._starts = None
+
+    def _locate(self, index):
+        """Return the number of the chunk with row ``index`` and the
+        position of the row inside it."""
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('row index out of range')
+        if self._starts is None:
+            self._starts, start = [], 0
+            for chunk in self.chunks:
+                self._starts.append(start)
+                start += len(chunk)
+        number = bisect_right(self._starts, index) - 1
+        return number, index - self._starts[number]
+
+    def get_row(self, index):
+        """Return the row at ``index``, which can be changed in place
+        without changing the copies of this storage."""
+        number, position = self._locate(index)
+        return self._handed_out(number)[position]
+
+    def get_raw_row(self, index):
+        """Return the row at ``index`` as stored (not to be changed)."""
+        number, position = self._locate(index)
+        return self.chunks[number].rows[position]
+
+    def _handed_out(self, number):
+        """Return the rows of chunk ``number`` to be returned by ``get_row``
+        and ``get_rows``, which may be changed in place: a chunk in memory is
+        copied if shared and its statistics are dropped (see ``_own``); the
+        rows of a spilled chunk are new lists read from the file."""
+        chunk = self.chunks[number]
+        if chunk.in_memory:
+            chunk = self._own(number)
+        return chunk.rows
+
+    def get_rows(self, index):
+        start, stop, step = index.indices(self.length)
+        if step == 1:
+            if start >= stop:
+                return []
+            number, position = self._locate(start)
+            rows = chain([self._handed_out(number)[position:]],
+                         (self._handed_out(number) for number
+                          in xrange(number + 1, len(self.chunks))))
+            return list(islice(chain.from_iterable(rows), stop - start))
+        return [self.get_row(i) for i in xrange(start, stop, step)]
+
+    def iter_rows(self):
+        return chain.from_iterable(chunk.rows for chunk in self.chunks)
+
+    def iter_mapped_rows(self, functions):
+        return ([function(value) for function, value in izip(functions, row)]
+                for row in self.iter_rows())
+
+    def iter_chunks(self):
+        """Iterate over the list of rows of each chunk."""
+        return (chunk.rows for chunk in self.chunks)
+
+    def set_rows(self, index, rows):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step == 1:
+                stop = max(start, stop)
+                self._replace_rows(chain(islice(self.iter_rows(), start),
+                                         rows,
+                                         islice(self.iter_rows(), stop,
+                                                None)))
+            else:
+                indexes = xrange(start, stop, step)
+                if len(indexes) != len(rows):
+                    raise ValueError('attempt to assign sequence of size %d '
+                                     'to extended slice of size %d' %
+                                     (len(rows), len(indexes)))
+                new_rows = dict(izip(indexes, rows))
+                self._replace_rows(new_rows.get(index, row) for index, row
+                                   in enumerate(self.iter_rows()))
+        else:
+            number, position = self._locate(index)
+            self._own(number).rows[position] = rows
+            self._spill()
+
+    def delete_rows(self, index):
+        if isinstance(index, slice):
+            deleted = set(xrange(*index.indices(self.length)))
+            self._replace_rows(row for index, row
+                               in enumerate(self.iter_rows())
+                               if index not in deleted)
+        else:
+            number, position = self._locate(index)
+            chunk = self._own(number)
+            del chunk.rows[position]
+            if not chunk.rows:
+                del self.chunks[number]
+            self.length -= 1
+            self._starts = None
+            self._spill()
+
+    def insert_row(self, index, row):
+        if index < 0:
+            index = max(0, index + self.length)
+        if index >= self.length:
+            self.extend([row])
+            return
+        number, position = self._locate(index)
+        chunk = self._own(number)
+        chunk.rows.insert(position, row)
+        if len(chunk) > 2 * self.chunk_size:
+            size = self.chunk_size
+            self.chunks[number:number + 1] = [Chunk(chunk.rows[:size]),
+                                              Chunk(chunk.rows[size:])]
+        self.length += 1
+        self._starts = None
+        self._spill()
+
+    def extend(self, rows):
+        if not rows:
+            return
+        start, chunks = 0, len(self.chunks)
+        if self.chunks and len(self.chunks[-1]) < self.chunk_size:
+            chunk = self._own(len(self.chunks) - 1)
+            start = self.chunk_size - len(chunk)
+            chunk.rows.extend(rows[:start])
+            self.length += len(rows[:start])
+            self._starts = None
+        self._append_chunks(rows[start:])
+        if len(self.chunks) != chunks:
+            self._spill()
+
+    def pop(self, index):
+        row = self.get_row(index)
+        self.delete_rows(index)
+        return row
+
+    def reverse(self):
+        chunks = list(self.chunks)
+        self._replace_rows(chain.from_iterable(reversed(chunk.rows)
+                                               for chunk in reversed(chunks)))
+
+    def count(self, row):
+        return sum(chunk.rows.count(row) for chunk in self.chunks
+                   if chunk.may_contain(row))
+
+    def find(self, row, start=0, stop=None):
+        start, stop, step = slice(start, stop).indices(self.length)
+        chunk_start = 0
+        for chunk in self.chunks:
+            chunk_stop = chunk_start + len(chunk)
+            if chunk_stop > start and chunk_start < stop and \
+               chunk.may_contain(row):
+                try:
+                    return chunk_start + chunk.rows.index(
+                            row, max(start - chunk_start, 0),
+                            stop - chunk_start)
+                except ValueError:
+                    pass
+            chunk_start = chunk_stop
+        raise ValueError('row not in table')
+
+    def get_column(self, position):
+        return [row[position] for row in self.iter_rows()]
+
+    get_raw_column = get_column
+
+    def iter_column_chunks(self, position, start=0):
+        for chunk in self.chunks:
+            if start >= len(chunk):
+                start -= len(chunk)
+                continue
+            yield [row[position] for row in islice(chunk.rows, start, None)]
+            start = 0
+
+    def column_width(self, position):
+        return max([chunk.widths()[position] for chunk in self.chunks] or [0])
+
+    def set_column(self, position, values):
+        self.set_columns({position: values})
+
+    def set_columns(self, columns):
+        columns = [(position, iter(values))
+                   for position, values in columns.iteritems()]
+        for chunk in self._iter_own():
+            for row in chunk.rows:
+                for position, values in columns:
+                    row[position] = next(values)
+
+    def take_rows(self, indexes):
+        storage = ChunkedStorage(self.chunk_size, self.max_memory)
+        indexes = set(indexes)
+        storage._replace_rows(list(row)
+                              for index, row in enumerate(self.iter_rows())
+                              if index in indexes)
+        return storage
+
+    def insert_columns(self, position, columns):
+        values = izip(*columns)
+        for chunk in self._iter_own():
+            for row, row_values in izip(chunk.rows, values):
+                row[position:position] = row_values
+
+    def delete_column(self, position):
+        for chunk in self._iter_own():
+            for row in chunk.rows:
+                del row[position]
+
+    def sort(self, keys):
+        """Sort the rows (stable) by ``keys`` (see ``RowStorage.sort``)."""
+        row_keys = _row_keys(keys)
+        if self.max_memory is None:
+            rows = list(self.iter_rows())
+            _stable_sort(rows, row_keys)
+            self._replace_rows(rows)
+            return
+        # External merge sort: runs of as many rows as fit in max_memory
+        # are sorted and written to a temporary file in blocks, then merged
+        # reading one block of each run at a time. If more runs than that
+        # are needed, groups of them are merged into longer runs first.
+        row_size = sum(chunk.size() for chunk in self.chunks) // \
+                   max(1, self.length)
+        run_size = max(2, self.max_memory // max(1, row_size))
+        block_size = max(1, min(MERGE_BLOCK_SIZE, run_size // 2))
+        merged_runs = run_size // block_size
+        runs_file, runs, rows = SpillFile(), [], []
+        for chunk in self.chunks:
+            rows.extend(chunk.rows)
+            if len(rows) >= run_size:
+                _stable_sort(rows, row_keys)
+                runs.append(_write_run(runs_file, rows, block_size))
+                rows = []
+        if rows:
+            _stable_sort(rows, row_keys)
+            runs.append(_write_run(runs_file, rows, block_size))
+        key = _merge_key(row_keys)
+        self.chunks = []
+        while len(runs) > merged_runs:
+            groups = [runs[start:start + merged_runs]
+                      for start in xrange(0, len(runs), merged_runs)]
+            runs = [group[0] if len(group) == 1 else
+                    _write_run(runs_file, _merge_runs(runs_file, group, key),
+                               block_size)
+                    for group in groups]
+        self._replace_rows(_merge_runs(runs_file, runs, key))
+
+    def top(self, keys, limit):
+        """Return the indexes of the first ``limit`` rows in the order of
+        ``keys``, reading one chunk at a time."""
+        return _top(self.iter_rows(), _row_keys(keys), limit)
+
+    def map_columns(self, functions, start=0):
+        """Replace each value of the rows from ``start`` by
+        ``functions[position](value)`` (the values of the columns whose
+        function is ``None`` are kept). If a function raises an exception
+        no row is changed."""
+        functions = [function or _same for function in functions]
+        chunks = list(self.chunks)
+        try:
+            for number, chunk in enumerate(chunks):
+                if start >= len(chunk):
+                    start -= len(chunk)
+                    continue
+                rows = chunk.rows
+                self.chunks[number] = Chunk(
+                        [list(row) for row in rows[:start]] +
+                        [[function(value)
+                          for function, value in izip(functions, row)]
+                         for row in islice(rows, start, None)])
+                start = 0
+                self._spill()
+        except Exception:
+            self.chunks = chunks
+            raise
+
+
+class ViewStorage(object):
+    """Read-only window over the rows in slice ``rows`` and the columns at
+    ``positions`` of another storage, without copying any data.
+    ``materialize`` returns a new storage with a copy of the data, to be
+    used when the view needs to be changed.
+    """
+
+    def __init__(self, storage, rows, positions):
+        self.storage = storage
+        start, stop, step = rows.indices(len(storage))
+        self.rows = xrange(start, stop, step)
+        if stop < 0:  # negative step until the first row
+            stop = None
+        self.slice = slice(start, stop, step)
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.rows)
+
+    def copy(self):
+        return self
+
+    def _project(self, row):
+        return [row[position] for position in self.positions]
+
+    def get_row(self, index):
+        """Return the row at ``index`` as a ``ReadOnlyRow``."""
+        return ReadOnlyRow(self.get_raw_row(index))
+
+    def get_raw_row(self, index):
+        return self._project(self.storage.get_raw_row(self.rows[index]))
+
+    def get_rows(self, index):
+        return [self.get_row(i) for i in xrange(*index.indices(len(self)))]
+
+    def iter_rows(self):
+        start, stop, step = self.slice.start, self.slice.stop, self.slice.step
+        if step > 0:
+            rows = islice(self.storage.iter_rows(), start, max(start, stop),
+                          step)
+        else:
+            rows = (self.storage.get_raw_row(index) for index in self.rows)
+        return (self._project(row) for row in rows)
+
+    def iter_mapped_rows(self, functions):
+        return ([function(value) for function, value in izip(functions, row)]
+                for row in self.iter_rows())
+
+    def count(self, row):
+        return sum(1 for other in self.iter_rows() if other == row)
+
+    def find(self, row, start=0, stop=None):
+        start, stop, step = slice(start, stop).indices(len(self))
+        for index in xrange(start, stop):
+            if self.get_raw_row(index) == row:
+                return index
+        raise ValueError('row not in table')
+
+    def get_column(self, position):
+        column = self.storage.get_raw_column(self.positions[position])
+        return list(column[self.slice]) if len(self) else []
+
+    def get_raw_column(self, position):
+        column = self.storage.get_raw_column(self.positions[position])
+        if isinstance(column, CompactColumn):
+            return column.take(self.rows)
+        return column[self.slice] if len(self) else []
+
+    def column_width(self, position):
+        column = self.get_raw_column(position)
+        if isinstance(column, CompactColumn):
+            return column.max_width()
+        return max([len(unicode(value)) for value in column] or [0])
+
+    def iter_column_chunks(self, position, start=0):
+        if start < len(self):
+            column = self.get_raw_column(position)
+            yield column[start:] if start else column
+
+    def top(self, keys, limit):
+        return _top(self.iter_rows(), _row_keys(keys), limit)
+
+    def materialize(self, storage):
+        """Fill ``storage`` (a new, empty storage) with a copy of the data
+        and return it."""
+        if isinstance(storage, ColumnStorage):
+            return ColumnStorage([self.get_raw_column(position)
+                                  for position in
+                                  xrange(len(self.positions))])
+        storage.extend(list(self.iter_rows()))
+        return storage
+
+
+STORAGES = {'rows': RowStorage, 'columns': ColumnStorage,
+            'chunks': ChunkedStorage}
@@ -17,7 +17,14 @@
 
 from textwrap import dedent
 import unittest
-from outputty import Table
+from outputty import Table, Row
+
+
+def double(value):
+    return value * 2
+
+def row_total(row):
+    return row['python'] + row['rules']
 
 
 class TestTable(unittest.TestCase):
@@ -509,6 +516,66 @@ class TestTable(unittest.TestCase):
         self.assertEqual(str(table), expected_output)
         self.assertEqual(str(table_2), expected_output)
 
+    def test_ordering_by_many_columns(self):
+        table = Table(headers=['spam', 'ham', 'eggs'])
+        table.extend([[2, 'b', 1], [1, 'b', 2], [2, 'a', 3], [1, 'a', 4],
+                      [2, 'a', 5]])
+        table.order_by(['spam', 'ham'])
+        self.assertEqual(table[:], [[1, 'a', 4], [1, 'b', 2], [2, 'a', 3],
+                                    [2, 'a', 5], [2, 'b', 1]])
+        table.order_by(['spam', 'ham'], ['desc', 'asc'])
+        self.assertEqual(table[:], [[2, 'a', 3], [2, 'a', 5], [2, 'b', 1],
+                                    [1, 'a', 4], [1, 'b', 2]])
+        table.order_by([('ham', 'desc'), 'eggs'])
+        self.assertEqual(table[:], [[2, 'b', 1], [1, 'b', 2], [2, 'a', 3],
+                                    [1, 'a', 4], [2, 'a', 5]])
+        with self.assertRaises(ValueError):
+            table.order_by(['spam', 'ham'], ['desc'])
+        with self.assertRaises(ValueError):
+            table.order_by('spam', nulls='middle')
+
+    def test_ordering_is_stable(self):
+        table = Table(headers=['spam', 'ham'])
+        table.extend([[1, 'c'], [0, 'b'], [1, 'a'], [0, 'd']])
+        table.order_by('spam', 'desc')
+        self.assertEqual(table[:], [[1, 'c'], [1, 'a'], [0, 'b'], [0, 'd']])
+
+    def test_ordering_with_nulls(self):
+        table = Table(headers=['spam', 'ham'])
+        table.extend([[2, 'a'], [None, 'b'], [1, 'c']])
+        table.order_by('spam')
+        self.assertEqual(table['spam'], [None, 1, 2])
+        table.order_by('spam', 'desc')
+        self.assertEqual(table['spam'], [2, 1, None])
+        table.order_by('spam', nulls='last')
+        self.assertEqual(table['spam'], [1, 2, None])
+        table.order_by('spam', 'desc', nulls='first')
+        self.assertEqual(table['spam'], [None, 2, 1])
+        table.order_by([('spam', 'desc'), 'ham'], nulls='last')
+        self.assertEqual(table['spam'], [2, 1, None])
+
+    def test_order_by_with_limit_should_keep_only_the_first_rows(self):
+        table = Table(headers=['spam', 'ham'])
+        table.extend([[3, 'a'], [1, 'b'], [4, 'c'], [1, 'd'], [5, 'e']])
+        table.order_by('spam', limit=3)
+        self.assertEqual(table[:], [[1, 'b'], [1, 'd'], [3, 'a']])
+        table.order_by(['spam', 'ham'], ['asc', 'desc'], limit=2)
+        self.assertEqual(table[:], [[1, 'd'], [1, 'b']])
+
+    def test_top_should_return_a_new_table(self):
+        table = Table(headers=['name', 'score'])
+        table.extend([['spam', 10], ['eggs', 30], ['ham', None],
+                      ['idle', 20], ['john', 30]])
+        top = table.top(2, by='score')
+        self.assertEqual(top.headers, ['name', 'score'])
+        self.assertEqual(top[:], [['eggs', 30], ['john', 30]])
+        self.assertEqual(table.top(2, 'score', 'asc', nulls='last')[:],
+                         [['spam', 10], ['idle', 20]])
+        self.assertEqual(table.top(10, 'score', nulls='first')['name'],
+                         ['ham', 'eggs', 'john', 'idle', 'spam'])
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.top(0, 'score')[:], [])
+
     def test_order_by_method_should_order_data_internally(self):
         my_table = Table(headers=['spam', 'ham', 'eggs'])
         my_table.append({'spam': 'Eric', 'eggs': 'Idle'})
@@ -769,6 +836,32 @@ class TestTable(unittest.TestCase):
         table.remove([1, 2])
         self.assertEquals(table[:], [[5, 6], [1, 2]])
 
+    def test_table_in(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        self.assertTrue([3, 4] in table)
+        self.assertTrue({'python': 1, 'rules': 2} in table)
+        self.assertFalse([4, 3] in table)
+        self.assertFalse([1, 2, 3] in table)
+
+    def test_distinct_should_return_a_new_table(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([[1, 'a'], [2, 'b'], [1, 'a'], [1, 'c'], [2, 'b']])
+        self.assertEquals(table.distinct()[:], [[1, 'a'], [2, 'b'],
+                                                [1, 'c']])
+        distinct_spam = table.distinct(['spam'])
+        self.assertEquals(distinct_spam.headers, ['spam'])
+        self.assertEquals(distinct_spam[:], [[1], [2]])
+        self.assertEquals(len(table), 5)
+
+    def test_drop_duplicates_should_change_the_table(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([[1, 'a'], [2, 'b'], [1, 'a'], [1, 'c'], [2, 'b']])
+        table.drop_duplicates()
+        self.assertEquals(table[:], [[1, 'a'], [2, 'b'], [1, 'c']])
+        table.drop_duplicates(['spam'])
+        self.assertEquals(table[:], [[1, 'a'], [2, 'b']])
+
     def test_table_reverse(self):
         table = Table(headers=['python', 'rules'])
         table.extend([[1, 2], [3, 4], [5, 6]])
@@ -800,6 +893,27 @@ class TestTable(unittest.TestCase):
         with self.assertRaises(ValueError):
             table['rules'] = [1, 2, 3, 4]
 
+    def test_table_set_item_for_column_should_change_rows_in_place(self):
+        table = Table(headers=['python', 'rules'], storage='rows')
+        table.extend([[1, 2], [3, 4]])
+        first_row = table._storage.rows[0]
+        table['rules'] = [20, 40]
+        del table['python']
+        self.assertTrue(table._storage.rows[0] is first_row)
+        self.assertEquals(table[:], [[20], [40]])
+
+    def test_set_columns_should_change_many_columns(self):
+        table = Table(headers=['python', 'rules', 'spam'])
+        table.extend([[1, 2, 3], [4, 5, 6]])
+        table.set_columns({'python': [10, 40], 'spam': [30, 60]})
+        self.assertEquals(table[:], [[10, 2, 30], [40, 5, 60]])
+        table.set_columns([('rules', [0, 0]), ('eggs', [7, 8])])
+        self.assertEquals(table.headers, ['python', 'rules', 'spam', 'eggs'])
+        self.assertEquals(table[:], [[10, 0, 30, 7], [40, 0, 60, 8]])
+        with self.assertRaises(ValueError):
+            table.set_columns({'python': [1, 2], 'rules': [1, 2, 3]})
+        self.assertEquals(table['python'], [10, 40])
+
     def test_table_append_column_should_change_headers_and_rows(self):
         table = Table(headers=['python', 'rules'])
         table.extend([[1, 2], [3, 4], [5, 6]])
@@ -864,5 +978,145 @@ class TestTable(unittest.TestCase):
         self.assertEquals(table.headers, ['python', 'rules', 'third column'])
         self.assertEquals(table[:], [[1, 2, 2], [3, 4, 12]])
 
+    def test_append_column_with_row_as_dict_should_pass_a_dict(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        table.append_column('is dict', lambda row: type(row) is dict,
+                            row_as_dict=True)
+        table.append_column('has key', lambda row: 'python' in row and
+                                                   2 not in row,
+                            row_as_dict=True)
+        table.append_column('keys', lambda row: sorted(row.keys()),
+                            row_as_dict=True)
+        self.assertEquals(table['is dict'], [True, True])
+        self.assertEquals(table['has key'], [True, True])
+        self.assertEquals(table['keys'][0], ['has key', 'is dict', 'python',
+                                             'rules'])
+
+    def test_append_column_should_pass_rows_that_behave_like_lists(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 3]])
+        table.append_column('in', lambda row: 2 in row)
+        table.append_column('list', lambda row: row + [0])
+        table.append_column('count', lambda row: row.count(3))
+        table.append_column('index', lambda row: row.index(row[1]))
+        self.assertEquals(table['in'], [True, False])
+        self.assertEquals(table['list'], [[1, 2, True, 0], [3, 3, False, 0]])
+        self.assertEquals(table['count'], [0, 2])
+        self.assertEquals(table['index'], [1, 0])
+        self.assertEquals([0] + list(table)[0], [0, 1, 2, True,
+                                                 [1, 2, True, 0], 0, 1])
+
+    def test_append_column_in_batch_mode_should_call_function_once(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        calls = []
+
+        def sum_columns(columns):
+            calls.append(1)
+            return [x + y for x, y in zip(columns['python'], columns['rules'])]
+
+        table.append_column('sum', sum_columns, position=0, batch=True)
+        self.assertEquals(calls, [1])
+        self.assertEquals(table[:], [[3, 1, 2], [7, 3, 4]])
+        with self.assertRaises(ValueError):
+            table.append_column('wrong', lambda columns: [1], batch=True)
+        with self.assertRaises(KeyError):
+            table.append_column('wrong', lambda columns: columns['spam'],
+                                batch=True)
+        self.assertEquals(table.headers, ['sum', 'python', 'rules'])
+
+    def test_append_columns_should_add_many_columns_at_once(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        table.append_columns([('double', lambda row: row['python'] * 2),
+                              ('spam', ['a', 'b']),
+                              ('total', lambda row: row[0] + row[1])],
+                             position=1)
+        self.assertEquals(table.headers, ['python', 'double', 'spam', 'total',
+                                          'rules'])
+        self.assertEquals(table[:], [[1, 2, u'a', 3, 2], [3, 6, u'b', 7, 4]])
+        table.append_columns([('all', lambda columns: [sum(columns['total'])]
+                                                      * 2)], batch=True)
+        self.assertEquals(table['all'], [10, 10])
+        with self.assertRaises(ValueError):
+            table.append_columns([('a', [1, 2]), ('a', [3, 4])])
+        self.assertEquals(len(table.headers), 6)
+
+    def test_map_should_change_values_of_columns(self):
+        table = Table(headers=['python', 'rules', 'spam'])
+        table.extend([[1, 2, 'a'], [3, 4, 'b']])
+        table.map(double, columns=['python', 'spam'])
+        self.assertEquals(table[:], [[2, 2, 'aa'], [6, 4, 'bb']])
+        table.map(lambda value: value * 3)
+        self.assertEquals(table[:], [[6, 6, 'aaaaaa'], [18, 12, 'bbbbbb']])
+        with self.assertRaises(ValueError):
+            table.map(double, columns=['eggs'])
+
+    def test_map_and_append_column_should_use_worker_processes(self):
+        table = Table(headers=['python', 'rules'], chunk_size=2)
+        table.extend([[i, i * 10] for i in range(7)])
+        table.map(double, columns=['rules'], workers=2)
+        self.assertEquals(table['rules'], [0, 20, 40, 60, 80, 100, 120])
+        table.append_column('total', row_total, position=0, workers=3)
+        self.assertEquals(table['total'], [0, 21, 42, 63, 84, 105, 126])
+        self.assertEquals(table.headers, ['total', 'python', 'rules'])
+
+    def test_header_positions_should_follow_changes_in_headers(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        table.append_column('new column', [5, 6], position=0)
+        self.assertEquals(table._header_position('rules'), 2)
+        del table['python']
+        self.assertEquals(table._header_position('rules'), 1)
+        self.assertEquals(table['rules'], [2, 4])
+        table.headers = ['spam', 'eggs']
+        self.assertEquals(table['eggs'], [2, 4])
+        table.headers[0] = 'ham'
+        self.assertEquals(table['ham'], [5, 6])
+        with self.assertRaises(KeyError):
+            table['spam']
+        with self.assertRaises(ValueError):
+            table._header_position('spam')
+
+    def test_iterating_over_table_should_return_rows(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        rows = list(table)
+        self.assertTrue(isinstance(rows[0], Row))
+        self.assertEquals(rows[0], [1, 2])
+        self.assertEquals(rows[1], (3, 4))
+        self.assertEquals(rows[1][0], 3)
+        self.assertEquals(rows[1]['rules'], 4)
+        self.assertEquals(rows[1].python, 3)
+        self.assertEquals(rows[1].keys(), ['python', 'rules'])
+        self.assertEquals(rows[1].as_dict(), {'python': 3, 'rules': 4})
+        self.assertEquals(rows[1].get('spam', 42), 42)
+        with self.assertRaises(AttributeError):
+            rows[1].spam
+        with self.assertRaises(KeyError):
+            rows[1]['spam']
+        self.assertTrue(rows[0]._positions is rows[1]._positions)
+        with self.assertRaises(TypeError):
+            rows[0]['python'] = 5
+        self.assertEquals(table[0], [1, 2])
+
+    def test_rows_should_be_accepted_as_new_rows(self):
+        table = Table(headers=['python', 'rules'])
+        table.extend([[1, 2], [3, 4]])
+        other_table = Table(headers=['spam', 'eggs'])
+        other_table.extend(table)
+        self.assertEquals(other_table[:], [[1, 2], [3, 4]])
+        self.assertEquals(table.count(list(table)[0]), 1)
+
+    def test_iter_rows_should_encode_values_without_changing_table(self):
+        table = Table(headers=['python', 'rules'], output_encoding='utf16')
+        table.append([u'Álvaro', 42])
+        rows = list(table.iter_rows('iso-8859-1'))
+        self.assertEquals(rows[0]['python'], u'Álvaro'.encode('iso-8859-1'))
+        self.assertEquals(rows[0]['rules'], 42)
+        self.assertEquals(table[0], [u'Álvaro', 42])
+        self.assertEquals(list(table.iter_rows())[0].python, u'Álvaro')
+
     #TODO:
     # - Plugins: before call `write`, verify if `table.headers` exists
@@ -235,6 +235,124 @@ class TestTableCsv(unittest.TestCase):
             for value in row:
                 self.assertEquals(type(value), types.UnicodeType)
 
+    def test_read_csv_with_order_by_and_limit(self):
+        data = dedent('''
+        "name","score"
+        "spam","9"
+        "eggs","10"
+        "ham",""
+        "idle","100"
+        "john","10"
+        ''')
+        my_table = Table()
+        my_table.read('csv', StringIO(data), order_by='score',
+                      ordering='desc', limit=3)
+        self.assertEquals(my_table.headers, ['name', 'score'])
+        self.assertEquals(my_table[:], [[u'idle', 100], [u'eggs', 10],
+                                        [u'john', 10]])
+        other_table = Table()
+        other_table.read('csv', StringIO(data), order_by='score')
+        self.assertEquals(other_table['score'], [None, 9, 10, 10, 100])
+        first_rows = Table()
+        first_rows.read('csv', StringIO(data), limit=2, convert_types=False)
+        self.assertEquals(first_rows[:], [[u'spam', u'9'], [u'eggs', u'10']])
+
+    def test_read_csv_with_where_should_keep_only_selected_rows(self):
+        data = dedent('''
+        "name","score","date"
+        "spam","9","2011-01-02"
+        "eggs","10","not a date"
+        "ham","","2011-01-04"
+        "idle","100","2011-01-05"
+        ''')
+        my_table = Table()
+        my_table.read('csv', StringIO(data), where='score >= 10')
+        self.assertEquals(my_table[:], [[u'eggs', 10, u'not a date'],
+                                        [u'idle', 100, u'2011-01-05']])
+        other_table = Table()
+        other_table.read('csv', StringIO(data), where='name != "eggs"')
+        self.assertEquals(other_table['date'],
+                          [datetime.date(2011, 1, 2), datetime.date(2011, 1, 4),
+                           datetime.date(2011, 1, 5)])
+        other_table = Table()
+        other_table.read('csv', StringIO(data),
+                         where=lambda row: row['score'] < 50, order_by='score',
+                         ordering='desc', limit=2)
+        self.assertEquals(other_table['name'], [u'eggs', u'spam'])
+        other_table = Table()
+        other_table.read('csv', StringIO(data), where='score == "9"',
+                         convert_types=False)
+        self.assertEquals(other_table[:], [[u'spam', u'9', u'2011-01-02']])
+
+    def test_read_csv_with_where_on_a_column_with_blanks(self):
+        data = dedent('''
+        "name","score","date"
+        "spam","9","2011-01-02"
+        "eggs","","2011-01-03"
+        "ham","20",""
+        ''')
+        my_table = Table()
+        my_table.read('csv', StringIO(data), where='score * 2 > 10')
+        self.assertEquals(my_table['name'], [u'spam', u'ham'])
+        my_table = Table()
+        my_table.read('csv', StringIO(data), where='not score > 10')
+        self.assertEquals(my_table['name'], [u'spam'])
+        my_table = Table()
+        my_table.read('csv', StringIO(data), columns=['name'],
+                      where='date >= date and score is not None')
+        self.assertEquals(my_table['name'], [u'spam'])
+
+    def test_read_csv_with_columns_should_keep_only_these_columns(self):
+        data = dedent('''
+        "name","score","date"
+        "spam","9","2011-01-02"
+        "eggs","10","not a date"
+        "ham","","2011-01-04"
+        ''')
+        my_table = Table()
+        my_table.read('csv', StringIO(data), columns=['date', 'name'])
+        self.assertEquals(my_table.headers, ['date', 'name'])
+        self.assertEquals(my_table[:], [[u'2011-01-02', u'spam'],
+                                        [u'not a date', u'eggs'],
+                                        [u'2011-01-04', u'ham']])
+        other_table = Table()
+        other_table.read('csv', StringIO(data), columns=['score'],
+                         where='name != "ham"', order_by='score',
+                         ordering='desc', limit=1)
+        self.assertEquals(other_table[:], [[10]])
+        with self.assertRaises(ValueError):
+            Table().read('csv', StringIO(data), columns=['spam'])
+
+    def test_read_csv_should_order_and_filter_by_columns_not_kept(self):
+        data = dedent('''
+        "name","qty","date"
+        "spam","3","2011-01-02"
+        "eggs","1","2011-01-03"
+        "ham","2","2011-01-04"
+        ''')
+        for limit in [2, None]:
+            my_table = Table()
+            my_table.read('csv', StringIO(data), columns=['name'],
+                          order_by='qty', limit=limit)
+            self.assertEquals(my_table.headers, ['name'])
+            self.assertEquals(my_table['name'][:2], [u'eggs', u'ham'])
+            my_table = Table()
+            my_table.read('csv', StringIO(data), columns=['date'],
+                          where='qty > 1', order_by='name', limit=limit)
+            self.assertEquals(my_table.headers, ['date'])
+            self.assertEquals(my_table[:], [[datetime.date(2011, 1, 4)],
+                                            [datetime.date(2011, 1, 2)]])
+
+    def test_read_csv_with_sample_size_should_identify_same_types(self):
+        data = '"number","value"\n' + ''.join('"%d","%d"\n' % (i, i)
+                                               for i in range(100))
+        data += '"100","1.5"\n'
+        my_table = Table()
+        my_table.read('csv', StringIO(data), sample_size=5)
+        self.assertEquals(my_table.types, {'number': int, 'value': float})
+        self.assertEquals(my_table[-1], [100, 1.5])
+        self.assertEquals(my_table[3], [3, 3.0])
+
     def test_read_csv_and_write_csv(self):
         data = dedent('''
         "spam","eggs","ham"
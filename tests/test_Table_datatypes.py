@@ -125,3 +125,103 @@ class TestTableDataTypes(unittest.TestCase):
         self.assertEquals(table.types['Monty'], datetime.datetime)
         self.assertEquals(table.types['Python'], str)
 
+
+    def test_normalize_types_with_sample_size_should_widen_types(self):
+        table = Table(headers=['spam', 'eggs', 'ham', 'Monty'], chunk_size=7)
+        table.extend([[str(i), '2011-01-01', str(i), '2.5']
+                      for i in range(50)])
+        table.append(['1.5', '2011-01-01 10:00:00', '', 'asd'])
+        table.extend([['0', '2011-01-02', '1', '3'] for i in range(50)])
+        expected = table.copy()
+        expected.normalize_types()
+        table.normalize_types(sample_size=10)
+        self.assertEquals(table.types, {'spam': float, 'eggs': str,
+                                        'ham': int, 'Monty': str})
+        self.assertEquals(table[:], expected[:])
+        self.assertEquals(table[50], [1.5, '2011-01-01 10:00:00', None,
+                                      'asd'])
+        self.assertEquals(table[0], [0.0, '2011-01-01', 0, '2.5'])
+        self.assertEquals(table.types, expected.types)
+
+    def test_identify_type_should_match_int_and_float_conversions(self):
+        table = Table(headers=['spam', 'eggs', 'ham', 'Monty', 'Python'])
+        table.extend([['07', '-0', '1e3', '2011-01-01\n', '5'],
+                      ['+5', '1', 'nan', '2011-01-02', None],
+                      ['', '2', ' -.5 ', '', '-12']] * 3)
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': float, 'eggs': float,
+                                        'ham': float, 'Monty': datetime.date,
+                                        'Python': int})
+        table.append(['7', '1.5', 'inf', '2011-01-02 10:00:00', '12.0'])
+        table.normalize_types(sample_size=1)
+        self.assertEquals(table.types, {'spam': float, 'eggs': float,
+                                        'ham': float, 'Monty': str,
+                                        'Python': float})
+
+    def test_identify_type_should_not_merge_equal_values_of_other_types(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([[1, True], [1.0, 1]])
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': float, 'eggs': str})
+
+    def test_normalize_types_with_sample_size_should_accept_other_types(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([[long(i), str(i)] for i in range(10)])
+        table.normalize_types(sample_size=2)
+        self.assertEquals(table.types, {'spam': long, 'eggs': int})
+        self.assertEquals(table[9], [9L, 9])
+        table.append([10, 'x'])
+        table.normalize_types(sample_size=2)
+        self.assertEquals(table.types, {'spam': int, 'eggs': str})
+        self.assertEquals(table[10], [10, 'x'])
+
+    def test_normalize_types_should_convert_only_rows_added_after_it(self):
+        table = Table(headers=['spam', 'eggs'], chunk_size=3)
+        table.extend([[str(i), 'a%d' % i] for i in range(10)])
+        table.normalize_types()
+        converted = []
+        convert_value = table._convert_value
+        table._convert_value = lambda value, type_: \
+                converted.append(value) or convert_value(value, type_)
+        table.extend([['10', 'b'], ['11', None]])
+        table.normalize_types()
+        self.assertEquals(sorted(converted), [None, '10', '11', 'b'])
+        self.assertEquals(table.types, {'spam': int, 'eggs': str})
+        self.assertEquals(table[10:], [[10, 'b'], [11, None]])
+        table.append(['1.5', 'c'])
+        del converted[:]
+        table.normalize_types()
+        self.assertEquals(table.types, {'spam': float, 'eggs': str})
+        self.assertEquals(len(converted), 13 + 1)
+        self.assertEquals(table['spam'], [float(i) for i in range(12)] +
+                                         [1.5])
+
+    def test_normalize_types_should_keep_values_already_converted(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([['2011-01-01', '1'], ['2011-01-02', '2']])
+        table.normalize_types()
+        table.insert(0, ['2011-01-03', '3'])
+        table[2] = ['2011-01-04', 4]
+        table.normalize_types()
+        self.assertEquals(table.types, {'spam': datetime.date, 'eggs': int})
+        self.assertEquals(table[:], [[datetime.date(2011, 1, 3), 3],
+                                     [datetime.date(2011, 1, 1), 1],
+                                     [datetime.date(2011, 1, 4), 4]])
+
+    def test_types_should_follow_insert_pop_and_setitem(self):
+        table = Table(headers=['spam', 'eggs'])
+        table.extend([['1', '2011-01-01'], ['2', '2011-01-02']])
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': int, 'eggs': datetime.date})
+        table.insert(0, ['1.5', 'abc'])
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': float, 'eggs': str})
+        table.pop(0)
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': int, 'eggs': datetime.date})
+        table[-1] = ['3', '2011-01-03 10:00:00']
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': int, 'eggs': str})
+        table[1] = ['3', None]
+        table._identify_type_of_data()
+        self.assertEquals(table.types, {'spam': int, 'eggs': datetime.date})
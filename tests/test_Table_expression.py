@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import types
+import unittest
+from outputty import Table
+from outputty.expression import Expression
+
+
+class TestExpression(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['price', 'quantity', 'status',
+                                    'unit price'])
+        self.table.extend([[10, 2, 'ok', 5.0], [3, 50, 'error', None],
+                           [200, 1, 'ok', 200.0], [1, 1, 'ok', 1.0]])
+
+    def test_expression_should_find_columns_used(self):
+        expression = Expression('price * quantity > col("unit price") or '
+                                'price > 1')
+        self.assertEquals(expression.columns, ['price', 'quantity',
+                                               'unit price'])
+
+    def test_expression_should_only_allow_simple_expressions(self):
+        for source in ['price +', '__import__("os")', 'price.real',
+                       'lambda: 1', '[x for x in price]', 'price[0]',
+                       'min(price, key=abs)', 'col(price)']:
+            with self.assertRaises(ValueError):
+                Expression(source)
+
+    def test_evaluate_should_return_one_value_per_row(self):
+        self.assertEquals(Expression('price * quantity').evaluate(self.table),
+                          [20, 150, 200, 1])
+        expression = Expression('col("unit price") is None or '
+                                'abs(price - 2) < 2')
+        self.assertEquals(expression.evaluate(self.table),
+                          [False, True, False, True])
+        self.assertEquals(Expression('"x"').evaluate(self.table),
+                          [u'x'] * 4)
+        with self.assertRaises(ValueError):
+            Expression('eggs + 1').evaluate(self.table)
+
+    def test_none_values_should_be_treated_like_null(self):
+        self.table.append(['3', None, None, None])
+        self.assertEquals(Expression('quantity * 2 + 1').evaluate(self.table),
+                          [5, 101, 3, 3, None])
+        self.assertEquals(Expression('abs(-col("unit price"))')
+                          .evaluate(self.table), [5.0, None, 200.0, 1.0, None])
+        self.assertEquals(self.table.filter('col("unit price") >= 1')['price'],
+                          [10, 200, 1])
+        self.assertEquals(self.table.filter('not col("unit price") < 6')
+                          ['price'], [200])
+        self.assertEquals(self.table.filter('quantity > status')['price'], [])
+        self.assertEquals(self.table.filter('status is None or '
+                                            'status != "ok"')['price'],
+                          [3, '3'])
+        self.assertEquals(self.table.filter('price < 10 < quantity')
+                          ['price'], [3])
+
+    def test_append_column_should_accept_expressions(self):
+        self.table.append_column('total', expr='price * quantity',
+                                 position=0)
+        self.assertEquals(self.table.headers[0], 'total')
+        self.assertEquals(self.table['total'], [20, 150, 200, 1])
+        self.table.append_columns([('double', Expression('total * 2')),
+                                   ('half', lambda row: row['total'] / 2)])
+        self.assertEquals(self.table['double'], [40, 300, 400, 2])
+        self.assertEquals(self.table['half'], [10, 75, 100, 0])
+
+    def test_filter_should_return_a_new_table_with_selected_rows(self):
+        self.table.append_column('total', expr='price * quantity')
+        filtered = self.table.filter('total > 100 and status == "ok"')
+        self.assertEquals(filtered.headers, self.table.headers)
+        self.assertEquals(filtered[:], [[200, 1, 'ok', 200.0, 200]])
+        filtered[0] = [0, 1, 'ok', 200.0, 200]
+        self.assertEquals(self.table[2][0], 200)
+        filtered = self.table.filter(lambda row: row['status'] != 'ok')
+        self.assertEquals(filtered['price'], [3])
+        self.assertEquals(len(self.table.filter('False')), 0)
+
+    def test_read_with_where_should_filter_rows_of_any_plugin(self):
+        rows = self.table[:]
+        plugin = types.ModuleType('plugin_fake')
+        plugin.read = lambda table, headers: (setattr(table, 'headers',
+                                                      headers),
+                                              table.extend(rows))
+        table = Table()
+        table.plugins['fake'] = plugin
+        table.read('fake', self.table.headers, where='price < 100')
+        self.assertEquals(table['price'], [10, 3, 1])
+        table = Table()
+        table.plugins['fake'] = plugin
+        table.read('fake', self.table.headers, where=None)
+        self.assertEquals(len(table), 4)
+        table = Table(headers=['price'])
+        table.plugins['fake'] = plugin
+        table.create_index('price')
+        table.read('fake', self.table.headers, where='quantity == 1',
+                   columns=['status', 'price'])
+        self.assertEquals(table.headers, ['status', 'price'])
+        self.assertEquals(table[:], [['ok', 200], ['ok', 1]])
+        self.assertEquals(table.lookup('price', 1), [['ok', 1]])
+
+    def test_filter_should_work_with_compact_columns_and_views(self):
+        self.table.compact()
+        filtered = self.table.filter('quantity < 10')
+        self.assertEquals(filtered.storage, 'columns')
+        self.assertEquals(filtered['price'], [10, 200, 1])
+        view = self.table.view(rows=slice(1, None), columns=['price'])
+        self.assertEquals(view.filter('price < 100')[:], [[3], [1]])
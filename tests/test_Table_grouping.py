@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from outputty import Table
+
+
+class TestTableGroupBy(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['country', 'city', 'amount'])
+        self.table.extend([['Brazil', 'Rio', 10], ['Chile', 'Santiago', 5],
+                           ['Brazil', 'Recife', 20], ['Brazil', 'Rio', None],
+                           ['Peru', 'Lima', 1], ['Chile', 'Santiago', 15]])
+
+    def test_group_by_should_aggregate_each_group(self):
+        result = self.table.group_by('country').aggregate(
+                count=True, sum='amount', min='amount', max=['amount', 'city'],
+                mean='amount')
+        self.assertEquals(result.headers,
+                          ['country', 'count', 'sum_amount', 'min_amount',
+                           'max_amount', 'max_city', 'mean_amount'])
+        self.assertEquals(result[:],
+                          [['Brazil', 3, 30, 10, 20, 'Rio', 15.0],
+                           ['Chile', 2, 20, 5, 15, 'Santiago', 10.0],
+                           ['Peru', 1, 1, 1, 1, 'Lima', 1.0]])
+
+    def test_group_by_many_columns(self):
+        result = self.table.group_by(['country', 'city']).aggregate(
+                count='amount')
+        self.assertEquals(result[:], [['Brazil', 'Rio', 1],
+                                      ['Chile', 'Santiago', 2],
+                                      ['Brazil', 'Recife', 1],
+                                      ['Peru', 'Lima', 1]])
+        with self.assertRaises(ValueError):
+            self.table.group_by('country').aggregate(median='amount')
+        with self.assertRaises(ValueError):
+            self.table.group_by([])
+
+    def test_group_by_should_use_compact_columns(self):
+        self.table.normalize_types(compact=True)
+        result = self.table.group_by('country').aggregate(sum='amount',
+                                                          mean='amount')
+        self.assertEquals(result[:], [[u'Brazil', 30, 15.0],
+                                      [u'Chile', 20, 10.0],
+                                      [u'Peru', 1, 1.0]])
+        del self.table[3]
+        result = self.table.group_by('amount').aggregate(count='city')
+        self.assertEquals(result['amount'], [10, 5, 20, 1, 15])
+
+    def test_group_by_with_max_groups_should_spill_partial_aggregates(self):
+        table = Table(headers=['key', 'value'], chunk_size=2)
+        table.extend([[3, 1], [1, 2], [2, 3], [1, 4], [3, 5], [2, None],
+                      [1, 7]])
+        result = table.group_by('key', max_groups=1).aggregate(
+                count=True, sum='value', min='value', max='value',
+                mean='value')
+        self.assertEquals(result[:], [[1, 3, 13, 2, 7, 13 / 3.0],
+                                      [2, 2, 3, 3, 3, 3.0],
+                                      [3, 2, 6, 1, 5, 3.0]])
@@ -49,3 +49,22 @@ class TestHistogram(unittest.TestCase):
         1.50 : |||
         2.13 :''')
         self.assertEquals(output, expected)
+
+    def test_histogram_should_use_compact_columns(self):
+        seed(1234) # Setting the seed to get repeatable results
+        numbers = normal(size=1000)
+        my_table = Table(headers=['values'])
+        my_table.extend([[float(value)] for value in numbers])
+        my_table.append([None])
+        my_table.compact()
+        output = my_table.write('histogram', column='values', height=5,
+                                orientation='vertical', bins=10)
+        expected = dedent('''
+        265      |
+                 ||
+                |||
+                ||||
+               ||||||
+        -3.56          2.76
+        ''').strip()
+        self.assertEquals(output, expected)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from outputty import Table
+from outputty.indexes import HashIndex, SortedIndex
+
+
+class TestTableIndexes(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['name', 'age'])
+        self.table.extend([['spam', 30], ['eggs', 20], ['ham', 30],
+                           ['idle', None]])
+
+    def test_lookup_should_use_the_index(self):
+        for kind in ['hash', 'sorted']:
+            self.table.create_index('age', kind=kind)
+            self.assertEquals(self.table._indexes['age'].kind, kind)
+            self.assertEquals(self.table.lookup('age', 30),
+                              [['spam', 30], ['ham', 30]])
+            self.assertEquals(self.table.lookup('age', 40), [])
+            self.assertEquals(self.table.lookup('age', 20)[0].name, 'eggs')
+        self.table.drop_index('age')
+        self.assertEquals(self.table.lookup('age', 30),
+                          [['spam', 30], ['ham', 30]])
+        with self.assertRaises(ValueError):
+            self.table.create_index('age', kind='tree')
+
+    def test_lookup_range(self):
+        expected = [['eggs', 20], ['spam', 30], ['ham', 30]]
+        self.assertEquals(self.table.lookup_range('age', 20, 30), expected)
+        self.table.create_index('age', kind='sorted')
+        self.assertEquals(self.table.lookup_range('age', 20, 30), expected)
+        self.assertEquals(self.table.lookup_range('age', low=21),
+                          [['spam', 30], ['ham', 30]])
+        self.assertEquals(self.table.lookup_range('age', high=29),
+                          [['eggs', 20]])
+        self.assertEquals(self.table.lookup_range('age'), expected)
+
+    def test_indexes_should_be_updated_by_changes_at_the_end(self):
+        self.table.create_index('name')
+        self.table.create_index('age', kind='sorted')
+        self.table.append(['john', 30])
+        self.table.extend([['graham', 40], ['terry', 30]])
+        self.table.insert(len(self.table), {'name': 'eric', 'age': 20})
+        self.table[0] = ['michael', 31]
+        self.assertEquals(self.table.pop(), ['eric', 20])
+        del self.table[-1]
+        self.table.remove(['graham', 40])
+        self.assertFalse(self.table._indexes['name'].stale)
+        self.assertFalse(self.table._indexes['age'].stale)
+        self.assertEquals(self.table.lookup('age', 30),
+                          [['ham', 30], ['john', 30]])
+        self.assertEquals(self.table.lookup('name', 'michael'),
+                          [['michael', 31]])
+        self.assertEquals(self.table.lookup('age', 40), [])
+        self.assertEquals(self.table.lookup_range('age', 25),
+                          [['ham', 30], ['john', 30], ['michael', 31]])
+
+    def test_other_changes_should_rebuild_the_indexes(self):
+        self.table.create_index('age')
+        self.table.order_by('name')
+        self.assertTrue(self.table._indexes['age'].stale)
+        self.assertEquals(self.table.lookup('age', 30),
+                          [['ham', 30], ['spam', 30]])
+        self.assertFalse(self.table._indexes['age'].stale)
+        self.table.insert(0, ['john', 30])
+        del self.table[1]
+        self.assertEquals(self.table.lookup('age', 30),
+                          [['john', 30], ['ham', 30], ['spam', 30]])
+        self.table.append_column('double', lambda row: (row.age or 0) * 2)
+        self.assertEquals(self.table.lookup('age', 30)[0],
+                          ['john', 30, 60])
+        self.table.create_index(None)
+        self.table['double'] = [1, 2, 3, 4]
+        self.assertFalse(self.table._indexes['age'].stale)
+        self.assertTrue(self.table._indexes[None].stale)
+        self.assertEquals(self.table.lookup('age', 30)[1], ['ham', 30, 2])
+        self.assertEquals(self.table.count(['ham', 30, 2]), 1)
+        del self.table['age']
+        self.assertEquals(self.table._indexes.keys(), [None])
+
+    def test_index_of_a_view_should_not_see_changes_of_the_table(self):
+        view = self.table.view(columns=['age'])
+        view.create_index('age')
+        self.table[1] = ['eggs', 30]
+        self.assertEquals(view.lookup('age', 30), [[30], [30]])
+        view[3] = [30]
+        self.assertEquals(view.lookup('age', 30), [[30], [30], [30]])
+
+    def test_row_index_should_be_used_by_count_index_remove_and_in(self):
+        self.table.create_index(None)
+        self.table.extend([['spam', 30], ['eggs', 20]])
+        self.assertEquals(self.table.count(['spam', 30]), 2)
+        self.assertEquals(self.table.index(['eggs', 20]), 1)
+        self.assertEquals(self.table.index(['eggs', 20], 2), 5)
+        self.assertEquals(self.table.index(['eggs', 20], -1), 5)
+        with self.assertRaises(ValueError):
+            self.table.index(['eggs', 20], 2, 5)
+        with self.assertRaises(ValueError):
+            self.table.index(['eggs', 21])
+        self.assertTrue(['ham', 30] in self.table)
+        self.table.remove(['spam', 30])
+        self.table.insert(1, ['john', 1])
+        self.assertFalse(self.table._indexes[None].counts_stale)
+        self.assertEquals(self.table.count(['spam', 30]), 1)
+        self.assertEquals(self.table.count(['john', 1]), 1)
+        self.assertEquals(self.table.index(['spam', 30]), 4)
+        self.table[0] = ['spam', 30]
+        self.assertEquals(self.table.count(['eggs', 20]), 1)
+        self.assertEquals(self.table.index(['spam', 30]), 0)
+        self.table.map(lambda value: value and value * 2, ['age'])
+        self.assertEquals(self.table.count(['spam', 60]), 2)
+        self.assertFalse(['spam', 30] in self.table)
+        with self.assertRaises(ValueError):
+            self.table.create_index(None, kind='sorted')
+
+    def test_removing_rows_in_the_middle_should_not_rebuild_row_index(self):
+        self.table.create_index(None)
+        row_index = self.table._indexes[None]
+        self.table.remove(['eggs', 20])
+        self.table.remove(['ham', 30])
+        self.assertTrue(self.table._indexes[None] is row_index)
+        self.assertEquals(self.table[:], [['spam', 30], ['idle', None]])
+        with self.assertRaises(ValueError):
+            self.table.remove(['ham', 30])
+        self.assertEquals(self.table.index(['idle', None]), 1)
+        self.assertTrue(self.table._indexes[None] is row_index)
+        self.assertEquals(self.table.index(['idle', None]), 1)
+        self.assertFalse(self.table._indexes[None].stale)
+
+    def test_row_index_should_follow_columns_added_and_removed(self):
+        self.table.create_index(None)
+        self.table.append_column('double', lambda row: (row.age or 0) * 2)
+        self.assertEquals(self.table.count(['spam', 30, 60]), 1)
+        self.assertTrue(['eggs', 20, 40] in self.table)
+        self.assertFalse(['eggs', 20] in self.table)
+        self.table.set_columns({'name': ['a', 'b', 'c', 'd'],
+                                'id': [1, 2, 3, 4]})
+        self.assertEquals(self.table.index(['c', 30, 60, 3]), 2)
+        del self.table['age']
+        self.assertEquals(self.table.count(['b', 40, 2]), 1)
+        self.assertFalse(['b', 20, 40, 2] in self.table)
+        self.table.remove(['d', 0, 4])
+        self.assertEquals(self.table.count(['d', 0, 4]), 0)
+
+    def test_hash_and_sorted_indexes(self):
+        for kind in [HashIndex, SortedIndex]:
+            index = kind([3, 1, 3, None])
+            self.assertEquals(index.lookup(3), [0, 2])
+            index.add(4, 1)
+            index.discard(0, 3)
+            index.add(0, 1)
+            self.assertEquals(index.lookup(1), [0, 1, 4])
+            self.assertEquals(index.lookup(3), [2])
+            self.assertEquals(index.lookup(None), [3])
+        self.assertEquals(index.range(1, 2), [0, 1, 4])
+        self.assertEquals(index.range(), [0, 1, 4, 2])
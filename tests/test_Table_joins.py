@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from outputty import Table
+
+
+class TestTableJoin(unittest.TestCase):
+    def setUp(self):
+        self.people = Table(headers=['id', 'name', 'city'])
+        self.people.extend([[1, 'Alice', 'Rio'], [2, 'Bob', 'Lima'],
+                            [3, 'Carol', None], [None, 'Dave', 'Rio']])
+        self.orders = Table(headers=['id', 'city', 'amount'])
+        self.orders.extend([[2, 'Lima', 10], [1, 'Rio', 20], [2, 'Lima', 5],
+                            [4, 'Quito', 1], [None, 'Rio', 3]])
+
+    def test_join_should_use_suffixes_for_repeated_headers(self):
+        result = self.people.join(self.orders, on='id')
+        self.assertEquals(result.headers, ['id', 'name', 'city_left',
+                                           'city_right', 'amount'])
+        self.assertEquals(result[:], [[2, 'Bob', 'Lima', 'Lima', 10],
+                                      [1, 'Alice', 'Rio', 'Rio', 20],
+                                      [2, 'Bob', 'Lima', 'Lima', 5]])
+        result = self.people.join(self.orders, on='id',
+                                  suffixes=('_person', '_order'))
+        self.assertEquals(result.headers, ['id', 'name', 'city_person',
+                                           'city_order', 'amount'])
+
+    def test_join_should_keep_rows_without_match(self):
+        result = self.people.join(self.orders, on='id', how='left')
+        self.assertEquals(sorted(result[:]),
+                          [[None, 'Dave', 'Rio', None, None],
+                           [1, 'Alice', 'Rio', 'Rio', 20],
+                           [2, 'Bob', 'Lima', 'Lima', 5],
+                           [2, 'Bob', 'Lima', 'Lima', 10],
+                           [3, 'Carol', None, None, None]])
+        result = self.people.join(self.orders, on='id', how='right')
+        self.assertEquals(sorted(result[:]),
+                          [[None, None, None, 'Rio', 3],
+                           [1, 'Alice', 'Rio', 'Rio', 20],
+                           [2, 'Bob', 'Lima', 'Lima', 5],
+                           [2, 'Bob', 'Lima', 'Lima', 10],
+                           [4, None, None, 'Quito', 1]])
+        self.orders.normalize_types()
+        result = self.people.join(self.orders, on='id', how='outer')
+        self.assertEquals(len(result), 7)
+        self.assertEquals(result.types['amount'], int)
+        with self.assertRaises(ValueError):
+            self.people.join(self.orders, on='id', how='cross')
+        with self.assertRaises(ValueError):
+            self.people.join(self.orders, on='id', algorithm='nested')
+
+    def test_join_on_many_columns(self):
+        result = self.people.join(self.orders, on=['id', 'city'])
+        self.assertEquals(result.headers, ['id', 'name', 'city', 'amount'])
+        self.assertEquals(result[:], [[2, 'Bob', 'Lima', 10],
+                                      [1, 'Alice', 'Rio', 20],
+                                      [2, 'Bob', 'Lima', 5]])
+
+    def test_merge_join_should_need_ordered_tables(self):
+        with self.assertRaises(ValueError):
+            list(self.people.join(self.orders, on='id', algorithm='merge'))
+        self.people.order_by('id')
+        self.orders.order_by('id')
+        for how in ('inner', 'left', 'right', 'outer'):
+            hashed = self.people.join(self.orders, on='id', how=how)
+            merged = self.people.join(self.orders, on='id', how=how,
+                                      algorithm='merge')
+            self.assertEquals(sorted(merged[:]), sorted(hashed[:]))
+        self.assertEquals(merged['amount'], [None, 3, 20, 10, 5, None, 1])
@@ -255,6 +255,57 @@ class TestTableMySQL(unittest.TestCase):
         new_table.read('mysql', self.connection_string, order_by='number desc')
         self.assertEquals(new_table[:], [[x] for x in numbers[::-1]])
 
+    def test_read_should_accept_where(self):
+        self.connection.query('DROP TABLE ' + self.table)
+        self.connection.commit()
+        table = Table(headers=['number', 'name'])
+        for i in range(100):
+            table.append([i, 'even' if i % 2 == 0 else 'odd'])
+        table.append([None, None])
+        table.write('mysql', self.connection_string)
+        plugin_mysql = table._load_plugin('mysql')
+        quote = lambda value: '"' + value + '"'
+        self.assertEquals(plugin_mysql._where_clause(
+                'number < 10 and not name in ("odd", "x")', quote),
+                '((`number` < 10) AND NOT (`name` IN ("odd", "x")))')
+        self.assertEquals(plugin_mysql._where_clause('number % 2', quote),
+                          None)
+        self.assertEquals(plugin_mysql._where_clause(
+                'number > 10000000000000000000 or number < -0.5', quote),
+                '((`number` > 10000000000000000000) OR (`number` < -0.5))')
+        self.assertEquals(plugin_mysql._where_clause('number > 1e400',
+                                                     quote), None)
+        new_table = Table()
+        new_table.read('mysql', self.connection_string,
+                       where='number >= 90 and name == "odd"',
+                       order_by='number desc', limit=(1, 2))
+        self.assertEquals(new_table[:], [[97, u'odd'], [95, u'odd']])
+        new_table = Table()
+        new_table.read('mysql', self.connection_string,
+                       where='number % 10 == 1', limit=(0, 3))
+        self.assertEquals(new_table['number'], [1, 11, 21])
+        new_table = Table()
+        new_table.read('mysql', self.connection_string, where='name is None')
+        self.assertEquals(new_table[:], [[None, None]])
+
+    def test_read_should_accept_columns(self):
+        self.connection.query('DROP TABLE ' + self.table)
+        self.connection.commit()
+        table = Table(headers=['number', 'name', 'other'])
+        for i in range(10):
+            table.append([i, 'even' if i % 2 == 0 else 'odd', i * 2])
+        table.write('mysql', self.connection_string)
+        new_table = Table()
+        new_table.read('mysql', self.connection_string,
+                       columns=['name', 'number'], where='number < 3')
+        self.assertEquals(new_table.headers, ['name', 'number'])
+        self.assertEquals(new_table[:], [[u'even', 0], [u'odd', 1],
+                                         [u'even', 2]])
+        new_table = Table()
+        new_table.read('mysql', self.connection_string, columns=['other'],
+                       where='number % 5 == 0')
+        self.assertEquals(new_table[:], [[0], [10]])
+
     def test_read_should_accept_a_SQL_instead_of_table_name(self):
         self.connection.query('DROP TABLE ' + self.table)
         self.connection.commit()
@@ -0,0 +1,654 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011 Álvaro Justen
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import datetime
+from textwrap import dedent
+from outputty import Table
+from outputty.columns import TypedColumn, DictionaryColumn
+from outputty.storage import (ColumnStorage, ChunkedStorage, ViewStorage,
+                              parse_size)
+
+
+def value_counts(column):
+    return dict((value, count)
+                for value, count in zip(column.values, column.counts) if count)
+
+
+class TestTableColumnStorage(unittest.TestCase):
+    def test_storage_should_be_one_of_the_available_storages(self):
+        with self.assertRaises(ValueError):
+            Table(headers=['spam'], storage='python')
+
+    def test_column_storage_should_keep_data_as_columns(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        table.extend([[1, 2], [3, 4], [5, 6]])
+        self.assertTrue(isinstance(table._storage, ColumnStorage))
+        self.assertEquals(table._storage.columns, [[1, 3, 5], [2, 4, 6]])
+        self.assertEquals(table['eggs'], [2, 4, 6])
+        self.assertEquals(table[1], [3, 4])
+        self.assertEquals(table[-1], [5, 6])
+        self.assertEquals(table[::2], [[1, 2], [5, 6]])
+        self.assertEquals(list(table), [[1, 2], [3, 4], [5, 6]])
+        with self.assertRaises(IndexError):
+            table[3]
+
+    def test_column_storage_should_support_list_operations(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        table.append([1, 2])
+        table.extend([[3, 4], [5, 6], [1, 2]])
+        table.insert(0, {'spam': 7, 'eggs': 8})
+        self.assertEquals(table.pop(), [1, 2])
+        self.assertEquals(table.count([1, 2]), 1)
+        self.assertEquals(table.index([5, 6]), 3)
+        table.remove([3, 4])
+        table[0] = [9, 9]
+        table[1:] = [[0, 0], [1, 1], [2, 2]]
+        self.assertEquals(table[:], [[9, 9], [0, 0], [1, 1], [2, 2]])
+        del table[1:3]
+        table.reverse()
+        self.assertEquals(table[:], [[2, 2], [9, 9]])
+        self.assertEquals(len(table), 2)
+
+    def test_rows_of_column_storage_should_not_be_changed_in_place(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        table.extend([[1, 2], [3, 4]])
+        with self.assertRaises(TypeError):
+            table[0][1] = 5
+        with self.assertRaises(TypeError):
+            table[:][1].append(5)
+        self.assertEquals(table[0] + [5], [1, 2, 5])
+        row = table.pop()
+        row[1] = 5
+        self.assertEquals(row, [3, 5])
+        self.assertEquals(table[:], [[1, 2]])
+
+    def test_column_storage_should_accept_slice_assignment_when_empty(self):
+        for storage in ['rows', 'columns', 'chunks']:
+            table = Table(headers=['spam', 'eggs'], storage=storage)
+            table[0:0] = [[1, 2]]
+            table[1:] = [[3, 4], [5, 6]]
+            self.assertEquals(table[:], [[1, 2], [3, 4], [5, 6]])
+            self.assertEquals(table['eggs'], [2, 4, 6])
+
+    def test_column_storage_should_keep_one_column_per_header(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        del table['eggs']
+        table.headers = ['spam', 'eggs']
+        self.assertEquals(len(table._storage.columns), 2)
+        table.extend([[1, 2]])
+        del table[:]
+        del table['eggs']
+        self.assertEquals(len(table._storage.columns), 1)
+        table[0:0] = [[1]]
+        self.assertEquals(list(table), [[1]])
+        self.assertEquals(table[0], [1])
+        del table[:]
+        table.append_column('eggs', [])
+        table.append_column('ham', [], position=0)
+        self.assertEquals(len(table._storage.columns), 3)
+        table.append([0, 1, 2])
+        self.assertEquals(table[:], [[0, 1, 2]])
+
+    def test_column_storage_should_support_column_operations(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        table.extend([[3, 'b'], [1, 'c'], [2, 'a']])
+        table['spam'] = [30, 10, 20]
+        table.append_column('ham', lambda row: row[0] * 2, position=1)
+        del table['eggs']
+        self.assertEquals(table.headers, ['spam', 'ham'])
+        table.order_by('spam', 'desc')
+        self.assertEquals(table[:], [[30, 60], [20, 40], [10, 20]])
+
+    def test_column_storage_should_work_with_plugins(self):
+        table = Table(headers=['spam', 'eggs'], storage='columns')
+        table.extend([[u'Álvaro', 1], ['Justen', None]])
+        self.assertEquals(table.write('csv'), dedent('''\
+        "spam","eggs"
+        "Álvaro","1"
+        "Justen",""
+        '''))
+        self.assertEquals(table.write('text'), dedent('''
+        +--------+------+
+        |  spam  | eggs |
+        +--------+------+
+        | Álvaro |    1 |
+        | Justen | None |
+        +--------+------+
+        ''').strip())
+
+
+class TestTableChunkedStorage(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['spam', 'eggs'], storage='chunks',
+                           chunk_size=2)
+        self.table.extend([[5, 'a'], [3, 'b'], [1, 'c'], [4, 'd'], [2, 'e']])
+
+    def test_extend_should_fill_chunks_up_to_chunk_size(self):
+        storage = self.table._storage
+        self.assertTrue(isinstance(storage, ChunkedStorage))
+        self.assertEquals([len(chunk) for chunk in storage.chunks], [2, 2, 1])
+        self.table.append([6, 'f'])
+        self.table.extend([[7, 'g'], [8, 'h'], [9, 'i']])
+        self.assertEquals([len(chunk) for chunk in storage.chunks],
+                          [2, 2, 2, 2, 1])
+        self.assertEquals(list(storage.iter_chunks())[1], [[1, 'c'], [4, 'd']])
+        self.assertEquals(self.table['spam'], [5, 3, 1, 4, 2, 6, 7, 8, 9])
+        self.assertEquals(self.table[3], [4, 'd'])
+        self.assertEquals(self.table[-1], [9, 'i'])
+        self.assertEquals(self.table[1:6:2], [[3, 'b'], [4, 'd'], [6, 'f']])
+        self.assertEquals(self.table[3:5], [[4, 'd'], [2, 'e']])
+
+    def test_chunks_should_keep_statistics(self):
+        chunks = self.table._storage.chunks
+        self.assertEquals(chunks[0].statistics(), [(3, 5), ('a', 'b')])
+        self.assertEquals(chunks[1].statistics(), [(1, 4), ('c', 'd')])
+        self.table[2] = [None, 'x']
+        self.assertEquals(chunks[1].statistics(), [(4, 4), ('d', 'x')])
+        self.assertFalse(chunks[0].may_contain([4, 'd']))
+        self.assertTrue(chunks[1].may_contain([4, 'd']))
+        self.assertEquals(self.table.count([4, 'd']), 1)
+        self.assertEquals(self.table.index([2, 'e']), 4)
+        with self.assertRaises(ValueError):
+            self.table.index([5, 'a'], 1)
+        self.table[0][0] = 9
+        self.assertEquals(self.table.count([9, 'a']), 1)
+        self.assertTrue([9, 'a'] in self.table)
+
+    def test_chunked_storage_should_support_list_operations(self):
+        self.table.insert(1, [0, 'z'])
+        self.table.insert(1, [0, 'y'])
+        self.assertEquals(self.table.pop(0), [5, 'a'])
+        del self.table[1:3]
+        self.table.remove([4, 'd'])
+        self.table.reverse()
+        self.assertEquals(self.table[:], [[2, 'e'], [1, 'c'], [0, 'y']])
+        self.table[0:2] = [[10, 'j']]
+        self.assertEquals(self.table[:], [[10, 'j'], [0, 'y']])
+        self.assertEquals(len(self.table), 2)
+
+    def test_chunked_storage_should_support_column_operations(self):
+        self.table.append_column('ham', lambda row: row[0] * 10, position=1)
+        self.table['spam'] = [0, 1, 2, 3, 4]
+        del self.table['eggs']
+        self.table.order_by('ham', 'desc')
+        self.assertEquals(self.table[:], [[0, 50], [3, 40], [1, 30], [4, 20],
+                                          [2, 10]])
+        self.assertEquals(str(self.table), dedent('''
+        +------+-----+
+        | spam | ham |
+        +------+-----+
+        |    0 |  50 |
+        |    3 |  40 |
+        |    1 |  30 |
+        |    4 |  20 |
+        |    2 |  10 |
+        +------+-----+
+        ''').strip())
+
+    def test_type_detection_should_read_chunks(self):
+        table = Table(headers=['spam'], storage='chunks', chunk_size=2)
+        table.extend([['1'], ['2'], ['3.5'], [None], ['2011-11-23']])
+        table.normalize_types()
+        self.assertEquals(table.types['spam'], str)
+        table['spam'] = ['1', '2', '3.5', None, '4']
+        table.normalize_types()
+        self.assertEquals(table.types['spam'], float)
+        self.assertEquals(table['spam'], [1.0, 2.0, 3.5, None, 4.0])
+
+    def test_copy_should_share_chunks_until_changed(self):
+        copy = self.table.copy()
+        copy[0] = [50, 'A']
+        copy['eggs'] = ['A', 'B', 'C', 'D', 'E']
+        self.assertTrue(copy._storage.chunks[0] is not
+                        self.table._storage.chunks[0])
+        self.assertEquals(self.table[:], [[5, 'a'], [3, 'b'], [1, 'c'],
+                                          [4, 'd'], [2, 'e']])
+        self.assertEquals(copy['spam'], [50, 3, 1, 4, 2])
+
+
+class TestTableSpilledChunks(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['spam', 'eggs'], storage='chunks',
+                           chunk_size=2, max_memory=1)
+        self.table.extend([[5, u'a'], [3, u'b'], [1, u'c'], [4, u'd'],
+                           [2, u'e']])
+
+    def test_max_memory_should_only_be_used_with_chunks(self):
+        with self.assertRaises(ValueError):
+            Table(headers=['spam'], storage='rows', max_memory=1024)
+
+    def test_older_chunks_should_be_spilled_to_disk(self):
+        chunks = self.table._storage.chunks
+        self.assertEquals([chunk.in_memory for chunk in chunks],
+                          [False, False, True])
+        self.assertEquals(chunks[0].statistics(), [(3, 5), (u'a', u'b')])
+        self.assertEquals(self.table[1], [3, u'b'])
+        self.assertEquals(self.table[2:4], [[1, u'c'], [4, u'd']])
+        self.assertEquals(self.table['spam'], [5, 3, 1, 4, 2])
+        self.assertEquals(self.table.index([4, u'd']), 3)
+        self.table[0] = [50, u'A']
+        self.table.append([6, u'f'])
+        self.assertEquals([chunk.in_memory for chunk in chunks],
+                          [False, False, True])
+        self.assertEquals(list(self.table)[0], [50, u'A'])
+        self.assertEquals(len(self.table), 6)
+
+    def test_spill_file_should_use_the_space_of_changed_chunks(self):
+        table = Table(headers=['spam'], storage='chunks', chunk_size=100,
+                      max_memory='10KB')
+        table.extend([[number] for number in range(2000)])
+        spill_file = table._storage._spill_file
+        size = spill_file._size
+        for times in range(2, 6):
+            table['spam'] = [number * times for number in range(2000)]
+            self.assertTrue(table._storage._spill_file is spill_file)
+            self.assertTrue(spill_file._size <= 2 * size)
+        self.assertEquals(table['spam'][-2:], [9990, 9995])
+
+    def test_order_by_should_merge_spilled_chunks(self):
+        self.table.extend([[3, u'f'], [1, u'g']])
+        self.table.order_by('spam')
+        self.assertEquals(self.table['eggs'], [u'c', u'g', u'e', u'b', u'f',
+                                               u'd', u'a'])
+        self.table.order_by('spam', 'desc')
+        self.assertEquals(self.table['eggs'], [u'a', u'd', u'b', u'f', u'e',
+                                               u'c', u'g'])
+        self.assertFalse(self.table._storage.chunks[0].in_memory)
+
+    def test_order_by_should_merge_runs_that_fit_in_max_memory(self):
+        rows = [[number % 7, number] for number in range(300)]
+        table = Table(headers=['spam', 'eggs'], storage='chunks',
+                      chunk_size=10, max_memory='2KB')
+        table.extend(rows)
+        table.order_by('spam', 'desc')
+        self.assertEquals(table[:], sorted(rows, key=lambda row: -row[0]))
+        table.order_by('eggs')
+        self.assertEquals(table[:], sorted(rows, key=lambda row: row[1]))
+
+    def test_order_by_with_many_columns_should_merge_spilled_chunks(self):
+        self.table.extend([[3, u'a'], [1, u'g'], [None, u'h']])
+        self.table.order_by([('spam', 'desc'), 'eggs'], nulls='last')
+        self.assertEquals(self.table[:], [[5, u'a'], [4, u'd'], [3, u'a'],
+                                          [3, u'b'], [2, u'e'], [1, u'c'],
+                                          [1, u'g'], [None, u'h']])
+
+    def test_order_by_with_max_memory_should_spill_the_table(self):
+        table = Table(headers=['spam'], chunk_size=2)
+        table.extend([[3], [1], [4], [1], [5], [9], [2]])
+        table.order_by('spam', max_memory=1)
+        self.assertEquals(table.storage, 'chunks')
+        self.assertEquals(table.max_memory, 1)
+        self.assertEquals(table['spam'], [1, 1, 2, 3, 4, 5, 9])
+        self.assertFalse(table._storage.chunks[0].in_memory)
+        self.assertEquals(table.write('csv').splitlines()[1:3],
+                          ['"1"', '"1"'])
+        chunked = Table(headers=['spam'], storage='chunks', chunk_size=2)
+        chunked.extend([[3], [1], [4]])
+        chunked.order_by('spam', 'desc', max_memory='1B')
+        self.assertEquals(chunked['spam'], [4, 3, 1])
+        self.assertFalse(chunked._storage.chunks[0].in_memory)
+
+    def test_parse_size(self):
+        self.assertEquals(parse_size(1024), 1024)
+        self.assertEquals(parse_size('512'), 512)
+        self.assertEquals(parse_size('2KB'), 2048)
+        self.assertEquals(parse_size('1.5 mb'), 1572864)
+        self.assertEquals(parse_size('1G'), 2 ** 30)
+        with self.assertRaises(ValueError):
+            parse_size('a lot')
+
+    def test_top_should_read_spilled_chunks(self):
+        top = self.table.top(2, 'spam')
+        self.assertEquals(top.storage, 'chunks')
+        self.assertEquals(top[:], [[5, u'a'], [4, u'd']])
+        self.table.order_by('eggs', 'desc', limit=3)
+        self.assertEquals(self.table['eggs'], [u'e', u'd', u'c'])
+
+    def test_plugins_should_read_spilled_chunks(self):
+        self.table.append_column('ham', lambda row: row['spam'] * 2)
+        del self.table['eggs']
+        self.assertEquals(self.table.write('csv').splitlines()[1:3],
+                          ['"5","10"', '"3","6"'])
+        self.assertEquals(str(self.table).splitlines()[3:5],
+                          ['|    5 |  10 |', '|    3 |   6 |'])
+        copy = self.table.copy()
+        del copy[1:4]
+        copy.reverse()
+        self.assertEquals(copy[:], [[2, 4], [5, 10]])
+        self.assertEquals(self.table['ham'], [10, 6, 2, 8, 4])
+
+
+class TestTableCompactColumns(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['int', 'float', 'date', 'datetime', 'str'])
+        self.table.append(['3', '2.5', '2011-11-23', '2011-11-23 02:00:17',
+                           'spam'])
+        self.table.append(['', None, '', None, 'eggs'])
+        self.table.append(['1', '3.14', '2010-01-01', '2010-01-01 00:00:00',
+                           'ham'])
+
+    def test_normalize_types_with_compact_should_use_typed_columns(self):
+        self.table.normalize_types(compact=True)
+        self.assertEquals(self.table.storage, 'columns')
+        columns = self.table._storage.columns
+        self.assertTrue(isinstance(columns[0], TypedColumn))
+        self.assertEquals(columns[0].values.typecode, 'l')
+        self.assertTrue(isinstance(columns[1], TypedColumn))
+        self.assertEquals(columns[1].values.typecode, 'd')
+        self.assertTrue(isinstance(columns[2], TypedColumn))
+        self.assertTrue(isinstance(columns[3], TypedColumn))
+        self.assertTrue(isinstance(columns[4], list))
+        self.assertEquals(self.table[0], [3, 2.5, datetime.date(2011, 11, 23),
+                          datetime.datetime(2011, 11, 23, 2, 0, 17), u'spam'])
+        self.assertEquals(self.table[1], [None, None, None, None, u'eggs'])
+        self.assertEquals(self.table['int'], [3, None, 1])
+        self.assertEquals(self.table.types['datetime'], datetime.datetime)
+
+    def test_typed_columns_should_accept_changes(self):
+        self.table.normalize_types(compact=True)
+        self.table.append([4, None, datetime.date(2012, 1, 2), None, 'spam'])
+        self.table.insert(0, [None, 1.5, None, None, 'eggs'])
+        self.table[1] = [5, 0.5, None, None, None]
+        del self.table[-1]
+        self.assertTrue(isinstance(self.table._storage.columns[0],
+                                   TypedColumn))
+        self.assertEquals(self.table['int'], [None, 5, None, 1])
+        self.assertEquals(self.table['float'], [1.5, 0.5, None, 3.14])
+
+    def test_typed_column_should_become_a_list_with_other_types(self):
+        self.table.normalize_types(compact=True)
+        self.table.append(['spam', 1.0, None, None, None])
+        self.assertTrue(isinstance(self.table._storage.columns[0], list))
+        self.assertTrue(isinstance(self.table._storage.columns[1],
+                                   TypedColumn))
+        self.assertEquals(self.table['int'], [3, None, 1, 'spam'])
+
+    def test_batch_functions_should_receive_numpy_arrays(self):
+        import numpy
+
+        self.table.normalize_types(compact=True)
+        self.table['int'] = [3, 2, 1]
+        self.table.append_column('ratio', lambda columns: columns['int'] /
+                                 numpy.array([1.0, 4.0, 2.0]),
+                                 batch=True, numpy=True)
+        self.assertEquals(self.table['ratio'], [3.0, 0.5, 0.5])
+        self.assertTrue(isinstance(self.table['ratio'][0], float))
+
+    def test_order_by_and_text_output_should_use_typed_columns(self):
+        self.table.normalize_types(compact=True)
+        self.table.order_by('int')
+        self.assertEquals(self.table['int'], [None, 1, 3])
+        self.table.order_by('date', 'desc')
+        self.assertEquals(self.table['str'], [u'spam', u'ham', u'eggs'])
+        del self.table['float']
+        del self.table['datetime']
+        self.assertEquals(str(self.table), dedent('''
+        +------+------------+------+
+        | int  |    date    | str  |
+        +------+------------+------+
+        |    3 | 2011-11-23 | spam |
+        |    1 | 2010-01-01 |  ham |
+        | None |       None | eggs |
+        +------+------------+------+
+        ''').strip())
+
+
+class TestTableDictionaryColumns(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['country', 'status', 'id'])
+        self.table.extend([['Brazil', 'ok', '1'], ['Chile', 'error', '2'],
+                           ['Brazil', 'ok', '3'], ['Brazil', None, '4'],
+                           ['Chile', 'ok', '5'], ['Peru', 'ok', '6']])
+
+    def test_low_cardinality_text_columns_should_be_dictionary_encoded(self):
+        self.table.normalize_types(compact=True)
+        columns = self.table._storage.columns
+        self.assertTrue(isinstance(columns[0], DictionaryColumn))
+        self.assertTrue(isinstance(columns[1], DictionaryColumn))
+        self.assertTrue(isinstance(columns[2], TypedColumn))
+        self.assertEquals(columns[0].values, [u'Brazil', u'Chile', u'Peru'])
+        self.assertEquals(list(columns[0].codes), [0, 1, 0, 0, 1, 2])
+        self.assertEquals(value_counts(columns[1]),
+                          {u'ok': 4, u'error': 1, None: 1})
+        self.assertEquals(self.table[3], [u'Brazil', None, 4])
+        self.assertEquals(self.table.types['country'], str)
+
+    def test_dictionary_encoding_can_be_forced(self):
+        self.table.append(['Uruguay', 'unknown', '7'])
+        self.table.normalize_types(compact=True, dictionary=['id'])
+        columns = self.table._storage.columns
+        self.assertTrue(isinstance(columns[0], list))
+        self.assertTrue(isinstance(columns[2], TypedColumn))
+        self.table.compact(dictionary=['country'], max_distinct_ratio=0)
+        self.assertTrue(isinstance(columns[0], DictionaryColumn))
+        self.assertTrue(isinstance(columns[1], list))
+
+    def test_dictionary_columns_should_accept_changes(self):
+        self.table.normalize_types(compact=True)
+        self.table.append([u'Peru', u'ok', 7])
+        self.table[0] = [u'Bolivia', u'error', 1]
+        del self.table[1:3]
+        self.table.insert(0, [None, u'ok', 0])
+        column = self.table._storage.columns[0]
+        self.assertTrue(isinstance(column, DictionaryColumn))
+        self.assertEquals(self.table['country'], [None, u'Bolivia', u'Brazil',
+                                                  u'Chile', u'Peru', u'Peru'])
+        self.assertEquals(value_counts(column),
+                          {None: 1, u'Bolivia': 1, u'Brazil': 1, u'Chile': 1,
+                           u'Peru': 2})
+        self.table.append([1, u'ok', 8])
+        self.assertTrue(isinstance(self.table._storage.columns[0], list))
+        self.assertEquals(self.table['country'][-1], 1)
+
+    def test_operations_should_use_dictionary_codes(self):
+        self.table.normalize_types(compact=True)
+        self.assertEquals(self.table.count([u'Brazil', u'ok', 3]), 1)
+        self.assertEquals(self.table.count([u'Peru', u'error', 6]), 0)
+        self.assertEquals(self.table.count([u'Argentina', u'ok', 6]), 0)
+        self.assertEquals(self.table.index([u'Chile', u'ok', 5]), 4)
+        self.assertEquals(self.table.index([u'Brazil', u'ok', 3], 1), 2)
+        with self.assertRaises(ValueError):
+            self.table.index([u'Brazil', u'ok', 1], 1)
+        self.table.order_by('country', 'desc')
+        self.assertEquals(self.table['country'], [u'Peru', u'Chile', u'Chile',
+                                                  u'Brazil', u'Brazil',
+                                                  u'Brazil'])
+        self.assertEquals(self.table['id'], [6, 2, 5, 1, 3, 4])
+        self.assertTrue(isinstance(self.table._storage.columns[0],
+                                   DictionaryColumn))
+        self.table.order_by('status')
+        self.assertEquals(self.table['status'][:2], [None, u'error'])
+
+    def test_top_should_keep_compact_columns(self):
+        self.table.normalize_types(compact=True)
+        top = self.table.top(3, by=[('country', 'asc'), 'id'])
+        self.assertEquals(top['id'], [4, 3, 1])
+        self.assertTrue(isinstance(top._storage.columns[0], DictionaryColumn))
+        self.assertTrue(isinstance(top._storage.columns[2], TypedColumn))
+        self.assertEquals(top.types, self.table.types)
+
+    def test_writers_should_use_dictionary_columns(self):
+        self.table.normalize_types(compact=True)
+        self.assertEquals(self.table.write('csv').splitlines()[:3],
+                          ['"country","status","id"', '"Brazil","ok","1"',
+                           '"Chile","error","2"'])
+        self.assertEquals(str(self.table).splitlines()[3:5],
+                          ['|  Brazil |     ok |  1 |',
+                           '|   Chile |  error |  2 |'])
+        rows = list(self.table.iter_rows('utf8'))
+        self.assertEquals(rows[1]['country'], 'Chile')
+        self.assertTrue(isinstance(rows[1]['country'], str))
+
+    def test_copies_of_dictionary_columns_should_be_independent(self):
+        self.table.normalize_types(compact=True)
+        snapshot = self.table.snapshot()
+        self.table[0] = [u'Peru', u'ok', 1]
+        view = self.table.view(rows=slice(1, 3), columns=['country'])
+        self.assertEquals(snapshot['country'][0], u'Brazil')
+        self.assertEquals(view._storage.get_raw_column(0),
+                          [u'Chile', u'Brazil'])
+        self.assertEquals(value_counts(snapshot._storage.columns[0]),
+                          {u'Brazil': 3, u'Chile': 2, u'Peru': 1})
+
+
+class TestTableViews(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['spam', 'eggs', 'ham'])
+        self.table.extend([[1, 'a', 1.5], [2, 'b', 2.5], [3, 'c', 3.5],
+                           [4, 'd', 4.5]])
+
+    def test_view_should_select_rows_and_columns_of_table(self):
+        view = self.table.view(rows=slice(1, 3), columns=['ham', 'spam'])
+        self.assertEquals(view.headers, ['ham', 'spam'])
+        self.assertEquals(len(view), 2)
+        self.assertEquals(view[:], [[2.5, 2], [3.5, 3]])
+        self.assertEquals(view[-1], [3.5, 3])
+        self.assertEquals(view['spam'], [2, 3])
+        self.assertEquals(list(view), [[2.5, 2], [3.5, 3]])
+        self.assertEquals(view.index([3.5, 3]), 1)
+        self.table[1] = [20, 'B', 25.5]
+        self.assertEquals(view[0], [2.5, 2])
+        reversed_view = self.table.view(rows=slice(None, None, -2))
+        self.assertEquals(reversed_view['eggs'], ['d', 'B'])
+        self.assertEquals(reversed_view.view(columns=['spam'])[:],
+                          [[4], [20]])
+
+    def test_changing_the_table_should_not_change_a_view(self):
+        for storage in ('rows', 'columns', 'chunks'):
+            table = Table(headers=['spam', 'eggs'], storage=storage,
+                          chunk_size=2)
+            table.extend([[1, 'a'], [2, 'b'], [3, 'c']])
+            view = table.view(columns=['eggs', 'spam'])
+            table.pop()
+            del table['spam']
+            table.insert(0, ['z'])
+            self.assertEquals(len(view), 3)
+            self.assertEquals(view[2], ['c', 3])
+            self.assertEquals(list(view), [['a', 1], ['b', 2], ['c', 3]])
+            self.assertEquals(view['spam'], [1, 2, 3])
+
+    def test_view_should_be_written_by_plugins(self):
+        view = self.table.view(rows=slice(2, None), columns=['eggs', 'spam'])
+        self.assertEquals(view.write('csv'), dedent('''\
+        "eggs","spam"
+        "c","3"
+        "d","4"
+        '''))
+        self.assertEquals(view.write('text'), dedent('''
+        +------+------+
+        | eggs | spam |
+        +------+------+
+        |    c |    3 |
+        |    d |    4 |
+        +------+------+
+        ''').strip())
+        self.assertIn('<td>d</td>', view.write('html'))
+
+    def test_changing_a_view_should_not_change_the_table(self):
+        view = self.table.view(rows=slice(0, 2), columns=['spam', 'eggs'])
+        with self.assertRaises(TypeError):
+            view[0][0] = 0
+        self.assertTrue(isinstance(view._storage, ViewStorage))
+        view.append([5, 'e'])
+        view[0] = [0, 'z']
+        view.order_by('spam', 'desc')
+        self.assertEquals(view[:], [[5, 'e'], [2, 'b'], [0, 'z']])
+        self.assertFalse(isinstance(view._storage, ViewStorage))
+        self.assertEquals(self.table['spam'], [1, 2, 3, 4])
+        self.assertEquals(len(self.table), 4)
+
+    def test_top_of_a_view_should_not_change_the_table(self):
+        view = self.table.view(rows=slice(1, 4), columns=['eggs', 'spam'])
+        self.assertEquals(view.top(2, 'spam')[:], [['d', 4], ['c', 3]])
+        view.order_by('spam', limit=1)
+        self.assertEquals(view[:], [['b', 2]])
+        self.assertEquals(len(self.table), 4)
+
+    def test_changing_a_view_of_compact_columns_should_keep_them(self):
+        self.table.compact()
+        view = self.table.view(rows=slice(1, 3), columns=['ham'])
+        view.append([None])
+        self.assertTrue(isinstance(view._storage, ColumnStorage))
+        self.assertTrue(isinstance(view._storage.columns[0], TypedColumn))
+        self.assertEquals(view['ham'], [2.5, 3.5, None])
+        self.assertEquals(self.table['ham'], [1.5, 2.5, 3.5, 4.5])
+
+
+class TestTableCopyOnWrite(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(headers=['spam', 'eggs', 'ham'], storage='rows')
+        self.table.extend([[3, 'a', 1.5], [1, 'b', 2.5], [2, 'c', 3.5]])
+
+    def test_copy_should_share_rows_until_changed(self):
+        copy = self.table.copy()
+        self.assertTrue(copy._storage.rows is self.table._storage.rows)
+        copy.append([4, 'd', 4.5])
+        copy.order_by('spam')
+        self.assertEquals(copy['spam'], [1, 2, 3, 4])
+        self.assertEquals(self.table['spam'], [3, 1, 2])
+        self.assertTrue(copy._storage.rows[0] is self.table._storage.rows[1])
+        copy.append_column('new column', [1, 2, 3, 4])
+        self.assertEquals(copy.headers, ['spam', 'eggs', 'ham', 'new column'])
+        self.assertEquals(self.table.headers, ['spam', 'eggs', 'ham'])
+        self.assertEquals(self.table[:], [[3, 'a', 1.5], [1, 'b', 2.5],
+                                          [2, 'c', 3.5]])
+
+    def test_changing_rows_taken_from_table_should_not_change_snapshot(self):
+        for storage in ('rows', 'chunks'):
+            table = Table(headers=['spam', 'eggs'], storage=storage,
+                          chunk_size=2)
+            table.extend([[1, 'a'], [2, 'b'], [3, 'c']])
+            snapshot = table.snapshot()
+            table[0][0] = 99
+            for row in table[1:]:
+                row[1] = 'x'
+            table.pop()[0] = 42
+            self.assertEquals(snapshot[:], [[1, 'a'], [2, 'b'], [3, 'c']])
+            self.assertEquals(snapshot.count([2, 'b']), 1)
+
+    def test_reading_a_row_should_copy_only_that_row(self):
+        view = self.table.view()
+        shared_rows = list(self.table._storage.rows)
+        row = self.table[1]
+        self.assertTrue(self.table[1] is row)
+        self.assertFalse(row is shared_rows[1])
+        self.assertTrue(self.table._storage.rows[0] is shared_rows[0])
+        self.assertTrue(self.table._storage.rows[2] is shared_rows[2])
+        self.assertTrue(self.table[1:][0] is row)
+        self.assertEquals(view[1], [1, 'b', 2.5])
+
+    def test_copy_should_copy_only_changed_columns(self):
+        self.table.compact()
+        snapshot = self.table.snapshot()
+        columns = list(self.table._storage.columns)
+        self.table['eggs'] = ['x', 'y', 'z']
+        self.table['ham'] = [0.5, 0.5, 0.5]
+        del self.table['spam']
+        snapshot_columns = snapshot._storage.columns
+        self.assertTrue(snapshot_columns[0] is columns[0])
+        self.assertTrue(snapshot_columns[1] is columns[1])
+        self.assertEquals(snapshot[:], [[3, 'a', 1.5], [1, 'b', 2.5],
+                                        [2, 'c', 3.5]])
+        snapshot.order_by('spam', 'desc')
+        self.assertTrue(isinstance(snapshot._storage.columns[0], TypedColumn))
+        self.assertEquals(snapshot['spam'], [3, 2, 1])
+        self.assertEquals(columns[0], [3, 1, 2])
+        snapshot.append([4, 'd', None])
+        self.assertEquals(self.table[:], [['x', 0.5], ['y', 0.5],
+                                          ['z', 0.5]])
+        self.assertEquals(columns[2], [1.5, 2.5, 3.5])